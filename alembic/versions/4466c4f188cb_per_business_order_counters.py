@@ -0,0 +1,51 @@
+"""per-business order counters
+
+Revision ID: 4466c4f188cb
+Revises: e3740f345f27
+Create Date: 2026-10-16 09:12:41.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4466c4f188cb'
+down_revision: Union[str, Sequence[str], None] = 'e3740f345f27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'order_counters',
+        sa.Column('business_id', sa.Integer(), nullable=False),
+        sa.Column('next_value', sa.Integer(), nullable=False),
+        sa.Column('prefix', sa.String(length=10), nullable=True),
+        sa.Column('gap_free', sa.Boolean(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['business_id'], ['business.id'], ),
+        sa.PrimaryKeyConstraint('business_id')
+    )
+
+    # order codes are unique per business now, not globally
+    op.drop_index('ix_orders_order_code', table_name='orders')
+    op.create_index(op.f('ix_orders_order_code'), 'orders', ['order_code'], unique=False)
+    op.create_unique_constraint('uq_order_code_business', 'orders', ['business_id', 'order_code'])
+
+    # start every existing business above its old global ORD-<id> codes
+    op.execute(
+        "INSERT INTO order_counters (business_id, next_value, gap_free, updated_at) "
+        "SELECT business_id, MAX(id) + 1, 0, NOW() FROM orders GROUP BY business_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_order_code_business', 'orders', type_='unique')
+    op.drop_index(op.f('ix_orders_order_code'), table_name='orders')
+    op.create_index('ix_orders_order_code', 'orders', ['order_code'], unique=True)
+    op.drop_table('order_counters')
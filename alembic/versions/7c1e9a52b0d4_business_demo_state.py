@@ -0,0 +1,44 @@
+"""business demo state
+
+Revision ID: 7c1e9a52b0d4
+Revises: 05391c813866
+Create Date: 2026-10-16 10:41:55.730118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e9a52b0d4'
+down_revision: Union[str, Sequence[str], None] = '05391c813866'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('business', sa.Column('has_real_sale', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.add_column('business', sa.Column('demo_sales_pending', sa.Integer(), nullable=False, server_default='0'))
+    op.create_index(op.f('ix_business_demo_sales_pending'), 'business', ['demo_sales_pending'], unique=False)
+
+    # backfill from existing orders / sales
+    op.execute(
+        "UPDATE business SET has_real_sale = 1 WHERE EXISTS ("
+        " SELECT 1 FROM sales JOIN orders ON orders.id = sales.order_id"
+        " WHERE orders.business_id = business.id AND sales.is_demo = 0)"
+    )
+    op.execute(
+        "UPDATE business SET demo_sales_pending = ("
+        " SELECT COUNT(DISTINCT orders.id) FROM sales JOIN orders ON orders.id = sales.order_id"
+        " WHERE orders.business_id = business.id AND sales.is_demo = 1)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_business_demo_sales_pending'), table_name='business')
+    op.drop_column('business', 'demo_sales_pending')
+    op.drop_column('business', 'has_real_sale')
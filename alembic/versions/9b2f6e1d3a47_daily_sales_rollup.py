@@ -0,0 +1,54 @@
+"""daily sales rollup
+
+Revision ID: 9b2f6e1d3a47
+Revises: 7c1e9a52b0d4
+Create Date: 2026-10-16 11:20:08.443910
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b2f6e1d3a47'
+down_revision: Union[str, Sequence[str], None] = '7c1e9a52b0d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'daily_sales_rollup',
+        sa.Column('business_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.Column('cost', sa.Float(), nullable=False),
+        sa.Column('order_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('business_id', 'day', 'product_id', 'created_by')
+    )
+
+    # backfill from history (same query as `python -m backend.rollup_utils`)
+    op.execute(
+        "INSERT INTO daily_sales_rollup"
+        " (business_id, day, product_id, created_by, quantity, revenue, cost, order_count)"
+        " SELECT orders.business_id, DATE(orders.created_at), sales.product_id,"
+        " COALESCE(orders.created_by, 0), SUM(sales.quantity), SUM(sales.total_price),"
+        " SUM(COALESCE(products.buying_price, 0) * sales.quantity), COUNT(DISTINCT orders.id)"
+        " FROM sales"
+        " JOIN orders ON orders.id = sales.order_id"
+        " JOIN products ON products.id = sales.product_id"
+        " WHERE sales.is_demo = 0"
+        " GROUP BY orders.business_id, DATE(orders.created_at), sales.product_id,"
+        " COALESCE(orders.created_by, 0)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('daily_sales_rollup')
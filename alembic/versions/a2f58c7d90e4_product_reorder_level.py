@@ -0,0 +1,36 @@
+"""product reorder level + low stock flag
+
+Revision ID: a2f58c7d90e4
+Revises: f9d14b6e2a73
+Create Date: 2026-10-16 18:12:50.271936
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2f58c7d90e4'
+down_revision: Union[str, Sequence[str], None] = 'f9d14b6e2a73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('reorder_level', sa.Integer(), server_default='3', nullable=False))
+    op.add_column('products', sa.Column('is_low', sa.Boolean(), server_default='0', nullable=False))
+
+    # same rule as the old hardcoded dashboard check (quantity <= 3)
+    op.execute("UPDATE products SET is_low = (COALESCE(quantity, 0) <= reorder_level)")
+
+    op.create_index('ix_products_business_low', 'products', ['business_id', 'is_low'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_business_low', table_name='products')
+    op.drop_column('products', 'is_low')
+    op.drop_column('products', 'reorder_level')
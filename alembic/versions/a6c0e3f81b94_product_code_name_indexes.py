@@ -0,0 +1,42 @@
+"""product code + name indexes
+
+Revision ID: a6c0e3f81b94
+Revises: f3b7d92c5e18
+Create Date: 2026-10-16 14:02:11.650372
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c0e3f81b94'
+down_revision: Union[str, Sequence[str], None] = 'f3b7d92c5e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # blank codes -> NULL (NULLs don't collide in a unique index)
+    op.execute("UPDATE products SET item_code = NULL WHERE TRIM(item_code) = ''")
+
+    # duplicate codes within a business: the oldest product keeps it
+    op.execute(
+        "UPDATE products p JOIN ("
+        " SELECT business_id, item_code, MIN(id) AS keep_id FROM products"
+        " WHERE item_code IS NOT NULL GROUP BY business_id, item_code HAVING COUNT(*) > 1"
+        ") d ON d.business_id = p.business_id AND d.item_code = p.item_code"
+        " SET p.item_code = NULL WHERE p.id <> d.keep_id"
+    )
+
+    op.create_unique_constraint('uq_product_item_code_business', 'products', ['business_id', 'item_code'])
+    op.create_index('ix_products_business_name', 'products', ['business_id', 'name'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_business_name', table_name='products')
+    op.drop_constraint('uq_product_item_code_business', 'products', type_='unique')
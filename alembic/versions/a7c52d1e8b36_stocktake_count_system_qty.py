@@ -0,0 +1,34 @@
+"""stocktake count system quantity
+
+Revision ID: a7c52d1e8b36
+Revises: f4b73e9a2c18
+Create Date: 2026-10-17 10:31:45.772019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c52d1e8b36'
+down_revision: Union[str, Sequence[str], None] = 'f4b73e9a2c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('stocktake_counts', sa.Column('system_qty', sa.Integer(), server_default='0', nullable=False))
+    # counts already posted: today's quantity is the best we have
+    op.execute("""
+        UPDATE stocktake_counts
+           SET system_qty = COALESCE((SELECT p.quantity FROM products p
+                                       WHERE p.id = stocktake_counts.product_id), 0)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('stocktake_counts', 'system_qty')
@@ -0,0 +1,32 @@
+"""purchase history indexes
+
+Revision ID: b7e41d0c8f26
+Revises: a2f58c7d90e4
+Create Date: 2026-10-16 19:03:27.648115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e41d0c8f26'
+down_revision: Union[str, Sequence[str], None] = 'a2f58c7d90e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_purchases_business_created', 'purchases', ['business_id', 'created_at'], unique=False)
+    op.create_index(op.f('ix_purchases_supplier_id'), 'purchases', ['supplier_id'], unique=False)
+    op.create_index(op.f('ix_purchase_items_purchase_id'), 'purchase_items', ['purchase_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_purchase_items_purchase_id'), table_name='purchase_items')
+    op.drop_index(op.f('ix_purchases_supplier_id'), table_name='purchases')
+    op.drop_index('ix_purchases_business_created', table_name='purchases')
@@ -0,0 +1,60 @@
+"""stocktakes
+
+Revision ID: b9e2d47c6a15
+Revises: a6c0e3f81b94
+Create Date: 2026-10-16 15:20:43.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9e2d47c6a15'
+down_revision: Union[str, Sequence[str], None] = 'a6c0e3f81b94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'stocktakes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('business_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('notes', sa.String(length=255), nullable=True),
+        sa.Column('created_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('closed_by', sa.Integer(), nullable=True),
+        sa.Column('closed_at', sa.DateTime(), nullable=True),
+        sa.Column('adjusted_lines', sa.Integer(), nullable=True),
+        sa.Column('variance_value', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['business_id'], ['business.id']),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id']),
+        sa.ForeignKeyConstraint(['closed_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stocktakes_business_status', 'stocktakes', ['business_id', 'status'], unique=False)
+
+    op.create_table(
+        'stocktake_counts',
+        sa.Column('stocktake_id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('counted_qty', sa.Integer(), nullable=False),
+        sa.Column('counted_by', sa.Integer(), nullable=True),
+        sa.Column('counted_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['stocktake_id'], ['stocktakes.id']),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.ForeignKeyConstraint(['counted_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('stocktake_id', 'product_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stocktake_counts')
+    op.drop_index('ix_stocktakes_business_status', table_name='stocktakes')
+    op.drop_table('stocktakes')
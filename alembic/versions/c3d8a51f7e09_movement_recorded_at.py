@@ -0,0 +1,32 @@
+"""inventory movement insert time
+
+Revision ID: c3d8a51f7e09
+Revises: b7e41d0c8f26
+Create Date: 2026-10-16 21:12:40.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d8a51f7e09'
+down_revision: Union[str, Sequence[str], None] = 'b7e41d0c8f26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('inventory_movements', sa.Column('recorded_at', sa.DateTime(), nullable=True))
+    # best guess for existing rows; all of them are long settled anyway
+    op.execute("UPDATE inventory_movements SET recorded_at = created_at")
+    op.create_index(op.f('ix_inventory_movements_recorded_at'), 'inventory_movements', ['recorded_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_inventory_movements_recorded_at'), table_name='inventory_movements')
+    op.drop_column('inventory_movements', 'recorded_at')
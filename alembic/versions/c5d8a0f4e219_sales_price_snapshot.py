@@ -0,0 +1,40 @@
+"""sales price snapshot
+
+Revision ID: c5d8a0f4e219
+Revises: 9b2f6e1d3a47
+Create Date: 2026-10-16 11:58:36.102284
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d8a0f4e219'
+down_revision: Union[str, Sequence[str], None] = '9b2f6e1d3a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('sales', sa.Column('unit_price', sa.Float(), nullable=True))
+    op.add_column('sales', sa.Column('unit_cost', sa.Float(), nullable=True))
+    op.add_column('sales', sa.Column('product_name', sa.String(length=255), nullable=True))
+
+    # backfill: best we know for old rows is the product's current name + cost
+    op.execute(
+        "UPDATE sales JOIN products ON products.id = sales.product_id"
+        " SET sales.unit_price = sales.total_price / NULLIF(sales.quantity, 0),"
+        " sales.unit_cost = COALESCE(products.buying_price, 0),"
+        " sales.product_name = products.name"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('sales', 'product_name')
+    op.drop_column('sales', 'unit_cost')
+    op.drop_column('sales', 'unit_price')
@@ -0,0 +1,33 @@
+"""inventory movements product history index
+
+Revision ID: d4a7f1c39e82
+Revises: b9e2d47c6a15
+Create Date: 2026-10-16 16:05:12.402917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7f1c39e82'
+down_revision: Union[str, Sequence[str], None] = 'b9e2d47c6a15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_inventory_movements_product_created',
+        'inventory_movements',
+        ['product_id', 'created_at', 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_inventory_movements_product_created', table_name='inventory_movements')
@@ -0,0 +1,47 @@
+"""stock snapshot headers
+
+Revision ID: d5f19b3e6a42
+Revises: c3d8a51f7e09
+Create Date: 2026-10-16 21:40:55.902316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f19b3e6a42'
+down_revision: Union[str, Sequence[str], None] = 'c3d8a51f7e09'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'stock_snapshot_headers',
+        sa.Column('business_id', sa.Integer(), nullable=False),
+        sa.Column('as_of', sa.DateTime(), nullable=False),
+        sa.Column('last_movement_id', sa.Integer(), nullable=False),
+        sa.Column('product_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['business_id'], ['business.id']),
+        sa.PrimaryKeyConstraint('business_id', 'as_of')
+    )
+    # existing snapshots: mark = newest movement they could have included
+    op.execute("""
+        INSERT INTO stock_snapshot_headers (business_id, as_of, last_movement_id, product_count, created_at)
+        SELECT s.business_id, s.as_of,
+               (SELECT COALESCE(MAX(m.id), 0) FROM inventory_movements m
+                 WHERE m.business_id = s.business_id AND m.created_at < s.as_of),
+               COUNT(*), MIN(s.created_at)
+          FROM stock_snapshots s
+         GROUP BY s.business_id, s.as_of
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('stock_snapshot_headers')
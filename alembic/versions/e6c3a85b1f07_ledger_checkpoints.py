@@ -0,0 +1,40 @@
+"""ledger checkpoints
+
+Revision ID: e6c3a85b1f07
+Revises: d4a7f1c39e82
+Create Date: 2026-10-16 16:48:37.905126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6c3a85b1f07'
+down_revision: Union[str, Sequence[str], None] = 'd4a7f1c39e82'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'ledger_checkpoints',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('business_id', sa.Integer(), nullable=False),
+        sa.Column('last_movement_id', sa.Integer(), nullable=False),
+        sa.Column('balance', sa.Integer(), nullable=False),
+        sa.Column('checked_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id']),
+        sa.ForeignKeyConstraint(['business_id'], ['business.id']),
+        sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_index(op.f('ix_ledger_checkpoints_business_id'), 'ledger_checkpoints', ['business_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_ledger_checkpoints_business_id'), table_name='ledger_checkpoints')
+    op.drop_table('ledger_checkpoints')
@@ -0,0 +1,48 @@
+"""business timezone + time indexes
+
+Revision ID: e81a4c7b2d60
+Revises: c5d8a0f4e219
+Create Date: 2026-10-16 12:37:12.904455
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e81a4c7b2d60'
+down_revision: Union[str, Sequence[str], None] = 'c5d8a0f4e219'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('business', sa.Column('timezone', sa.String(length=50), nullable=False, server_default='Africa/Nairobi'))
+    op.create_index('ix_orders_business_created', 'orders', ['business_id', 'created_at'], unique=False)
+    op.create_index('ix_inventory_movements_business_created', 'inventory_movements', ['business_id', 'created_at'], unique=False)
+
+    # rollup days are local days now. Every existing shop is Africa/Nairobi
+    # (UTC+3, no DST), so re-bucket with a fixed offset.
+    op.execute("DELETE FROM daily_sales_rollup")
+    op.execute(
+        "INSERT INTO daily_sales_rollup"
+        " (business_id, day, product_id, created_by, quantity, revenue, cost, order_count)"
+        " SELECT orders.business_id, DATE(orders.created_at + INTERVAL 3 HOUR), sales.product_id,"
+        " COALESCE(orders.created_by, 0), SUM(sales.quantity), SUM(sales.total_price),"
+        " SUM(COALESCE(sales.unit_cost, 0) * sales.quantity), COUNT(DISTINCT orders.id)"
+        " FROM sales"
+        " JOIN orders ON orders.id = sales.order_id"
+        " WHERE sales.is_demo = 0"
+        " GROUP BY orders.business_id, DATE(orders.created_at + INTERVAL 3 HOUR), sales.product_id,"
+        " COALESCE(orders.created_by, 0)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_inventory_movements_business_created', table_name='inventory_movements')
+    op.drop_index('ix_orders_business_created', table_name='orders')
+    op.drop_column('business', 'timezone')
@@ -0,0 +1,35 @@
+"""catalog versions
+
+Revision ID: e8a26c4f1d53
+Revises: d5f19b3e6a42
+Create Date: 2026-10-17 09:14:22.508361
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a26c4f1d53'
+down_revision: Union[str, Sequence[str], None] = 'd5f19b3e6a42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'catalog_versions',
+        sa.Column('business_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['business_id'], ['business.id']),
+        sa.PrimaryKeyConstraint('business_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('catalog_versions')
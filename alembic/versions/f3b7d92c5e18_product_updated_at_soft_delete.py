@@ -0,0 +1,33 @@
+"""product updated_at + soft delete
+
+Revision ID: f3b7d92c5e18
+Revises: e81a4c7b2d60
+Create Date: 2026-10-16 13:24:50.317762
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b7d92c5e18'
+down_revision: Union[str, Sequence[str], None] = 'e81a4c7b2d60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.add_column('products', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE products SET updated_at = COALESCE(created_at, NOW())")
+    op.create_index('ix_products_business_updated', 'products', ['business_id', 'updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_business_updated', table_name='products')
+    op.drop_column('products', 'deleted_at')
+    op.drop_column('products', 'updated_at')
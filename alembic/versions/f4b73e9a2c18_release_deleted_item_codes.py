@@ -0,0 +1,29 @@
+"""release item codes of soft-deleted products
+
+Revision ID: f4b73e9a2c18
+Revises: e8a26c4f1d53
+Create Date: 2026-10-17 09:52:07.113984
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4b73e9a2c18'
+down_revision: Union[str, Sequence[str], None] = 'e8a26c4f1d53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # deleting a product now clears its code; do the same for earlier deletes
+    op.execute("UPDATE products SET item_code = NULL WHERE deleted_at IS NOT NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass  # the old codes are not kept
@@ -0,0 +1,165 @@
+# backend/catalog_utils.py
+#
+# Product catalog delta sync for tills / stock pages.
+#   GET /products/?since=0          -> full catalog + cursor
+#   GET /products/?since=<cursor>   -> only rows changed since then (incl. tombstones)
+# The cursor trails "now" by SYNC_LAG_SECONDS so a write that commits a little
+# late (its updated_at is older than its commit) is still picked up next time.
+# Clients merge by id, so rows sent twice are harmless.
+#
+# ETag = per-business catalog_versions counter. Every product write marks the
+# session (mark_catalog_changed, or any flushed Product object) and the counter
+# is bumped just before that transaction commits, so a late-committing write
+# can never leave the validator unchanged. The bump is the transaction's last
+# statement: its row lock is held only for the commit.
+import base64
+import hashlib
+from datetime import datetime, timedelta
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend import models
+
+SYNC_LAG_SECONDS = 60
+
+
+def encode_catalog_cursor(business_id: int, at: datetime) -> str:
+    raw = f"{business_id}|{at.isoformat()}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_catalog_cursor(cursor: str, business_id: int):
+    """Timestamp from a cursor, or None (-> full sync) if missing/invalid/other business."""
+    if not cursor or cursor == "0":
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        owner, at = raw.split("|")
+        if int(owner) != business_id:
+            return None
+        return datetime.fromisoformat(at)
+    except Exception:
+        return None
+
+
+def active_products(query):
+    """Filter out soft-deleted products."""
+    return query.filter(models.Product.deleted_at.is_(None))
+
+
+def catalog_etag(db, business_id: int, since: datetime = None, kind: str = "delta") -> str:
+    """Fingerprint from the business's catalog version (one primary-key lookup)."""
+    version = db.query(models.CatalogVersion.version).filter(
+        models.CatalogVersion.business_id == business_id
+    ).scalar() or 0
+
+    # the window start itself is left out so an unchanged catalog keeps
+    # answering 304 as the cursor moves
+    raw = f"{business_id}|{kind}|{since is None}|{version}"
+    return 'W/"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20] + '"'
+
+
+# -------------------------------------------------
+# Catalog version (bumped with every product write)
+# -------------------------------------------------
+def mark_catalog_changed(db, business_id: int):
+    """Call from Core UPDATE/INSERTs on products (ORM changes are picked up at flush)."""
+    db.info.setdefault("catalog_changed", set()).add(business_id)
+
+
+def _bump_catalog_versions(db, business_ids):
+    now = datetime.utcnow()
+    rows = [{"business_id": bid, "version": 1, "updated_at": now} for bid in sorted(business_ids)]
+    dialect = db.get_bind().dialect.name
+    Version = models.CatalogVersion
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(Version)
+        stmt = stmt.on_duplicate_key_update(
+            version=Version.version + 1,
+            updated_at=stmt.inserted.updated_at,
+        )
+    else:
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(Version)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["business_id"],
+            set_={"version": Version.version + 1, "updated_at": stmt.excluded.updated_at},
+        )
+
+    db.execute(stmt, rows)
+
+
+@event.listens_for(Session, "before_flush")
+def _mark_flushed_products(session, flush_context, instances):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, models.Product) and obj.business_id:
+            mark_catalog_changed(session, obj.business_id)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_on_commit(session):
+    session.flush()  # pending Product objects mark the session here
+    changed = session.info.pop("catalog_changed", None)
+    if changed:
+        _bump_catalog_versions(session, changed)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_rolled_back_marks(session, previous_transaction):
+    session.info.pop("catalog_changed", None)
+
+
+def slim_product(p):
+    return {
+        "id": p.id,
+        "name": p.name,
+        "item_code": p.item_code,
+        "packaging_unit": p.packaging_unit,
+        "price": p.price,
+        "buying_price": p.buying_price,
+        "quantity": p.quantity,
+        "reorder_level": p.reorder_level,
+        "is_low": bool(p.is_low),
+    }
+
+
+def catalog_rows(db, business_id: int, since: datetime = None):
+    """Column-only product rows; with `since`, changed rows incl. tombstones."""
+    q = db.query(
+        models.Product.id,
+        models.Product.name,
+        models.Product.item_code,
+        models.Product.packaging_unit,
+        models.Product.price,
+        models.Product.buying_price,
+        models.Product.quantity,
+        models.Product.reorder_level,
+        models.Product.is_low,
+        models.Product.deleted_at,
+    ).filter(models.Product.business_id == business_id)
+
+    if since:
+        q = q.filter(models.Product.updated_at >= since)
+    else:
+        q = active_products(q)
+
+    return q.order_by(models.Product.name).all()
+
+
+def catalog_delta(db, business_id: int, since: datetime = None):
+    now = datetime.utcnow()
+    rows = catalog_rows(db, business_id, since)
+
+    return {
+        "full": since is None,
+        "products": [slim_product(r) for r in rows if r.deleted_at is None],
+        "deleted": [r.id for r in rows if r.deleted_at is not None],
+        "cursor": encode_catalog_cursor(business_id, now - timedelta(seconds=SYNC_LAG_SECONDS)),
+    }
@@ -0,0 +1,128 @@
+# backend/dashboard_utils.py
+#
+# Dashboard summary: ONE aggregate query (rollup sums + order count + low-stock flag count)
+# plus the last 5 orders, cached per business in this process.
+# - record_sale / sync, adjust stock and receive stock call invalidate_dashboard()
+# - concurrent refreshes for one business share a single computation
+# - entries also expire after DASHBOARD_CACHE_SECONDS (other workers' writes)
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from backend import models
+from backend.time_utils import business_timezone, period_range
+
+DASHBOARD_CACHE_SECONDS = int(os.getenv("DASHBOARD_CACHE_SECONDS", 60))
+
+_cache = {}        # business_id -> (expires_at, day, summary)
+_generation = {}   # business_id -> bumped on every invalidation
+_inflight = {}     # business_id -> threading.Event
+_lock = threading.Lock()
+
+
+def invalidate_dashboard(business_id: int):
+    """Call after a committed write that changes sales or stock."""
+    with _lock:
+        _cache.pop(business_id, None)
+        _generation[business_id] = _generation.get(business_id, 0) + 1
+
+
+def compute_dashboard_summary(db, business_id: int, today, today_start: datetime, today_end: datetime):
+    """`today` is the business-local date, [today_start, today_end) its UTC bounds."""
+    Rollup = models.DailySalesRollup
+
+    revenue = (
+        select(func.coalesce(func.sum(Rollup.revenue), 0))
+        .where(Rollup.business_id == business_id, Rollup.day == today)
+        .scalar_subquery()
+    )
+    cost = (
+        select(func.coalesce(func.sum(Rollup.cost), 0))
+        .where(Rollup.business_id == business_id, Rollup.day == today)
+        .scalar_subquery()
+    )
+    transactions = (
+        select(func.count(models.Order.id))
+        .where(
+            models.Order.business_id == business_id,
+            models.Order.created_at >= today_start,
+            models.Order.created_at < today_end
+        )
+        .scalar_subquery()
+    )
+    # per-product reorder levels, pre-flagged (ix_products_business_low)
+    low_stock = (
+        select(func.count(models.Product.id))
+        .where(
+            models.Product.business_id == business_id,
+            models.Product.is_low == True,
+            models.Product.deleted_at.is_(None)
+        )
+        .scalar_subquery()
+    )
+
+    row = db.execute(
+        select(
+            revenue.label("revenue"),
+            cost.label("cost"),
+            transactions.label("transactions"),
+            low_stock.label("low_stock"),
+        )
+    ).one()
+
+    recent_orders = (
+        db.query(models.Order.order_code, models.Order.total_amount)
+        .filter(models.Order.business_id == business_id)
+        .order_by(models.Order.created_at.desc())
+        .limit(5)
+        .all()
+    )
+
+    today_revenue = float(row.revenue or 0)
+    return {
+        "today_revenue": round(today_revenue, 2),
+        "today_profit": round(today_revenue - float(row.cost or 0), 2),
+        "transactions": int(row.transactions or 0),
+        "low_stock": int(row.low_stock or 0),
+        "recent_orders": [
+            {"order_code": o.order_code, "total_amount": o.total_amount or 0}
+            for o in recent_orders
+        ],
+    }
+
+
+def get_dashboard_summary(db, business_id: int):
+    """Cached summary; only one request per business recomputes it at a time."""
+    # "today" is the shop's local day, not UTC midnight
+    today, _, today_start, today_end = period_range(business_timezone(db, business_id), "today")
+
+    while True:
+        with _lock:
+            hit = _cache.get(business_id)
+            if hit and hit[0] > time.monotonic() and hit[1] == today:
+                return hit[2]
+
+            waiting = _inflight.get(business_id)
+            if waiting is None:
+                done = _inflight[business_id] = threading.Event()
+                generation = _generation.get(business_id, 0)
+                break
+
+        # another request is computing it: wait, then read the cache
+        if not waiting.wait(timeout=10):
+            return compute_dashboard_summary(db, business_id, today, today_start, today_end)
+
+    try:
+        summary = compute_dashboard_summary(db, business_id, today, today_start, today_end)
+        with _lock:
+            # a write committed while we were computing -> don't cache a stale view
+            if _generation.get(business_id, 0) == generation:
+                _cache[business_id] = (time.monotonic() + DASHBOARD_CACHE_SECONDS, today, summary)
+        return summary
+    finally:
+        with _lock:
+            _inflight.pop(business_id, None)
+        done.set()
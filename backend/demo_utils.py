@@ -0,0 +1,145 @@
+# backend/demo_utils.py
+#
+# Onboarding demo sales.
+# A business can record ONE kind of demo sale (stock untouched) until its
+# first real sale. After that it is "established" for good:
+#   - record_sale skips every demo check (process cache -> zero queries)
+#   - leftover demo rows are purged by the background sweeper, not in the request
+import os
+import threading
+
+from sqlalchemy import case, update
+
+from backend import models
+from backend.db import SessionLocal
+
+DEMO_SWEEP_SECONDS = int(os.getenv("DEMO_SWEEP_SECONDS", 300))  # 0 = off
+
+# business ids known to have a real sale (monotonic, so safe to cache forever)
+_established = set()
+
+
+def is_established(db, business_id: int) -> bool:
+    if business_id in _established:
+        return True
+
+    flag = db.query(models.Business.has_real_sale).filter(
+        models.Business.id == business_id
+    ).scalar()
+
+    if flag:
+        _established.add(business_id)
+    return bool(flag)
+
+
+def remember_established(business_id: int):
+    """Call after the first real sale has been committed."""
+    _established.add(business_id)
+
+
+def track_sale(db, business_id: int, is_demo_sale: bool, established: bool):
+    """In the sale transaction: keep Business demo state up to date."""
+    if established:
+        return
+
+    if is_demo_sale:
+        values = {"demo_sales_pending": models.Business.demo_sales_pending + 1}
+    else:
+        values = {"has_real_sale": True}
+
+    db.execute(
+        update(models.Business)
+        .where(models.Business.id == business_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# -------------------------------------------------
+# Sweeper
+# -------------------------------------------------
+def cleanup_demo_sales(db, business_id: int) -> int:
+    """
+    Delete any old demo sale rows + demo orders for this business.
+    (Can't delete on a joined query in SQLAlchemy.) Does NOT commit.
+    Returns the number of demo orders removed.
+    """
+    demo_order_ids_rows = (
+        db.query(models.Order.id)
+        .join(models.Sales, models.Sales.order_id == models.Order.id)
+        .filter(
+            models.Order.business_id == business_id,
+            models.Sales.is_demo == True
+        )
+        .distinct()
+        .all()
+    )
+
+    demo_order_ids_list = [r[0] for r in demo_order_ids_rows]
+
+    # ✅ If no demo orders, skip cleanup entirely
+    if not demo_order_ids_list:
+        return 0
+
+    db.query(models.Sales).filter(
+        models.Sales.order_id.in_(demo_order_ids_list),
+        models.Sales.is_demo == True
+    ).delete(synchronize_session=False)
+
+    db.query(models.Order).filter(
+        models.Order.id.in_(demo_order_ids_list),
+        models.Order.business_id == business_id
+    ).delete(synchronize_session=False)
+
+    return len(demo_order_ids_list)
+
+
+def purge_demo_sales(db, limit: int = 100) -> int:
+    """Remove demo rows of established businesses. One commit per business."""
+    business_ids = [
+        r[0] for r in
+        db.query(models.Business.id)
+        .filter(
+            models.Business.has_real_sale == True,
+            models.Business.demo_sales_pending > 0
+        )
+        .limit(limit)
+        .all()
+    ]
+
+    purged = 0
+    for business_id in business_ids:
+        removed = cleanup_demo_sales(db, business_id)
+
+        # subtract what we removed (a demo sale may land while we sweep)
+        pending = models.Business.demo_sales_pending
+        db.execute(
+            update(models.Business)
+            .where(models.Business.id == business_id)
+            .values(demo_sales_pending=case((pending > removed, pending - removed), else_=0))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        purged += removed
+
+    return purged
+
+
+def _sweep_forever(stop: threading.Event):
+    while not stop.wait(DEMO_SWEEP_SECONDS):
+        db = SessionLocal()
+        try:
+            purge_demo_sales(db)
+        except Exception as e:
+            db.rollback()
+            print("⚠️ demo sweeper failed:", e)
+        finally:
+            db.close()
+
+
+def start_demo_sweeper():
+    """Background thread, started once per worker on app startup."""
+    stop = threading.Event()
+    if DEMO_SWEEP_SECONDS > 0:
+        threading.Thread(target=_sweep_forever, args=(stop,), daemon=True, name="demo-sweeper").start()
+    return stop
@@ -0,0 +1,245 @@
+# backend/idempotency_utils.py
+#
+# Idempotency-Key support for write endpoints (record_sale, receive_submit,
+# adjust stock). The key row is written in the SAME transaction as the
+# sale/receipt, so either both are committed or neither is. A retry with the
+# same key gets the stored response back and never touches stock again.
+#
+# Lookups: in-process LRU first (no query), then one indexed SELECT.
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, RedirectResponse
+from sqlalchemy import delete, insert
+
+from backend import models
+from backend.db import engine
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", 48))
+LRU_SIZE = int(os.getenv("IDEMPOTENCY_LRU_SIZE", 2048))
+PRUNE_INTERVAL_SECONDS = 3600
+
+_lru = OrderedDict()  # (business_id, endpoint, key) -> (request_hash, status_code, body)
+_lru_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def _lru_get(cache_key):
+    with _lru_lock:
+        hit = _lru.get(cache_key)
+        if hit is not None:
+            _lru.move_to_end(cache_key)
+        return hit
+
+
+def _lru_put(cache_key, value):
+    with _lru_lock:
+        _lru[cache_key] = value
+        _lru.move_to_end(cache_key)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def request_fingerprint(payload) -> str:
+    """Short hash of the parsed request (pydantic model or plain dict)."""
+    if hasattr(payload, "model_dump_json"):
+        raw = payload.model_dump_json()
+    else:
+        raw = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def _to_response(status_code: int, body):
+    if 300 <= status_code < 400:
+        response = RedirectResponse(url=body["location"], status_code=status_code)
+    else:
+        response = JSONResponse(status_code=status_code, content=body)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def prune_idempotency_keys(now=None):
+    """Delete keys older than the TTL (own short transaction)."""
+    cutoff = (now or datetime.utcnow()) - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    with engine.begin() as conn:
+        result = conn.execute(
+            delete(models.IdempotencyKey).where(models.IdempotencyKey.created_at < cutoff)
+        )
+    return result.rowcount
+
+
+def _maybe_prune():
+    global _last_prune
+    now = time.monotonic()
+    if now - _last_prune < PRUNE_INTERVAL_SECONDS:
+        return
+    _last_prune = now
+    try:
+        prune_idempotency_keys()
+    except Exception:
+        pass  # pruning is housekeeping, never fail a request over it
+
+
+class IdempotencyGuard:
+    """
+    guard = IdempotencyGuard(db, request, business_id, "record_sale", payload)
+    replay = guard.replay()        # stored Response or None
+    ...
+    guard.save(db, body)           # inside the write transaction, before commit
+    db.commit()
+    guard.remember()               # after commit -> LRU
+    """
+
+    def __init__(self, db, request, business_id: int, endpoint: str, payload, key: str = None):
+        raw_key = key or (request.headers.get(IDEMPOTENCY_HEADER) if request else None) or ""
+        self.key = raw_key.strip()[:64] or None
+        self.db = db
+        self.business_id = business_id
+        self.endpoint = endpoint
+        self.request_hash = request_fingerprint(payload) if self.key else None
+        self._pending = None
+
+    @property
+    def cache_key(self):
+        return (self.business_id, self.endpoint, self.key)
+
+    def replay(self):
+        if not self.key:
+            return None
+
+        hit = _lru_get(self.cache_key)
+        if hit is None:
+            row = (
+                self.db.query(
+                    models.IdempotencyKey.request_hash,
+                    models.IdempotencyKey.status_code,
+                    models.IdempotencyKey.response_body
+                )
+                .filter(
+                    models.IdempotencyKey.business_id == self.business_id,
+                    models.IdempotencyKey.endpoint == self.endpoint,
+                    models.IdempotencyKey.key == self.key
+                )
+                .first()
+            )
+            if row is None:
+                return None
+            hit = (row.request_hash, row.status_code, json.loads(row.response_body))
+            _lru_put(self.cache_key, hit)
+
+        request_hash, status_code, body = hit
+        if request_hash != self.request_hash:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used for a different request"
+            )
+        return _to_response(status_code, body)
+
+    def save(self, db, body, status_code: int = 200):
+        """Add the key row to the caller's transaction (caller commits)."""
+        if not self.key:
+            return
+        db.add(models.IdempotencyKey(
+            business_id=self.business_id,
+            endpoint=self.endpoint,
+            key=self.key,
+            request_hash=self.request_hash,
+            status_code=status_code,
+            response_body=json.dumps(body, default=str)
+        ))
+        self._pending = (self.request_hash, status_code, json.loads(json.dumps(body, default=str)))
+
+    def remember(self):
+        """Call after a successful commit."""
+        if self.key and self._pending:
+            _lru_put(self.cache_key, self._pending)
+            self._pending = None
+            _maybe_prune()
+
+    def replay_after_conflict(self):
+        """
+        A concurrent request with the same key committed first
+        (unique constraint hit). Roll back and return its response.
+        """
+        if not self.key:
+            return None
+        self.db.rollback()
+        return self.replay()
+
+
+# -------------------------------------------------
+# Bulk helpers (offline sync: many keys per request)
+# -------------------------------------------------
+def find_stored_responses(db, business_id: int, endpoint: str, keys):
+    """One query for a whole batch. Returns {key: (request_hash, status_code, body)}."""
+    found = {}
+    missing = []
+    for key in keys:
+        hit = _lru_get((business_id, endpoint, key))
+        if hit is None:
+            missing.append(key)
+        else:
+            found[key] = hit
+
+    if missing:
+        rows = (
+            db.query(
+                models.IdempotencyKey.key,
+                models.IdempotencyKey.request_hash,
+                models.IdempotencyKey.status_code,
+                models.IdempotencyKey.response_body
+            )
+            .filter(
+                models.IdempotencyKey.business_id == business_id,
+                models.IdempotencyKey.endpoint == endpoint,
+                models.IdempotencyKey.key.in_(missing)
+            )
+            .all()
+        )
+        for r in rows:
+            found[r.key] = (r.request_hash, r.status_code, json.loads(r.response_body))
+            _lru_put((business_id, endpoint, r.key), found[r.key])
+
+    return found
+
+
+def save_many(db, business_id: int, endpoint: str, entries):
+    """
+    entries: [(key, request_hash, body)] stored as 200 responses with one
+    multi-row INSERT in the caller's transaction. Returns values for remember_many().
+    """
+    if not entries:
+        return []
+
+    rows = [
+        {
+            "business_id": business_id,
+            "endpoint": endpoint,
+            "key": key,
+            "request_hash": request_hash,
+            "status_code": 200,
+            "response_body": json.dumps(body, default=str),
+        }
+        for key, request_hash, body in entries
+    ]
+    db.execute(insert(models.IdempotencyKey), rows)
+
+    return [
+        ((business_id, endpoint, key), (request_hash, 200, body))
+        for key, request_hash, body in entries
+    ]
+
+
+def remember_many(saved):
+    """Call after a successful commit with the output of save_many()."""
+    for cache_key, value in saved:
+        _lru_put(cache_key, value)
+    if saved:
+        _maybe_prune()
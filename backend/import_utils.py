@@ -0,0 +1,396 @@
+# backend/import_utils.py
+#
+# CSV imports. The upload is read as a stream (csv over a text wrapper on the
+# spooled upload file), validated row by row and written in batches:
+#   one SELECT per batch for existing rows, one multi-row INSERT, one bulk
+#   UPDATE by primary key, one multi-row INSERT of inventory movements, commit.
+# Bad rows never stop the import; they come back in a per-row error report.
+#
+# Supplier invoices (POST /purchases/import) are different: the whole file is ONE
+# Purchase, so rows are parsed as a stream, products are resolved with batched
+# IN lookups by item_code (name as fallback), and the matched lines go through
+# the normal receive-stock pipeline in a single transaction.
+import csv
+import io
+from collections import namedtuple
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import insert, update
+
+from backend import models
+from backend.catalog_utils import mark_catalog_changed
+from backend.low_stock_utils import DEFAULT_REORDER_LEVEL, refresh_low_stock
+from backend.purchase_utils import receive_stock
+from backend.search_utils import normalize_code
+
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+class RowError(ValueError):
+    pass
+
+
+def read_csv_rows(upload_file):
+    """Yield (line_number, {lower-cased header: value}) without loading the file."""
+    upload_file.seek(0)
+    text = io.TextIOWrapper(upload_file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        if reader.fieldnames:
+            reader.fieldnames = [(f or "").strip().lower() for f in reader.fieldnames]
+        for row in reader:
+            yield reader.line_num, {k: (v or "").strip() for k, v in row.items() if k}
+    finally:
+        text.detach()  # leave the upload file open for FastAPI to close
+
+
+def parse_number(row, field: str, kind=float, required: bool = True, default=None):
+    raw = row.get(field, "")
+    if raw == "":
+        if required:
+            raise RowError(f"{field} is required")
+        return default
+    try:
+        value = kind(raw.replace(",", ""))
+    except ValueError:
+        raise RowError(f"{field} must be a number")
+    if value < 0:
+        raise RowError(f"{field} cannot be negative")
+    return value
+
+
+def parse_product_row(row):
+    name = row.get("name", "")
+    if not name:
+        raise RowError("name is required")
+    if len(name) > 255:
+        raise RowError("name is too long")
+
+    price = parse_number(row, "price")
+    buying_price = parse_number(row, "buying_price")
+    # same rule as Product.validate_price
+    if buying_price and price < buying_price:
+        raise RowError("Selling price cannot be below buying price")
+
+    return {
+        "name": name,
+        "item_code": normalize_code(row.get("item_code")),
+        "packaging_unit": row.get("packaging_unit") or None,
+        "price": price,
+        "buying_price": buying_price,
+        "quantity": parse_number(row, "quantity", kind=int, required=False, default=0),
+        "reorder_level": parse_number(row, "reorder_level", kind=int, required=False),
+    }
+
+
+class ImportReport:
+    def __init__(self):
+        self.total_rows = 0
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line: int, message: str, **fields):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": line, **fields, "error": message})
+
+    def as_dict(self):
+        return {
+            "total_rows": self.total_rows,
+            "created": self.created,
+            "updated": self.updated,
+            "failed": self.error_count,
+            "errors": self.errors,
+        }
+
+
+# -------------------------------------------------
+# Products
+# -------------------------------------------------
+def _write_product_batch(db, business_id: int, user_id: int, batch, report: ImportReport):
+    """batch: [(line, parsed)] with unique names/codes inside the batch."""
+    names = [p["name"] for _, p in batch]
+    codes = [p["item_code"] for _, p in batch if p["item_code"]]
+
+    # names are matched case-insensitively (like the MySQL unique index)
+    existing = {
+        r.name.lower(): r for r in
+        db.query(models.Product.id, models.Product.name, models.Product.reorder_level)
+        .filter(models.Product.business_id == business_id, models.Product.name.in_(names))
+        .all()
+    }
+    code_owner = {}
+    if codes:
+        code_owner = {
+            r.item_code: r.name for r in
+            db.query(models.Product.item_code, models.Product.name)
+            .filter(models.Product.business_id == business_id, models.Product.item_code.in_(codes))
+            .all()
+        }
+
+    now = datetime.utcnow()
+    inserts, updates, opening = [], [], {}
+
+    for line, p in batch:
+        owner = code_owner.get(p["item_code"]) if p["item_code"] else None
+        if owner and owner.lower() != p["name"].lower():
+            report.error(line, f"item_code '{p['item_code']}' already belongs to '{owner}'")
+            continue
+
+        if p["name"].lower() in existing:
+            # catalog update (revives deleted products); stock goes through Receive Stock
+            current = existing[p["name"].lower()]
+            updates.append({
+                "id": current.id,
+                "item_code": p["item_code"],
+                "packaging_unit": p["packaging_unit"],
+                "price": p["price"],
+                "buying_price": p["buying_price"],
+                "reorder_level": current.reorder_level if p["reorder_level"] is None else p["reorder_level"],
+                "deleted_at": None,
+                "updated_at": now,
+            })
+        else:
+            inserts.append({
+                "business_id": business_id,
+                "name": p["name"],
+                "item_code": p["item_code"],
+                "packaging_unit": p["packaging_unit"],
+                "price": p["price"],
+                "buying_price": p["buying_price"],
+                "quantity": p["quantity"],
+                "reorder_level": DEFAULT_REORDER_LEVEL if p["reorder_level"] is None else p["reorder_level"],
+                "updated_at": now,
+            })
+            if p["quantity"]:
+                opening[p["name"]] = p["quantity"]
+
+    if inserts:
+        db.execute(insert(models.Product), inserts)
+    if updates:
+        db.execute(update(models.Product), updates)  # bulk UPDATE by primary key
+    if inserts or updates:
+        mark_catalog_changed(db, business_id)
+
+    new_ids = {}
+    if inserts:
+        new_ids = dict(
+            db.query(models.Product.name, models.Product.id)
+            .filter(
+                models.Product.business_id == business_id,
+                models.Product.name.in_([row["name"] for row in inserts])
+            )
+            .all()
+        )
+
+    if opening:
+        db.execute(insert(models.InventoryMovement), [
+            {
+                "product_id": new_ids[name],
+                "business_id": business_id,
+                "movement_type": "opening",
+                "quantity": qty,
+                "reason": "Opening stock (CSV import)",
+                "created_by": user_id,
+                "created_at": now,
+            }
+            for name, qty in opening.items()
+        ])
+
+    # new stock / reorder levels: re-flag this batch's rows in its own
+    # transaction, but don't push an alert per row
+    refresh_low_stock(db, business_id, list(new_ids.values()) + [row["id"] for row in updates], alert=False)
+
+    db.commit()
+    report.created += len(inserts)
+    report.updated += len(updates)
+
+
+def import_products_csv(db, business_id: int, user_id: int, upload_file) -> dict:
+    """
+    Columns: name, price, buying_price, [item_code, packaging_unit, quantity, reorder_level].
+    Upserts on (name, business_id). quantity is opening stock for NEW products.
+    """
+    report = ImportReport()
+    seen_names, seen_codes = set(), set()
+    batch = []
+
+    def flush():
+        try:
+            _write_product_batch(db, business_id, user_id, batch, report)
+        except Exception as e:
+            db.rollback()
+            for line, _ in batch:
+                report.error(line, f"batch failed: {e.__class__.__name__}")
+        batch.clear()
+
+    try:
+        for line, row in read_csv_rows(upload_file):
+            report.total_rows += 1
+            try:
+                parsed = parse_product_row(row)
+            except RowError as e:
+                report.error(line, str(e))
+                continue
+
+            key = parsed["name"].lower()
+            if key in seen_names:
+                report.error(line, f"duplicate name '{parsed['name']}' in file")
+                continue
+            if parsed["item_code"] and parsed["item_code"] in seen_codes:
+                report.error(line, f"duplicate item_code '{parsed['item_code']}' in file")
+                continue
+            seen_names.add(key)
+            if parsed["item_code"]:
+                seen_codes.add(parsed["item_code"])
+
+            batch.append((line, parsed))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        report.error(report.total_rows + 1, f"unreadable CSV: {e}")
+
+    if batch:
+        flush()
+
+    return report.as_dict()
+
+
+# -------------------------------------------------
+# Purchases (supplier invoice)
+# -------------------------------------------------
+InvoiceLine = namedtuple("InvoiceLine", "product_id quantity buying_price selling_price")
+
+REPORT_FIELDS = ["row", "item_code", "name", "error"]
+
+
+def parse_invoice_row(row):
+    item_code = normalize_code(row.get("item_code"))
+    name = row.get("name", "")
+    if not item_code and not name:
+        raise RowError("item_code or name is required")
+
+    # suppliers say qty, our own exports say quantity
+    qty_field = "qty" if row.get("qty", "") != "" else "quantity"
+    quantity = parse_number(row, qty_field, kind=int)
+    if quantity <= 0:
+        raise RowError("qty must be greater than 0")
+
+    return {
+        "item_code": item_code,
+        "name": name,
+        "quantity": quantity,
+        "buying_price": parse_number(row, "buying_price", required=False),
+        "selling_price": parse_number(row, "selling_price", required=False),
+    }
+
+
+def _lookup_in_batches(db, business_id: int, column, values):
+    """{value: product row} with one IN query per IMPORT_BATCH_SIZE values."""
+    values = sorted(values)
+    found = {}
+    for start in range(0, len(values), IMPORT_BATCH_SIZE):
+        chunk = values[start:start + IMPORT_BATCH_SIZE]
+        rows = (
+            db.query(models.Product.id, models.Product.name, models.Product.item_code, models.Product.buying_price)
+            .filter(
+                models.Product.business_id == business_id,
+                models.Product.deleted_at.is_(None),
+                column.in_(chunk)
+            )
+            .all()
+        )
+        for r in rows:
+            found[getattr(r, column.key)] = r
+    return found
+
+
+def resolve_invoice_products(db, business_id: int, parsed_rows):
+    """Match by item_code first, then by name (case-insensitive), in batches."""
+    by_code = _lookup_in_batches(
+        db, business_id, models.Product.item_code,
+        {p["item_code"] for _, p in parsed_rows if p["item_code"]}
+    )
+    names = {
+        p["name"] for _, p in parsed_rows
+        if p["name"] and (not p["item_code"] or p["item_code"] not in by_code)
+    }
+    by_name = {
+        name.lower(): r
+        for name, r in _lookup_in_batches(db, business_id, models.Product.name, names).items()
+    }
+    return by_code, by_name
+
+
+def import_purchase_csv(db, business_id: int, user_id: int, upload_file,
+                        supplier_id=None, invoice_number=None, notes=None) -> dict:
+    """
+    Columns: item_code and/or name, qty, [buying_price, selling_price].
+    Matched rows become ONE Purchase (one transaction); every other row comes
+    back in "errors" (see errors_csv for the downloadable report).
+    """
+    report = ImportReport()
+    parsed_rows = []
+
+    try:
+        for line, row in read_csv_rows(upload_file):
+            report.total_rows += 1
+            try:
+                parsed_rows.append((line, parse_invoice_row(row)))
+            except RowError as e:
+                report.error(line, str(e), item_code=row.get("item_code", ""), name=row.get("name", ""))
+    except (UnicodeDecodeError, csv.Error) as e:
+        report.error(report.total_rows + 1, f"unreadable CSV: {e}", item_code="", name="")
+
+    by_code, by_name = resolve_invoice_products(db, business_id, parsed_rows)
+
+    lines = []
+    for line, p in parsed_rows:
+        product = (by_code.get(p["item_code"]) if p["item_code"] else None) or by_name.get(p["name"].lower())
+        ident = {"item_code": p["item_code"] or "", "name": p["name"]}
+        if not product:
+            report.error(line, "no matching product", **ident)
+            continue
+
+        # same rule as Product.validate_price, checked per row so one bad
+        # price doesn't reject the whole invoice
+        buying = p["buying_price"] if p["buying_price"] is not None else product.buying_price
+        if p["selling_price"] is not None and buying and p["selling_price"] < buying:
+            report.error(line, "Selling price cannot be below buying price", **ident)
+            continue
+
+        lines.append(InvoiceLine(product.id, p["quantity"], p["buying_price"], p["selling_price"]))
+
+    body = {"purchase_id": None, "total": 0.0}
+    if lines:
+        payload = SimpleNamespace(
+            supplier_id=supplier_id,
+            invoice_number=invoice_number,
+            notes=notes,
+            items=lines,
+        )
+        body = receive_stock(db, business_id, user_id, payload)
+
+    # parse errors and match errors were collected in two passes
+    report.errors.sort(key=lambda e: e["row"])
+    return {
+        "purchase_id": body["purchase_id"],
+        "total": body["total"],
+        "total_rows": report.total_rows,
+        "received_lines": len(lines),
+        "failed": report.error_count,
+        "errors": report.errors,
+    }
+
+
+def errors_csv(errors) -> str:
+    """Per-row error report as CSV text (row, item_code, name, error)."""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for e in errors:
+        writer.writerow({field: e.get(field, "") for field in REPORT_FIELDS})
+    return out.getvalue()
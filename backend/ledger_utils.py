@@ -0,0 +1,324 @@
+# backend/ledger_utils.py
+#
+# Inventory ledger (inventory_movements) reads.
+# Product history is keyset-paginated on (product_id, created_at, id), newest
+# first, using the ix_inventory_movements_product_created index.
+# The running balance walks BACKWARDS from the current stock: the cursor carries
+# the balance left after the last row shown, and each page only needs a window
+# SUM over its own rows -> page N costs the same as page 1, however old the product.
+#
+# Reconciliation: Product.quantity is cached stock and must equal the sum of the
+# product's movements. Each run stores a per-product checkpoint
+# (last_movement_id, balance), so later runs only aggregate movements newer than
+# the business's lowest checkpoint (a range scan on business_id + primary key).
+#   python -m backend.ledger_utils                  (every business, report only)
+#   python -m backend.ledger_utils --business 12 --fix
+import argparse
+import base64
+import os
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import and_, case, func, insert, or_, select
+
+from backend import models
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_PAGE_MAX = 200
+
+# movements INSERTED less than this ago are counted but not checkpointed yet: an
+# id can be allocated before a slower transaction with a lower id has committed
+RECONCILE_LAG_SECONDS = int(os.getenv("RECONCILE_LAG_SECONDS", 300))
+MAX_REPORTED_DRIFT = 500
+
+Movement = models.InventoryMovement
+Checkpoint = models.LedgerCheckpoint
+
+
+def encode_history_cursor(product_id: int, created_at: datetime, movement_id: int, balance: int) -> str:
+    raw = f"{product_id}|{created_at.isoformat()}|{movement_id}|{balance}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_history_cursor(cursor: str, product_id: int):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        owner, created_at, movement_id, balance = raw.split("|")
+        if int(owner) != product_id:
+            raise ValueError("cursor belongs to another product")
+        return datetime.fromisoformat(created_at), int(movement_id), int(balance)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def product_history_page(
+    db,
+    business_id: int,
+    product_id: int,
+    current_qty: int,
+    limit: int = HISTORY_PAGE_SIZE,
+    cursor: str = None
+):
+    """
+    One page of a product's movements (newest first) with `balance_after` per row
+    and per-page totals by movement_type.
+    """
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+
+    q = select(
+        Movement.id,
+        Movement.created_at,
+        Movement.movement_type,
+        Movement.quantity,
+        Movement.reference_id,
+        Movement.reason,
+    ).where(
+        Movement.product_id == product_id,
+        Movement.business_id == business_id
+    )
+
+    anchor = current_qty or 0
+    if cursor:
+        after_date, after_id, anchor = decode_history_cursor(cursor, product_id)
+        q = q.where(or_(
+            Movement.created_at < after_date,
+            and_(Movement.created_at == after_date, Movement.id < after_id)
+        ))
+
+    # one extra row tells us whether another page exists
+    page = (
+        q.order_by(Movement.created_at.desc(), Movement.id.desc())
+        .limit(limit + 1)
+        .subquery()
+    )
+
+    # newer_incl = this row + every newer row on the page;
+    # stock right after this movement = anchor - (newer rows only)
+    newer_incl = func.sum(func.coalesce(page.c.quantity, 0)).over(
+        order_by=(page.c.created_at.desc(), page.c.id.desc())
+    )
+    rows = db.execute(
+        select(page, newer_incl.label("newer_incl"))
+        .order_by(page.c.created_at.desc(), page.c.id.desc())
+    ).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items, totals = [], {}
+    for r in rows:
+        qty = r.quantity or 0
+        items.append({
+            "id": r.id,
+            "created_at": r.created_at,
+            "movement_type": r.movement_type,
+            "quantity": qty,
+            "reference_id": r.reference_id,
+            "reason": r.reason,
+            "balance_after": anchor - (int(r.newer_incl) - qty),
+        })
+        t = totals.setdefault(r.movement_type or "other", {"count": 0, "quantity": 0})
+        t["count"] += 1
+        t["quantity"] += qty
+
+    next_cursor = None
+    if has_more and items:
+        last = items[-1]
+        # stock BEFORE the last row = what the next (older) page ends at
+        next_cursor = encode_history_cursor(
+            product_id, last["created_at"], last["id"], last["balance_after"] - last["quantity"]
+        )
+
+    return {"items": items, "totals": totals, "next_cursor": next_cursor}
+
+
+# -------------------------------------------------
+# Reconciliation (ledger vs Product.quantity)
+# -------------------------------------------------
+def _upsert_checkpoints(db, rows):
+    """INSERT ... ON DUPLICATE KEY / ON CONFLICT moving the checkpoint forward."""
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(Checkpoint)
+        new = stmt.inserted
+        stmt = stmt.on_duplicate_key_update(
+            last_movement_id=new.last_movement_id,
+            balance=new.balance,
+            checked_at=new.checked_at,
+        )
+    else:
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(Checkpoint)
+        new = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["product_id"],
+            set_={
+                "last_movement_id": new.last_movement_id,
+                "balance": new.balance,
+                "checked_at": new.checked_at,
+            },
+        )
+
+    db.execute(stmt, rows)
+
+
+def settled_movement_id(db, lag_seconds: int = RECONCILE_LAG_SECONDS) -> int:
+    """
+    Highest movement id below which every transaction has committed: just under
+    the oldest id inserted in the last lag_seconds. Goes by recorded_at (insert
+    time), never created_at -- synced offline sales are backdated.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=lag_seconds)
+    oldest_recent = db.query(func.min(Movement.id)).filter(Movement.recorded_at >= cutoff).scalar()
+    if oldest_recent is not None:
+        return oldest_recent - 1
+    return db.query(func.max(Movement.id)).scalar() or 0
+
+
+def reconcile_business(db, business_id: int, fix: bool = False) -> dict:
+    """
+    Compare every product's cached quantity with its ledger balance.
+    With fix=True, drift is closed with one "reconciliation" movement per product
+    (the cached quantity is what tills sell from, so the ledger follows it).
+    One transaction; commits.
+    """
+    now = datetime.utcnow()
+
+    # lowest checkpoint: every product seen by an earlier run has one, and
+    # products created since then only have movements above it
+    lower = db.query(func.min(Checkpoint.last_movement_id)).filter(
+        Checkpoint.business_id == business_id
+    ).scalar() or 0
+
+    # checkpoints never move past an id that may still be uncommitted
+    settled_upto = max(lower, settled_movement_id(db))
+
+    cp_last = func.coalesce(Checkpoint.last_movement_id, 0)
+    qty = func.coalesce(Movement.quantity, 0)
+    new_rows = db.execute(
+        select(
+            Movement.product_id,
+            func.sum(case((Movement.id <= settled_upto, qty), else_=0)).label("settled"),
+            func.sum(case((Movement.id > settled_upto, qty), else_=0)).label("recent"),
+            func.count(Movement.id).label("scanned"),
+        )
+        .select_from(Movement)
+        .outerjoin(Checkpoint, Checkpoint.product_id == Movement.product_id)
+        .where(
+            Movement.business_id == business_id,
+            Movement.id > lower,
+            Movement.id > cp_last
+        )
+        .group_by(Movement.product_id)
+    ).all()
+    new_by_product = {r.product_id: r for r in new_rows}
+
+    checkpoints = dict(
+        db.query(Checkpoint.product_id, Checkpoint.balance)
+        .filter(Checkpoint.business_id == business_id)
+        .all()
+    )
+
+    products = (
+        db.query(models.Product.id, models.Product.name, models.Product.quantity)
+        .filter(models.Product.business_id == business_id)
+        .order_by(models.Product.id)
+        .all()
+    )
+
+    drifted, fixes, cp_rows = [], [], []
+    drift_count = 0
+    for p in products:
+        new = new_by_product.get(p.id)
+        settled = checkpoints.get(p.id, 0) + (int(new.settled) if new else 0)
+        ledger = settled + (int(new.recent) if new else 0)
+        drift = (p.quantity or 0) - ledger
+
+        cp_rows.append({
+            "product_id": p.id,
+            "business_id": business_id,
+            "last_movement_id": settled_upto,
+            "balance": settled,
+            "checked_at": now,
+        })
+
+        if drift:
+            drift_count += 1
+            if len(drifted) < MAX_REPORTED_DRIFT:
+                drifted.append({
+                    "product_id": p.id,
+                    "name": p.name,
+                    "quantity": p.quantity or 0,
+                    "ledger": ledger,
+                    "drift": drift,
+                })
+            if fix:
+                fixes.append({
+                    "product_id": p.id,
+                    "business_id": business_id,
+                    "movement_type": "reconciliation",
+                    "quantity": drift,
+                    "reason": "Ledger reconciliation",
+                    "created_at": now,
+                })
+
+    if cp_rows:
+        _upsert_checkpoints(db, cp_rows)
+    if fixes:
+        # ids above settled_upto -> picked up as new movements next run
+        db.execute(insert(Movement), fixes)
+    db.commit()
+
+    return {
+        "business_id": business_id,
+        "products_checked": len(products),
+        "movements_scanned": sum(int(r.scanned) for r in new_rows),
+        "drift_count": drift_count,
+        "fixed": len(fixes),
+        "drifted": drifted,
+    }
+
+
+def reconcile_ledger(db, business_id: int = None, fix: bool = False):
+    """Reconcile one business or the whole fleet (one business per transaction)."""
+    if business_id is None:
+        business_ids = [r[0] for r in db.query(models.Business.id).order_by(models.Business.id).all()]
+    else:
+        business_ids = [business_id]
+
+    for bid in business_ids:
+        try:
+            yield reconcile_business(db, bid, fix=fix)
+        except Exception:
+            db.rollback()
+            raise
+
+
+if __name__ == "__main__":
+    from backend.db import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Check Product.quantity against inventory_movements")
+    parser.add_argument("--business", type=int, default=None, help="only this business id")
+    parser.add_argument("--fix", action="store_true", help="write reconciliation movements for drift")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        total = 0
+        for report in reconcile_ledger(session, args.business, fix=args.fix):
+            total += report["drift_count"]
+            if report["drift_count"]:
+                print(
+                    f"⚠️ business {report['business_id']}: {report['drift_count']} product(s) drifted"
+                    f" ({report['movements_scanned']} new movements, {report['fixed']} fixed)"
+                )
+                for d in report["drifted"]:
+                    print(f"   #{d['product_id']} {d['name']}: stock {d['quantity']} vs ledger {d['ledger']}")
+        print(f"✅ reconciliation done, {total} product(s) drifted")
+    finally:
+        session.close()
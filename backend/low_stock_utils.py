@@ -0,0 +1,126 @@
+# backend/low_stock_utils.py
+#
+# Per-product reorder levels with a maintained low-stock flag.
+# - Product.is_low = quantity <= reorder_level, indexed on (business_id, is_low):
+#   the dashboard counts flagged rows instead of scanning every product
+# - every stock write (sale, receive, adjust, edit, stocktake) calls
+#   refresh_low_stock() in its own transaction for the products it touched
+# - a product CROSSING into low stock queues one web push; crossings that land
+#   within LOW_STOCK_ALERT_DELAY_SECONDS are sent together as one notification.
+#   Alerts are only queued once the transaction commits (rollbacks drop them).
+import os
+import threading
+
+from sqlalchemy import and_, case, event, func, not_, or_, select, update
+from sqlalchemy.orm import Session
+
+from backend import models
+from backend.catalog_utils import mark_catalog_changed
+from backend.db import SessionLocal
+from backend.push_utils import send_push_to_business
+
+DEFAULT_REORDER_LEVEL = 3
+LOW_STOCK_ALERT_DELAY_SECONDS = int(os.getenv("LOW_STOCK_ALERT_DELAY_SECONDS", 30))
+ALERT_NAMES_SHOWN = 5
+
+_pending = {}   # business_id -> [product names] waiting to be pushed
+_lock = threading.Lock()
+
+
+def is_low_expr():
+    return func.coalesce(models.Product.quantity, 0) <= models.Product.reorder_level
+
+
+def refresh_low_stock(db, business_id: int, product_ids=None, alert: bool = True):
+    """
+    Re-flag the given products (a list or a SELECT of ids; None = whole business).
+    Call inside the stock-changing transaction, after the quantity UPDATE.
+    Does NOT commit.
+    """
+    low = is_low_expr()
+    scope = [models.Product.business_id == business_id]
+    if product_ids is not None:
+        if isinstance(product_ids, (list, tuple, set)):
+            if not product_ids:
+                return
+            product_ids = sorted(product_ids)
+        scope.append(models.Product.id.in_(product_ids))
+
+    if alert:
+        crossed = db.execute(
+            select(models.Product.name)
+            .where(*scope, models.Product.deleted_at.is_(None), models.Product.is_low == False, low)
+            .order_by(models.Product.id)
+        ).scalars().all()
+        if crossed:
+            db.info.setdefault("low_stock_crossed", {}).setdefault(business_id, []).extend(crossed)
+
+    db.execute(
+        update(models.Product)
+        .where(
+            *scope,
+            or_(
+                and_(models.Product.is_low == False, low),
+                and_(models.Product.is_low == True, not_(low))
+            )
+        )
+        .values(is_low=case((low, True), else_=False))
+        .execution_options(synchronize_session=False)
+    )
+    mark_catalog_changed(db, business_id)
+
+
+# -------------------------------------------------
+# Alerts (after commit, batched per business)
+# -------------------------------------------------
+@event.listens_for(Session, "after_commit")
+def _queue_committed_alerts(session):
+    crossed = session.info.pop("low_stock_crossed", None)
+    for business_id, names in (crossed or {}).items():
+        queue_low_stock_alert(business_id, names)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_rolled_back_alerts(session, previous_transaction):
+    session.info.pop("low_stock_crossed", None)
+
+
+def queue_low_stock_alert(business_id: int, names):
+    with _lock:
+        waiting = _pending.get(business_id)
+        if waiting is not None:
+            waiting.extend(n for n in names if n not in waiting)
+            return
+        _pending[business_id] = list(dict.fromkeys(names))
+
+    timer = threading.Timer(LOW_STOCK_ALERT_DELAY_SECONDS, send_low_stock_alert, args=(business_id,))
+    timer.daemon = True
+    timer.start()
+
+
+def low_stock_message(names):
+    if len(names) == 1:
+        return f"{names[0]} is running low. Time to reorder."
+    shown = ", ".join(names[:ALERT_NAMES_SHOWN])
+    more = len(names) - ALERT_NAMES_SHOWN
+    if more > 0:
+        shown += f" and {more} more"
+    return f"{len(names)} products are running low: {shown}."
+
+
+def send_low_stock_alert(business_id: int):
+    with _lock:
+        names = _pending.pop(business_id, None)
+    if not names:
+        return
+
+    db = SessionLocal()
+    try:
+        send_push_to_business(
+            db, business_id, "Low stock", low_stock_message(names), url="/products/viewstocks"
+        )
+    except Exception as e:
+        db.rollback()
+        print("⚠️ low stock alert failed:", e)
+    finally:
+        db.close()
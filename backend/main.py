@@ -5,6 +5,8 @@ from backend.db import engine, Base
 import backend.models  # Ensure models are imported
 from routers import auth, product, sales, superadmin, push, onboarding, suppliers, purchases
 from backend.auth_utils import SECRET_KEY, ALGORITHM
+from backend.demo_utils import start_demo_sweeper
+from backend.snapshot_utils import start_snapshot_job
 from jose import jwt, JWTError
 from fastapi.staticfiles import StaticFiles
 
@@ -25,7 +27,7 @@ async def enforce_https(request: Request, call_next):
 @app.middleware("http")
 async def redirect_or_json_on_unauthorized(request: Request, call_next):
     public_paths = [
-        "/auth/login", "/auth/login_form", "/auth/register", "/static", "/favicon.ico","/superadmin/create_superadmin",   "/docs",
+        "/auth/login", "/auth/login_form", "/auth/register", "/static", "/favicon.ico","/superadmin/create_superadmin", "/service-worker.js",   "/docs",
     "/openapi.json",
     "/redoc",
     "/swagger-ui",
@@ -56,6 +58,12 @@ async def redirect_or_json_on_unauthorized(request: Request, call_next):
 backend.models.Base.metadata.create_all(bind=engine)
 print("✅ Tables that will be created:", Base.metadata.tables.keys())
 
+# ✅ Background jobs (per worker)
+@app.on_event("startup")
+def start_background_jobs():
+    start_demo_sweeper()
+    start_snapshot_job()
+
 # ✅ Static files
 from fastapi.staticfiles import StaticFiles
 app.mount("/static", StaticFiles(directory="backend/static"), name="static")
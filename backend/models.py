@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, String, Float, DateTime, ForeignKey, Boolean, func, UniqueConstraint, Numeric, Text
+    Column, Integer, String, Float, Date, DateTime, ForeignKey, Boolean, func, UniqueConstraint, Index, Numeric, Text
 )
 from sqlalchemy.orm import relationship, validates
 from sqlalchemy import event
@@ -10,6 +10,13 @@ class Product(Base):
     __tablename__ = "products"
     __table_args__ = (
         UniqueConstraint('name', 'business_id', name='uq_product_name_business'),
+        Index("ix_products_business_updated", "business_id", "updated_at"),
+        # barcode scan -> one unique-index hit (blank codes are stored as NULL)
+        UniqueConstraint("business_id", "item_code", name="uq_product_item_code_business"),
+        # name lookups / LIKE 'prefix%' within one business
+        Index("ix_products_business_name", "business_id", "name"),
+        # dashboard low-stock count / list
+        Index("ix_products_business_low", "business_id", "is_low"),
     )
 
     id = Column(Integer, primary_key=True, index=True)
@@ -21,6 +28,16 @@ class Product(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     item_code = Column(String(100), nullable=True, index=True)
     packaging_unit = Column(String(100), nullable=True)
+
+    # catalog delta sync: every write bumps updated_at (ORM + Core UPDATEs);
+    # deleted products stay as tombstones so terminals learn about removals
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
+    deleted_at = Column(DateTime, nullable=True)
+
+    # is_low = quantity <= reorder_level, kept in step by every stock write
+    # (backend/low_stock_utils.refresh_low_stock)
+    reorder_level = Column(Integer, default=3, server_default="3", nullable=False)
+    is_low = Column(Boolean, default=False, server_default="0", nullable=False)
      
     @validates("price")
     def validate_price(self, key, value):
@@ -44,6 +61,11 @@ class Sales(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     is_demo = Column(Boolean, default=False, nullable=False)
 
+    # snapshot at sale time: profit never drifts when product prices change
+    unit_price = Column(Float, nullable=True)
+    unit_cost = Column(Float, nullable=True)
+    product_name = Column(String(255), nullable=True)
+
     product = relationship("Product")
     order = relationship("Order", back_populates="sales")
 
@@ -59,6 +81,13 @@ class Business(Base):
     password_hash = Column(String(255), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # onboarding demo state (keeps demo logic off the record_sale hot path)
+    has_real_sale = Column(Boolean, default=False, nullable=False)
+    demo_sales_pending = Column(Integer, default=0, nullable=False, index=True)  # demo orders not yet purged
+
+    # local calendar for "today" / reports (IANA name, e.g. Africa/Nairobi)
+    timezone = Column(String(50), default="Africa/Nairobi", nullable=False)
+
     users = relationship("User", back_populates="business")
     products = relationship("Product", back_populates="business")
     subscription = relationship("Subscription", back_populates="business", uselist=False)
@@ -104,9 +133,15 @@ class Subscription(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # order numbers are allocated per business (see OrderCounter)
+        UniqueConstraint("business_id", "order_code", name="uq_order_code_business"),
+        # time-window queries (dashboard, report pages) are range scans on this
+        Index("ix_orders_business_created", "business_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    order_code = Column(String(20), unique=True, index=True)
+    order_code = Column(String(20), index=True)
     business_id = Column(Integer, ForeignKey("business.id"), nullable=False)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
     client_name = Column(String(100), nullable=True)
@@ -119,6 +154,50 @@ class Order(Base):
     sales = relationship("Sales", back_populates="order")
     creator = relationship("User", back_populates="orders")
 
+class OrderCounter(Base):
+    __tablename__ = "order_counters"
+
+    business_id = Column(Integer, ForeignKey("business.id"), primary_key=True)
+    next_value = Column(Integer, nullable=False, default=1)
+
+    prefix = Column(String(10), nullable=True)  # None -> "ORD"
+    gap_free = Column(Boolean, default=False, nullable=False)
+    # gap_free = True: numbers taken inside the sale transaction (row lock),
+    # so a rolled-back sale never burns a number. Slower, opt-in.
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("business_id", "endpoint", "key", name="uq_idempotency_key"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    business_id = Column(Integer, nullable=False)
+    endpoint = Column(String(30), nullable=False)   # e.g. record_sale
+    key = Column(String(64), nullable=False)        # Idempotency-Key header
+    request_hash = Column(String(32), nullable=False)
+
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(Text, nullable=False)    # JSON
+
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # TTL pruning
+
+class DailySalesRollup(Base):
+    __tablename__ = "daily_sales_rollup"
+
+    # one row per business / day / product / cashier (real sales only, no demo)
+    business_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    created_by = Column(Integer, primary_key=True, default=0)  # 0 = unknown user
+
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+    cost = Column(Float, nullable=False, default=0)         # buying price x qty
+    order_count = Column(Integer, nullable=False, default=0)  # orders containing this product
+
 class PushSubscription(Base):
     __tablename__ = "push_subscriptions"
 
@@ -146,6 +225,11 @@ class OnboardingEvent(Base):
 
 class InventoryMovement(Base):
     __tablename__ = "inventory_movements"
+    __table_args__ = (
+        Index("ix_inventory_movements_business_created", "business_id", "created_at"),
+        # product history: keyset pages on (product_id, created_at, id)
+        Index("ix_inventory_movements_product_created", "product_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
 
@@ -165,8 +249,99 @@ class InventoryMovement(Base):
     reason = Column(String(255), nullable=True)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # insert time (created_at is business time: offline sales sync with their
+    # original sale time); reconciliation / snapshots settle ids by this
+    recorded_at = Column(DateTime, default=datetime.utcnow, index=True)
     product = relationship("Product")
 
+
+class Stocktake(Base):
+    """A counting session: counts are posted in batches, applied on close."""
+    __tablename__ = "stocktakes"
+    __table_args__ = (
+        Index("ix_stocktakes_business_status", "business_id", "status"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    business_id = Column(Integer, ForeignKey("business.id"), nullable=False)
+
+    status = Column(String(20), nullable=False, default="open")
+    # open, closed, cancelled
+
+    notes = Column(String(255), nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    closed_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    closed_at = Column(DateTime, nullable=True)
+
+    # filled on close
+    adjusted_lines = Column(Integer, nullable=True)
+    variance_value = Column(Float, nullable=True)
+
+
+class StocktakeCount(Base):
+    """Latest counted quantity per product in a session (re-posting overwrites)."""
+    __tablename__ = "stocktake_counts"
+
+    stocktake_id = Column(Integer, ForeignKey("stocktakes.id"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    counted_qty = Column(Integer, nullable=False)
+    # Product.quantity when the count was recorded: the variance is taken
+    # against this, so sales / receipts during the session are kept
+    system_qty = Column(Integer, nullable=False, default=0, server_default="0")
+    counted_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    counted_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CatalogVersion(Base):
+    """Per-business catalog counter: bumped in the same transaction as any product write."""
+    __tablename__ = "catalog_versions"
+
+    business_id = Column(Integer, ForeignKey("business.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class LedgerCheckpoint(Base):
+    """Ledger balance per product up to last_movement_id (reconciliation resumes here)."""
+    __tablename__ = "ledger_checkpoints"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    business_id = Column(Integer, ForeignKey("business.id"), nullable=False, index=True)
+    last_movement_id = Column(Integer, nullable=False, default=0)
+    balance = Column(Integer, nullable=False, default=0)
+    checked_at = Column(DateTime, default=datetime.utcnow)
+
+
+class StockSnapshot(Base):
+    """Ledger stock per product at `as_of` (business-local midnight, naive UTC)."""
+    __tablename__ = "stock_snapshots"
+
+    business_id = Column(Integer, ForeignKey("business.id"), primary_key=True)
+    as_of = Column(DateTime, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+
+    quantity = Column(Integer, nullable=False)
+    value = Column(Float, nullable=False, default=0)  # quantity x buying price when taken
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class StockSnapshotHeader(Base):
+    """
+    One row per snapshot, even one with no product rows. The snapshot holds
+    every movement with created_at < as_of AND id <= last_movement_id; movements
+    above the mark with an earlier created_at (offline sales synced late) are
+    replayed on top of it.
+    """
+    __tablename__ = "stock_snapshot_headers"
+
+    business_id = Column(Integer, ForeignKey("business.id"), primary_key=True)
+    as_of = Column(DateTime, primary_key=True)
+
+    last_movement_id = Column(Integer, nullable=False, default=0)
+    product_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 from sqlalchemy import Column, Integer, String, Float, DateTime
 from datetime import datetime
 
@@ -184,6 +359,10 @@ class Supplier(Base):
 
 class Purchase(Base):
     __tablename__ = "purchases"
+    __table_args__ = (
+        # purchase history pages: range scans per business, newest first
+        Index("ix_purchases_business_created", "business_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     business_id = Column(Integer, nullable=False)
@@ -192,7 +371,7 @@ class Purchase(Base):
     total_amount = Column(Float, default=0)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    supplier_id = Column(Integer, ForeignKey("suppliers.id"), nullable=True)
+    supplier_id = Column(Integer, ForeignKey("suppliers.id"), nullable=True, index=True)
 
     items = relationship("PurchaseItem", backref="purchase", cascade="all, delete")
 
@@ -200,7 +379,7 @@ class PurchaseItem(Base):
     __tablename__ = "purchase_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    purchase_id = Column(Integer, ForeignKey("purchases.id"), nullable=False)
+    purchase_id = Column(Integer, ForeignKey("purchases.id"), nullable=False, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     quantity = Column(Integer, nullable=False)
     buying_price = Column(Float, nullable=False)
@@ -1,10 +1,30 @@
 from sqlalchemy.exc import IntegrityError
 from backend import models
 
-def record_onboarding_event(db, business_id: int, event: str):
+# (business_id, event) pairs already known to be stored.
+# Lets hot paths (e.g. record_sale) skip the insert entirely once recorded.
+_recorded_events = set()
+
+def record_onboarding_event(db, business_id: int, event: str, commit: bool = True):
+    key = (business_id, event)
+    if key in _recorded_events:
+        return
+
+    if not commit:
+        # ✅ Inside the caller's transaction: use a SAVEPOINT so a duplicate
+        # doesn't roll back the caller's work. Caller commits.
+        try:
+            with db.begin_nested():
+                db.add(models.OnboardingEvent(business_id=business_id, event=event))
+        except IntegrityError:
+            _recorded_events.add(key)  # already exists (unique constraint), ignore
+        return
+
     try:
         obj = models.OnboardingEvent(business_id=business_id, event=event)
         db.add(obj)
         db.commit()
     except IntegrityError:
         db.rollback()  # already exists (unique constraint), ignore
+
+    _recorded_events.add(key)
@@ -0,0 +1,154 @@
+# backend/order_code_utils.py
+#
+# Per-business order numbers backed by the order_counters table.
+#
+# Default mode: each worker process reserves a BLOCK of numbers in a short
+# separate transaction, then hands them out from memory. Most sales never
+# touch the counter row. Unused numbers are lost when a worker restarts
+# (gaps), and codes from different workers may interleave.
+#
+# gap_free mode (opt-in per business): the counter row is locked and bumped
+# inside the sale transaction, so numbers are consecutive with no gaps.
+import os
+import threading
+
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from backend import models
+from backend.db import engine
+
+ORDER_CODE_BLOCK_SIZE = int(os.getenv("ORDER_CODE_BLOCK_SIZE", 50))
+DEFAULT_PREFIX = "ORD"
+
+_lock = threading.Lock()       # guards the two dicts below, never held across SQL
+_business_locks = {}           # business_id -> Lock (one slow counter row can't stall other businesses)
+_blocks = {}                   # business_id -> _Block
+
+
+class _Block:
+    __slots__ = ("next", "end", "prefix", "gap_free")
+
+    def __init__(self, next_value, end, prefix, gap_free):
+        self.next = next_value
+        self.end = end
+        self.prefix = prefix
+        self.gap_free = gap_free
+
+
+def format_order_code(prefix, number: int) -> str:
+    return f"{prefix or DEFAULT_PREFIX}-{number:05d}"
+
+
+def _create_counter(business_id: int):
+    """
+    First sale for this business: start above every existing order id,
+    so new codes never clash with the old global ORD-<id> codes.
+    """
+    try:
+        with engine.begin() as conn:
+            last_id = conn.execute(
+                select(func.coalesce(func.max(models.Order.id), 0))
+                .where(models.Order.business_id == business_id)
+            ).scalar()
+            conn.execute(
+                insert(models.OrderCounter).values(
+                    business_id=business_id,
+                    next_value=last_id + 1,
+                    gap_free=False
+                )
+            )
+    except IntegrityError:
+        pass  # another worker created it first
+
+
+def _take_block(business_id: int) -> _Block:
+    """
+    Reserve the next block in its own short transaction (not the sale's),
+    so the counter row lock is held for one UPDATE only.
+    gap_free counters are read but not advanced.
+    """
+    for _ in range(2):
+        with engine.begin() as conn:
+            result = conn.execute(
+                update(models.OrderCounter)
+                .where(models.OrderCounter.business_id == business_id)
+                .values(
+                    next_value=models.OrderCounter.next_value + case(
+                        (models.OrderCounter.gap_free == True, 0),
+                        else_=ORDER_CODE_BLOCK_SIZE
+                    )
+                )
+            )
+            if result.rowcount == 1:
+                row = conn.execute(
+                    select(
+                        models.OrderCounter.next_value,
+                        models.OrderCounter.prefix,
+                        models.OrderCounter.gap_free
+                    ).where(models.OrderCounter.business_id == business_id)
+                ).one()
+
+                if row.gap_free:
+                    return _Block(0, 0, row.prefix, True)
+                return _Block(
+                    row.next_value - ORDER_CODE_BLOCK_SIZE,
+                    row.next_value,
+                    row.prefix,
+                    False
+                )
+
+        _create_counter(business_id)
+
+    raise RuntimeError(f"Could not allocate order numbers for business {business_id}")
+
+
+def _next_gap_free(db, business_id: int) -> str:
+    """Lock + bump the counter inside the caller's transaction."""
+    counter = (
+        db.query(models.OrderCounter)
+        .filter(models.OrderCounter.business_id == business_id)
+        .with_for_update()
+        .one()
+    )
+    number = counter.next_value
+    counter.next_value = number + 1
+
+    if not counter.gap_free:
+        # switched back to block mode since we cached it
+        reset_order_code_cache(business_id)
+
+    return format_order_code(counter.prefix, number)
+
+
+def _business_lock(business_id: int) -> threading.Lock:
+    with _lock:
+        lock = _business_locks.get(business_id)
+        if lock is None:
+            lock = _business_locks[business_id] = threading.Lock()
+        return lock
+
+
+def allocate_order_code(db, business_id: int) -> str:
+    with _business_lock(business_id):
+        block = _blocks.get(business_id)
+        if block is None or (not block.gap_free and block.next >= block.end):
+            block = _take_block(business_id)
+            with _lock:
+                _blocks[business_id] = block
+
+        if not block.gap_free:
+            number = block.next
+            block.next += 1
+            return format_order_code(block.prefix, number)
+
+    return _next_gap_free(db, business_id)
+
+
+def reset_order_code_cache(business_id: int = None):
+    """Drop this process's reserved block(s) (e.g. after settings change)."""
+    with _lock:
+        if business_id is None:
+            _blocks.clear()
+        else:
+            _blocks.pop(business_id, None)
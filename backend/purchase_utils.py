@@ -0,0 +1,298 @@
+# backend/purchase_utils.py
+#
+# Receive Stock pipeline. A supplier invoice of N lines is ONE transaction with
+# a fixed number of statements, whatever N is:
+#   1) one SELECT ... FOR UPDATE for every referenced product, in id order
+#      (same lock order as sales -> no deadlocks between tills and receiving)
+#   2) one INSERT for the purchase header
+#   3) one multi-row INSERT each for purchase_items and inventory_movements
+#   4) one UPDATE for new prices (CASE by id), one for stock (increment_stock)
+#   5) single commit
+#
+# Purchase history: keyset pages on (created_at, id) over
+# ix_purchases_business_created; the detail view loads items + product names
+# with selectinload (one query per level, no N+1).
+from datetime import date, datetime
+
+from fastapi import HTTPException
+from sqlalchemy import and_, case, func, insert, or_, update
+from sqlalchemy.orm import selectinload
+
+from backend import models
+from backend.catalog_utils import mark_catalog_changed
+from backend.low_stock_utils import refresh_low_stock
+from backend.report_utils import decode_cursor, encode_cursor
+from backend.stock_utils import increment_stock, run_with_retry
+from backend.time_utils import business_timezone, day_range
+
+PURCHASE_PAGE_SIZE = 25
+PURCHASE_PAGE_MAX = 100
+
+
+def lock_invoice_products(db, business_id: int, product_ids):
+    """{id: row} for the invoice's products, row-locked in primary-key order."""
+    rows = (
+        db.query(models.Product.id, models.Product.price, models.Product.buying_price)
+        .filter(
+            models.Product.id.in_(sorted(product_ids)),
+            models.Product.business_id == business_id,
+            models.Product.deleted_at.is_(None)
+        )
+        .order_by(models.Product.id)
+        .with_for_update()
+        .all()
+    )
+    return {r.id: r for r in rows}
+
+
+def update_invoice_prices(db, business_id: int, buying_by_product: dict, price_by_product: dict):
+    """New buying / selling prices from the invoice in one UPDATE (CASE by id)."""
+    ids = sorted(set(buying_by_product) | set(price_by_product))
+    if not ids:
+        return
+
+    values = {}
+    if buying_by_product:
+        values["buying_price"] = case(
+            buying_by_product, value=models.Product.id, else_=models.Product.buying_price
+        )
+    if price_by_product:
+        values["price"] = case(
+            price_by_product, value=models.Product.id, else_=models.Product.price
+        )
+
+    db.execute(
+        update(models.Product)
+        .where(models.Product.id.in_(ids), models.Product.business_id == business_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    mark_catalog_changed(db, business_id)
+
+
+def receive_stock(db, business_id: int, user_id: int, payload, idempotency=None):
+    """
+    payload: supplier_id, invoice_number, notes, items [product_id, quantity,
+    buying_price, selling_price]. Lines with quantity <= 0 are skipped.
+    Returns {"message", "purchase_id", "total"}. Deadlocks retry the whole
+    transaction; if an IdempotencyGuard is given its key is saved in it too.
+    """
+    lines = [item for item in payload.items if item.quantity > 0]
+
+    def work():
+        products = lock_invoice_products(db, business_id, {item.product_id for item in lines})
+
+        qty_by_product = {}
+        buying_by_product, price_by_product = {}, {}
+        for item in lines:
+            product = products.get(item.product_id)
+            if not product:
+                raise HTTPException(status_code=404, detail=f"Product not found (id={item.product_id})")
+
+            qty_by_product[item.product_id] = qty_by_product.get(item.product_id, 0) + item.quantity
+
+            # ✅ new stock with new buying/selling price updates the product master prices
+            # (a later line for the same product wins)
+            if item.buying_price is not None:
+                buying_by_product[item.product_id] = float(item.buying_price)
+            if item.selling_price is not None:
+                price_by_product[item.product_id] = float(item.selling_price)
+
+        # same rule as Product.validate_price (Core UPDATEs skip ORM validators)
+        for product_id, price in price_by_product.items():
+            buying = buying_by_product.get(product_id, products[product_id].buying_price)
+            if buying and price < buying:
+                raise HTTPException(status_code=400, detail="Selling price cannot be below buying price")
+
+        total_amount = round(sum(
+            float(item.buying_price) * item.quantity
+            for item in lines if item.buying_price is not None
+        ), 2)
+
+        purchase = models.Purchase(
+            business_id=business_id,
+            supplier_id=payload.supplier_id,
+            invoice_number=payload.invoice_number,
+            notes=payload.notes,
+            created_by=user_id,
+            total_amount=total_amount
+        )
+        db.add(purchase)
+        db.flush()  # gives purchase.id before commit
+
+        now = datetime.utcnow()
+        reason = f"Receive Stock ({payload.invoice_number or 'No Invoice'})"
+
+        if lines:
+            db.execute(insert(models.PurchaseItem), [
+                {
+                    "purchase_id": purchase.id,
+                    "product_id": item.product_id,
+                    "quantity": item.quantity,
+                    "buying_price": item.buying_price or 0,
+                    "subtotal": (float(item.buying_price) * item.quantity) if item.buying_price is not None else 0.0,
+                }
+                for item in lines
+            ])
+            db.execute(insert(models.InventoryMovement), [
+                {
+                    "business_id": business_id,
+                    "product_id": item.product_id,
+                    "movement_type": "purchase",
+                    "quantity": item.quantity,           # positive = stock in
+                    "reference_id": purchase.id,
+                    "reason": reason,
+                    "created_by": user_id,
+                    "created_at": now,
+                }
+                for item in lines
+            ])
+
+        update_invoice_prices(db, business_id, buying_by_product, price_by_product)
+
+        # ✅ Update stock: one atomic UPDATE for all received products
+        increment_stock(db, business_id, qty_by_product)
+        refresh_low_stock(db, business_id, list(qty_by_product))
+
+        body = {"message": "✅ Stock received successfully", "purchase_id": purchase.id, "total": purchase.total_amount}
+        if idempotency:
+            idempotency.save(db, body)
+
+        db.commit()
+        return body
+
+    return run_with_retry(db, work)
+
+
+# -------------------------------------------------
+# Purchase history
+# -------------------------------------------------
+def fetch_purchase_page(
+    db,
+    business_id: int,
+    limit: int = PURCHASE_PAGE_SIZE,
+    cursor: str = None,
+    supplier_id: int = None,
+    date_from: date = None,
+    date_to: date = None,
+    invoice: str = None
+):
+    """Newest first: {"items": [...], "next_cursor": str | None}."""
+    limit = max(1, min(limit, PURCHASE_PAGE_MAX))
+    Purchase = models.Purchase
+
+    q = (
+        db.query(
+            Purchase.id,
+            Purchase.created_at,
+            Purchase.invoice_number,
+            Purchase.notes,
+            Purchase.total_amount,
+            Purchase.supplier_id,
+            models.Supplier.name.label("supplier_name"),
+        )
+        .outerjoin(models.Supplier, models.Supplier.id == Purchase.supplier_id)
+        .filter(Purchase.business_id == business_id)
+    )
+
+    if supplier_id:
+        q = q.filter(Purchase.supplier_id == supplier_id)
+
+    if date_from or date_to:
+        start, end = day_range(business_timezone(db, business_id), date_from, date_to)
+        if start:
+            q = q.filter(Purchase.created_at >= start)
+        if end:
+            q = q.filter(Purchase.created_at < end)
+
+    invoice = (invoice or "").strip()
+    if invoice:
+        # prefix match stays an index-friendly range
+        escaped = invoice.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        q = q.filter(Purchase.invoice_number.like(f"{escaped}%", escape="\\"))
+
+    if cursor:
+        after_date, after_id = decode_cursor(cursor)
+        q = q.filter(or_(
+            Purchase.created_at < after_date,
+            and_(Purchase.created_at == after_date, Purchase.id < after_id)
+        ))
+
+    # one extra row tells us whether another page exists
+    rows = q.order_by(Purchase.created_at.desc(), Purchase.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # line counts for the whole page in one grouped query
+    line_counts = {}
+    if rows:
+        line_counts = dict(
+            db.query(models.PurchaseItem.purchase_id, func.count(models.PurchaseItem.id))
+            .filter(models.PurchaseItem.purchase_id.in_([r.id for r in rows]))
+            .group_by(models.PurchaseItem.purchase_id)
+            .all()
+        )
+
+    items = [
+        {
+            "id": r.id,
+            "created_at": r.created_at,
+            "invoice_number": r.invoice_number,
+            "notes": r.notes,
+            "supplier_id": r.supplier_id,
+            "supplier_name": r.supplier_name,
+            "total_amount": r.total_amount or 0,
+            "line_count": line_counts.get(r.id, 0),
+        }
+        for r in rows
+    ]
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def purchase_detail(db, business_id: int, purchase_id: int):
+    purchase = (
+        db.query(models.Purchase)
+        .options(
+            selectinload(models.Purchase.items)
+            .selectinload(models.PurchaseItem.product)
+            .load_only(models.Product.id, models.Product.name, models.Product.item_code)
+        )
+        .filter(models.Purchase.id == purchase_id, models.Purchase.business_id == business_id)
+        .first()
+    )
+    if not purchase:
+        raise HTTPException(status_code=404, detail="Purchase not found")
+
+    supplier_name = None
+    if purchase.supplier_id:
+        supplier_name = db.query(models.Supplier.name).filter(
+            models.Supplier.id == purchase.supplier_id
+        ).scalar()
+
+    return {
+        "id": purchase.id,
+        "created_at": purchase.created_at,
+        "invoice_number": purchase.invoice_number,
+        "notes": purchase.notes,
+        "supplier_id": purchase.supplier_id,
+        "supplier_name": supplier_name,
+        "total_amount": purchase.total_amount or 0,
+        "created_by": purchase.created_by,
+        "items": [
+            {
+                "id": item.id,
+                "product_id": item.product_id,
+                "product_name": item.product.name if item.product else None,
+                "item_code": item.product.item_code if item.product else None,
+                "quantity": item.quantity,
+                "buying_price": item.buying_price,
+                "subtotal": item.subtotal,
+            }
+            for item in sorted(purchase.items, key=lambda i: i.id)
+        ],
+    }
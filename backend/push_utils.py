@@ -0,0 +1,74 @@
+# backend/push_utils.py
+#
+# Web push to every subscribed device of a business (PushSubscription rows).
+# Expired subscriptions (404 / 410 from the push service) are deleted.
+import json
+import os
+from pathlib import Path
+
+from pywebpush import webpush, WebPushException
+
+from backend import models
+
+
+def vapid_key_path(business_id: int):
+    """Write VAPID_PRIVATE_KEY_PEM to a temp file for pywebpush (None if not configured)."""
+    vapid_private_pem = os.getenv("VAPID_PRIVATE_KEY_PEM")
+    if not vapid_private_pem:
+        return None
+
+    pem_text = vapid_private_pem.replace("\\n", "\n").strip()
+    pem_path = Path(f"/tmp/vapid_private_{business_id}.pem")
+    pem_path.write_text(pem_text, encoding="utf-8")
+    return pem_path
+
+
+def send_push_to_business(db, business_id: int, title: str, body: str, url: str = "/auth/dashboard", subs=None):
+    """Returns {"sent", "failed", "deleted"}. Raises RuntimeError if VAPID isn't configured."""
+    if subs is None:
+        subs = db.query(models.PushSubscription).filter(
+            models.PushSubscription.business_id == business_id
+        ).all()
+
+    sent = 0
+    failed = 0
+    deleted = 0
+    if not subs:
+        return {"sent": sent, "failed": failed, "deleted": deleted}
+
+    pem_path = vapid_key_path(business_id)
+    if not pem_path:
+        raise RuntimeError("VAPID_PRIVATE_KEY_PEM not set")
+    vapid_sub = os.getenv("VAPID_SUB", "mailto:admin@smartpos.local")
+
+    for sub in subs:
+        try:
+            webpush(
+                subscription_info={
+                    "endpoint": sub.endpoint,
+                    "keys": {"p256dh": sub.p256dh, "auth": sub.auth}
+                },
+                data=json.dumps({"title": title, "body": body, "url": url}),
+                vapid_private_key=str(pem_path),
+                vapid_claims={"sub": vapid_sub}
+            )
+            sent += 1
+
+        except WebPushException as ex:
+            failed += 1
+
+            status_code = None
+            try:
+                if ex.response is not None:
+                    status_code = ex.response.status_code
+            except Exception:
+                status_code = None
+
+            if status_code in (404, 410):
+                db.delete(sub)
+                deleted += 1
+
+    if deleted:
+        db.commit()
+
+    return {"sent": sent, "failed": failed, "deleted": deleted}
@@ -0,0 +1,366 @@
+# backend/report_utils.py
+#
+# Sales report queries.
+# Filters run in SQL and pages are keyset-paginated on (Order.created_at, Sales.id)
+# so page N costs the same as page 1. Rows are plain columns, never ORM objects.
+# Product name + cost come from the Sales snapshot, so there is no products join.
+import base64
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, or_, text
+
+from backend import models
+from backend.db import SessionLocal
+from backend.rollup_utils import rollup_totals
+from backend.time_utils import business_timezone, day_range
+
+REPORT_PAGE_SIZE = 25
+REPORT_PAGE_MAX = 200
+FILTER_OPTIONS_MAX = 500
+
+
+def encode_cursor(created_at: datetime, sale_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{sale_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, sale_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(sale_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def sales_rows_query(
+    db,
+    business_id: int,
+    date_from: date = None,
+    date_to: date = None,
+    order_code: str = None,
+    client: str = None,
+    sales_person: str = None,
+    product: str = None
+):
+    """Column-only report rows with every filter applied in SQL (newest first)."""
+    q = (
+        db.query(
+            models.Sales.id.label("sale_id"),
+            models.Order.order_code,
+            models.Order.created_at.label("date"),
+            models.Order.client_name,
+            models.Order.sales_person,
+            models.Sales.product_name,
+            models.Sales.quantity,
+            models.Sales.total_price.label("subtotal"),
+            models.Sales.unit_cost.label("buying_price"),
+            models.Sales.is_demo
+        )
+        .join(models.Order, models.Sales.order_id == models.Order.id)
+        .filter(models.Order.business_id == business_id)  # demo rows stay visible
+    )
+
+    # local calendar days -> UTC bounds (range scan on (business_id, created_at))
+    start, end = day_range(business_timezone(db, business_id), date_from, date_to)
+    if start:
+        q = q.filter(models.Order.created_at >= start)
+    if end:
+        q = q.filter(models.Order.created_at < end)
+
+    if order_code:
+        q = q.filter(models.Order.order_code == order_code)
+    if client:
+        q = q.filter(models.Order.client_name == client)
+    if sales_person:
+        q = q.filter(models.Order.sales_person == sales_person)
+    if product:
+        q = q.filter(models.Sales.product_name == product)
+
+    return q.order_by(models.Order.created_at.desc(), models.Sales.id.desc())
+
+
+def fetch_sales_page(db, business_id: int, limit: int = REPORT_PAGE_SIZE, cursor: str = None, **filters):
+    """One window of the report: {"items": [...], "next_cursor": str | None}."""
+    limit = max(1, min(limit, REPORT_PAGE_MAX))
+    q = sales_rows_query(db, business_id, **filters)
+
+    if cursor:
+        after_date, after_id = decode_cursor(cursor)
+        q = q.filter(or_(
+            models.Order.created_at < after_date,
+            and_(models.Order.created_at == after_date, models.Sales.id < after_id)
+        ))
+
+    # one extra row tells us whether another page exists
+    rows = q.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = [
+        {
+            "order_code": r.order_code,
+            "date": r.date,
+            "client_name": r.client_name,
+            "sales_person": r.sales_person,
+            "product_name": r.product_name,
+            "quantity": r.quantity,
+            "subtotal": r.subtotal,
+            "buying_price": r.buying_price or 0,
+            "is_demo": bool(r.is_demo)
+        }
+        for r in rows
+    ]
+
+    next_cursor = encode_cursor(rows[-1].date, rows[-1].sale_id) if has_more else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def sales_filter_options(db, business_id: int):
+    """Distinct values for the report dropdowns (small, indexed queries)."""
+    def distinct(column):
+        rows = (
+            db.query(column)
+            .filter(models.Order.business_id == business_id, column.isnot(None))
+            .distinct()
+            .order_by(column)
+            .limit(FILTER_OPTIONS_MAX)
+            .all()
+        )
+        return [r[0] for r in rows if r[0]]
+
+    recent_orders = (
+        db.query(models.Order.order_code)
+        .filter(models.Order.business_id == business_id, models.Order.order_code.isnot(None))
+        .order_by(models.Order.id.desc())
+        .limit(FILTER_OPTIONS_MAX)
+        .all()
+    )
+
+    products = (
+        db.query(models.Product.name)
+        .filter(models.Product.business_id == business_id, models.Product.deleted_at.is_(None))
+        .order_by(models.Product.name)
+        .all()
+    )
+
+    return {
+        "order_codes": [r[0] for r in recent_orders],
+        "clients": distinct(models.Order.client_name),
+        "sales_people": distinct(models.Order.sales_person),
+        "products": [r[0] for r in products]
+    }
+
+
+def sales_summary(db, business_id: int, date_from: date = None, date_to: date = None,
+                  sales_person: str = None, product: str = None):
+    """Range totals from daily_sales_rollup (real sales only)."""
+    created_by = None
+    if sales_person:
+        created_by = db.query(models.User.id).filter(
+            models.User.business_id == business_id,
+            models.User.username == sales_person
+        ).scalar()
+        if created_by is None:
+            created_by = -1  # unknown name -> empty totals
+
+    product_id = None
+    if product:
+        product_id = db.query(models.Product.id).filter(
+            models.Product.business_id == business_id,
+            models.Product.name == product
+        ).scalar()
+        if product_id is None:
+            product_id = -1
+
+    return rollup_totals(
+        db, business_id,
+        day_from=date_from, day_to=date_to,
+        created_by=created_by, product_id=product_id
+    )
+
+
+# -------------------------------------------------
+# GROUP BY aggregates (day / product / sales_person / client)
+# -------------------------------------------------
+AGGREGATE_DIMENSIONS = ("day", "product", "sales_person", "client")
+ROLLUP_DIMENSIONS = {"day", "product", "sales_person"}
+
+
+def _local_day(db, column, offset_minutes: int):
+    """DATE(column shifted to local time), per dialect."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        return func.date(func.date_add(column, text(f"INTERVAL {int(offset_minutes)} MINUTE")))
+    if dialect == "postgresql":
+        return func.date(column + text(f"INTERVAL '{int(offset_minutes)} minutes'"))
+    return func.date(column, f"{int(offset_minutes):+d} minutes")
+
+
+def aggregate_sales(db, business_id: int, group_by, date_from: date = None, date_to: date = None):
+    """
+    Grouped sums of quantity, revenue, cost, profit computed in SQL (real sales only).
+    day / product / sales_person come from daily_sales_rollup; anything with
+    client falls back to sales x orders (join-free snapshot columns).
+    """
+    group_by = list(dict.fromkeys(g for g in group_by if g in AGGREGATE_DIMENSIONS))
+    tz = business_timezone(db, business_id)
+
+    if set(group_by) <= ROLLUP_DIMENSIONS:
+        Rollup = models.DailySalesRollup
+        dims = {
+            "day": Rollup.day,
+            "product": models.Product.name,
+            "sales_person": func.coalesce(models.User.username, "-"),
+        }
+        q = db.query(
+            *[dims[g].label(g) for g in group_by],
+            func.sum(Rollup.quantity).label("quantity"),
+            func.sum(Rollup.revenue).label("revenue"),
+            func.sum(Rollup.cost).label("cost"),
+        ).select_from(Rollup).filter(Rollup.business_id == business_id)
+
+        if "product" in group_by:
+            q = q.outerjoin(models.Product, models.Product.id == Rollup.product_id)
+        if "sales_person" in group_by:
+            q = q.outerjoin(models.User, models.User.id == Rollup.created_by)
+        if date_from:
+            q = q.filter(Rollup.day >= date_from)
+        if date_to:
+            q = q.filter(Rollup.day <= date_to)
+    else:
+        # fixed offset for the shop's current UTC offset (exact for no-DST zones)
+        offset = int(datetime.now(tz).utcoffset().total_seconds() // 60)
+        dims = {
+            "day": _local_day(db, models.Order.created_at, offset),
+            "product": models.Sales.product_name,
+            "sales_person": models.Order.sales_person,
+            "client": models.Order.client_name,
+        }
+        q = (
+            db.query(
+                *[dims[g].label(g) for g in group_by],
+                func.sum(models.Sales.quantity).label("quantity"),
+                func.sum(models.Sales.total_price).label("revenue"),
+                func.sum(func.coalesce(models.Sales.unit_cost, 0) * models.Sales.quantity).label("cost"),
+            )
+            .select_from(models.Sales)
+            .join(models.Order, models.Sales.order_id == models.Order.id)
+            .filter(models.Order.business_id == business_id, models.Sales.is_demo == False)
+        )
+        start, end = day_range(tz, date_from, date_to)
+        if start:
+            q = q.filter(models.Order.created_at >= start)
+        if end:
+            q = q.filter(models.Order.created_at < end)
+
+    if group_by:
+        exprs = [dims[g] for g in group_by]
+        q = q.group_by(*exprs).order_by(*exprs)
+
+    rows = []
+    for r in q.all():
+        revenue = float(r.revenue or 0)
+        cost = float(r.cost or 0)
+        row = {g: (str(getattr(r, g)) if g == "day" else getattr(r, g)) for g in group_by}
+        row.update({
+            "quantity": int(r.quantity or 0),
+            "revenue": round(revenue, 2),
+            "cost": round(cost, 2),
+            "profit": round(revenue - cost, 2),
+        })
+        rows.append(row)
+
+    totals = {
+        key: round(sum(r[key] for r in rows), 2)
+        for key in ("quantity", "revenue", "cost", "profit")
+    }
+    totals["quantity"] = int(totals["quantity"])
+
+    return {"group_by": group_by, "rows": rows, "totals": totals}
+
+
+# -------------------------------------------------
+# Streaming export (CSV / NDJSON, optional gzip)
+# -------------------------------------------------
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_COLUMNS = (
+    "date", "order_code", "client_name", "sales_person", "product_name",
+    "quantity", "subtotal", "unit_cost", "profit",
+)
+EXPORT_BATCH_ROWS = 2000     # server-side cursor fetch size
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+
+def _export_lines(rows, fmt: str):
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(EXPORT_COLUMNS)
+        yield buf.getvalue()
+
+    for r in rows:
+        cost = (r.buying_price or 0) * r.quantity
+        values = (
+            r.date.isoformat() if r.date else None,
+            r.order_code,
+            r.client_name,
+            r.sales_person,
+            r.product_name,
+            r.quantity,
+            round(r.subtotal, 2),
+            r.buying_price or 0,
+            round(r.subtotal - cost, 2),
+        )
+        if fmt == "csv":
+            buf.seek(0)
+            buf.truncate()
+            writer.writerow(values)
+            yield buf.getvalue()
+        else:
+            yield json.dumps(dict(zip(EXPORT_COLUMNS, values))) + "\n"
+
+
+def stream_sales_export(business_id: int, fmt: str, date_from: date = None,
+                        date_to: date = None, compress: bool = False):
+    """
+    Generator of bytes for a StreamingResponse. Uses its own session and a
+    server-side cursor, so memory stays flat however long the history is.
+    Real sales only, oldest first.
+    """
+    db = SessionLocal()
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # 31 = gzip framing
+    try:
+        rows = (
+            sales_rows_query(db, business_id, date_from=date_from, date_to=date_to)
+            .filter(models.Sales.is_demo == False)
+            .order_by(None)
+            .order_by(models.Order.created_at, models.Sales.id)
+            .execution_options(stream_results=True)
+            .yield_per(EXPORT_BATCH_ROWS)
+        )
+
+        pending = []
+        size = 0
+        for line in _export_lines(rows, fmt):
+            pending.append(line)
+            size += len(line)
+            if size >= EXPORT_FLUSH_BYTES:
+                chunk = "".join(pending).encode("utf-8")
+                pending, size = [], 0
+                chunk = gz.compress(chunk) if gz else chunk
+                if chunk:
+                    yield chunk
+
+        tail = "".join(pending).encode("utf-8")
+        if gz:
+            tail = gz.compress(tail) + gz.flush()
+        if tail:
+            yield tail
+    finally:
+        db.close()
@@ -0,0 +1,259 @@
+# backend/rollup_utils.py
+#
+# daily_sales_rollup: pre-aggregated sales per (business, local day, product, cashier).
+# - record_sale / sync_batch add to it in the SAME transaction as the sale rows
+# - dashboard, report totals and superadmin revenue read it instead of
+#   rescanning orders x sales (a month is a few hundred rows, not millions)
+# - demo sales are never counted
+#
+# Rebuild from history:
+#   python -m backend.rollup_utils              (every business)
+#   python -m backend.rollup_utils --business 12
+# A timezone change schedules the same rebuild in a background thread.
+import argparse
+import threading
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, select
+
+from backend import models
+from backend.db import SessionLocal
+from backend.time_utils import business_timezone, local_date, reset_timezone_cache
+
+Rollup = models.DailySalesRollup
+
+
+def rollup_day(tz, created_at: datetime):
+    """Rollup bucket for a sale timestamp: the business-local calendar day."""
+    return local_date(tz, created_at)
+
+
+def _upsert(db, rows):
+    """INSERT ... ON DUPLICATE KEY / ON CONFLICT adding to the counters."""
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(Rollup)
+        new = stmt.inserted
+        stmt = stmt.on_duplicate_key_update(
+            quantity=Rollup.quantity + new.quantity,
+            revenue=Rollup.revenue + new.revenue,
+            cost=Rollup.cost + new.cost,
+            order_count=Rollup.order_count + new.order_count,
+        )
+    else:
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(Rollup)
+        new = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["business_id", "day", "product_id", "created_by"],
+            set_={
+                "quantity": Rollup.quantity + new.quantity,
+                "revenue": Rollup.revenue + new.revenue,
+                "cost": Rollup.cost + new.cost,
+                "order_count": Rollup.order_count + new.order_count,
+            },
+        )
+
+    db.execute(stmt, rows)
+
+
+def add_to_rollup(db, business_id: int, created_by, sales):
+    """
+    sales: [(created_at, [(product_id, quantity, revenue, cost), ...]), ...]
+    One multi-row upsert for the whole call. Does NOT commit.
+    """
+    tz = business_timezone(db, business_id)
+    totals = {}
+    for created_at, lines in sales:
+        day = rollup_day(tz, created_at)
+        in_order = set()
+        for product_id, quantity, revenue, cost in lines:
+            key = (day, product_id)
+            row = totals.setdefault(key, [0, 0.0, 0.0, 0])
+            row[0] += quantity
+            row[1] += revenue
+            row[2] += cost
+            if product_id not in in_order:
+                in_order.add(product_id)
+                row[3] += 1
+
+    if not totals:
+        return
+
+    # sorted keys -> concurrent tills lock rows in the same order (fewer deadlocks)
+    rows = [
+        {
+            "business_id": business_id,
+            "day": day,
+            "product_id": product_id,
+            "created_by": created_by or 0,
+            "quantity": quantity,
+            "revenue": revenue,
+            "cost": cost,
+            "order_count": order_count,
+        }
+        for (day, product_id), (quantity, revenue, cost, order_count) in sorted(totals.items())
+    ]
+    _upsert(db, rows)
+
+
+# -------------------------------------------------
+# Reads
+# -------------------------------------------------
+def rollup_totals(db, business_id: int, day_from=None, day_to=None, created_by=None, product_id=None):
+    """{"quantity", "revenue", "cost", "profit", "margin"} over an inclusive day range."""
+    q = db.query(
+        func.coalesce(func.sum(Rollup.quantity), 0).label("quantity"),
+        func.coalesce(func.sum(Rollup.revenue), 0).label("revenue"),
+        func.coalesce(func.sum(Rollup.cost), 0).label("cost"),
+    ).filter(Rollup.business_id == business_id)
+
+    if day_from:
+        q = q.filter(Rollup.day >= day_from)
+    if day_to:
+        q = q.filter(Rollup.day <= day_to)
+    if created_by is not None:
+        q = q.filter(Rollup.created_by == created_by)
+    if product_id is not None:
+        q = q.filter(Rollup.product_id == product_id)
+
+    r = q.one()
+    revenue = float(r.revenue or 0)
+    cost = float(r.cost or 0)
+    return {
+        "quantity": int(r.quantity or 0),
+        "revenue": round(revenue, 2),
+        "cost": round(cost, 2),
+        "profit": round(revenue - cost, 2),
+        "margin": round((revenue - cost) * 100 / revenue, 1) if revenue else 0.0,  # %
+    }
+
+
+def revenue_by_business_subquery(db):
+    """business_id -> lifetime revenue, for superadmin listings."""
+    return (
+        db.query(
+            Rollup.business_id.label("business_id"),
+            func.sum(Rollup.revenue).label("total_revenue"),
+        )
+        .group_by(Rollup.business_id)
+        .subquery()
+    )
+
+
+# -------------------------------------------------
+# Rebuild (backfill / repair)
+# -------------------------------------------------
+def rebuild_daily_rollup(db, business_id: int = None) -> int:
+    """
+    Recompute rollup rows from orders + sales, one transaction per business.
+    Lines are streamed in order-id order and bucketed by LOCAL day in Python
+    (DST-safe, no DB timezone tables needed).
+    Safe while the business keeps selling: its rollup rows (and on InnoDB the
+    gaps between them) are locked BEFORE any sale is read, so a sale that
+    commits meanwhile waits at its rollup upsert and then adds on top of the
+    rebuilt rows -- never lost, never counted twice. Those tills wait for the
+    rebuild, so run big backfills off-peak.
+    Returns the number of businesses rebuilt.
+    """
+    if business_id is None:
+        business_ids = [r[0] for r in db.query(models.Business.id).order_by(models.Business.id).all()]
+    else:
+        business_ids = [business_id]
+
+    for bid in business_ids:
+        # fresh transaction: its read snapshot must start after the lock below
+        db.commit()
+        db.execute(
+            select(Rollup.business_id).where(Rollup.business_id == bid).with_for_update()
+        ).all()
+
+        reset_timezone_cache(bid)
+        tz = business_timezone(db, bid)
+
+        db.execute(delete(Rollup).where(Rollup.business_id == bid))
+
+        lines = (
+            db.query(
+                models.Order.id,
+                models.Order.created_at,
+                models.Order.created_by,
+                models.Sales.product_id,
+                models.Sales.quantity,
+                models.Sales.total_price,
+                models.Sales.unit_cost,
+            )
+            .join(models.Order, models.Sales.order_id == models.Order.id)
+            .filter(models.Order.business_id == bid, models.Sales.is_demo == False)
+            .order_by(models.Order.id)
+            .yield_per(5000)
+        )
+
+        totals = {}
+        for order_id, created_at, created_by, product_id, quantity, revenue, unit_cost in lines:
+            key = (rollup_day(tz, created_at), product_id, created_by or 0)
+            row = totals.setdefault(key, [0, 0.0, 0.0, 0, None])
+            row[0] += quantity
+            row[1] += revenue
+            row[2] += (unit_cost or 0) * quantity
+            if row[4] != order_id:  # lines arrive grouped by order
+                row[3] += 1
+                row[4] = order_id
+
+        rows = [
+            {
+                "business_id": bid,
+                "day": day,
+                "product_id": product_id,
+                "created_by": created_by,
+                "quantity": quantity,
+                "revenue": revenue,
+                "cost": cost,
+                "order_count": order_count,
+            }
+            for (day, product_id, created_by), (quantity, revenue, cost, order_count, _) in totals.items()
+        ]
+        for start in range(0, len(rows), 1000):
+            db.execute(insert(Rollup), rows[start:start + 1000])
+        db.commit()
+
+    return len(business_ids)
+
+
+def _rebuild_in_background(business_id: int):
+    db = SessionLocal()
+    try:
+        rebuild_daily_rollup(db, business_id)
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ daily_sales_rollup rebuild failed for business {business_id}:", e)
+    finally:
+        db.close()
+
+
+def schedule_rollup_rebuild(business_id: int, on_done=None):
+    """Rebuild one business's rollup in a background thread (not in the request)."""
+    def run():
+        _rebuild_in_background(business_id)
+        if on_done:
+            on_done(business_id)
+
+    threading.Thread(target=run, daemon=True, name=f"rollup-rebuild-{business_id}").start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild daily_sales_rollup from orders/sales")
+    parser.add_argument("--business", type=int, default=None, help="only this business id")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        done = rebuild_daily_rollup(session, args.business)
+        print(f"✅ daily_sales_rollup rebuilt for {done} business(es)")
+    finally:
+        session.close()
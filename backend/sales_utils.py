@@ -0,0 +1,461 @@
+# backend/sales_utils.py
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from backend import models
+from backend.onboarding_utils import record_onboarding_event
+from backend.dashboard_utils import invalidate_dashboard
+from backend.low_stock_utils import refresh_low_stock
+from backend.demo_utils import is_established, remember_established, track_sale
+from backend.order_code_utils import allocate_order_code
+from backend.rollup_utils import add_to_rollup
+from backend.stock_utils import StockConflict, decrement_stock, run_with_retry
+from backend.idempotency_utils import (
+    IdempotencyGuard, find_stored_responses, remember_many, request_fingerprint, save_many
+)
+
+
+# -------------------------------------------------
+# Cart loading + validation (reads only)
+# -------------------------------------------------
+def load_cart_products(db, business_id: int, items):
+    """
+    Fetch every product referenced by the cart in ONE query.
+    Returns {product_name: row} with id, name, quantity, buying_price.
+    """
+    names = {item.product_name for item in items}
+    if not names:
+        return {}
+
+    rows = (
+        db.query(
+            models.Product.id,
+            models.Product.name,
+            models.Product.quantity,
+            models.Product.buying_price,
+        )
+        .filter(
+            models.Product.business_id == business_id,
+            models.Product.deleted_at.is_(None),
+            models.Product.name.in_(names)
+        )
+        .all()
+    )
+
+    return {r.name: r for r in rows}
+
+
+def validate_sale_lines(products_by_name, items, check_stock: bool):
+    """
+    Check EVERY line before anything is written.
+    Same rules + messages as the old per-line loop, but stock is checked
+    against the total quantity per product (duplicate lines add up).
+    Returns a list of (item, product_row) pairs.
+    """
+    lines = []
+    needed = OrderedDict()
+
+    for item in items:
+        product = products_by_name.get(item.product_name)
+
+        if not product:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Product '{item.product_name}' not found"
+            )
+
+        # Selling below buying price still blocked
+        if product.buying_price is not None and item.selling_price < product.buying_price:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Selling price for '{product.name}' cannot be below buying price"
+            )
+
+        needed[product.id] = needed.get(product.id, 0) + item.quantity
+        lines.append((item, product))
+
+    # stock check ONLY for real sales (demo sale should not scare them with stock issues)
+    if check_stock:
+        for item, product in lines:
+            if (product.quantity or 0) < needed[product.id]:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Not enough stock for '{item.product_name}'"
+                )
+
+    return lines
+
+
+# -------------------------------------------------
+# Write path (single transaction, bulk inserts)
+# -------------------------------------------------
+def write_sales(db, business_id: int, user: dict, sales, is_demo_sale: bool):
+    """
+    Write one or more orders + stock decrement + sales rows + inventory movements
+    + daily rollup.
+    `sales` is a list of {"client_name", "lines", optional "created_at"}.
+    Sales rows and movements for ALL orders go out as one multi-row INSERT each,
+    and stock for ALL orders is decremented with one conditional UPDATE.
+    Does NOT commit: the caller owns the transaction.
+    """
+    qty_by_product = OrderedDict()
+    orders = []
+    results = []
+
+    # offline (synced) sales carry the time they actually happened
+    stamped = any(sale.get("created_at") for sale in sales)
+    now = datetime.utcnow()
+
+    for sale in sales:
+        total_amount = 0
+        total_profit = 0.0
+
+        for item, product in sale["lines"]:
+            subtotal = item.selling_price * item.quantity
+            total_amount += subtotal
+
+            bp = product.buying_price if product.buying_price is not None else 0
+            total_profit += (item.selling_price - bp) * item.quantity
+
+            qty_by_product[product.id] = qty_by_product.get(product.id, 0) + item.quantity
+
+        # ✅ per-business number (usually from this worker's reserved block, no query)
+        order_code = allocate_order_code(db, business_id)
+
+        # total is known up-front, so the order is written once (no UPDATE later)
+        new_order = models.Order(
+            order_code=order_code,
+            business_id=business_id,
+            client_name=sale.get("client_name"),
+            sales_person=user["username"],   # ← AUTO FROM TOKEN
+            created_by=user["user_id"],      # ← SECURE USER LINK
+            total_amount=total_amount
+        )
+        if stamped:
+            new_order.created_at = sale.get("created_at") or now
+
+        orders.append(new_order)
+        results.append({
+            "order_code": order_code,
+            "total_amount": total_amount,
+            "total_profit": round(float(total_profit), 2),
+        })
+
+    db.add_all(orders)
+    db.flush()  # gives order ids before commit
+
+    # ✅ one conditional UPDATE for every product in the basket(s)
+    # (stock check + decrement happen atomically in the DB). It runs BEFORE the
+    # sales / movement INSERTs: their foreign-key checks take shared locks on
+    # the product rows, and two tills upgrading shared locks on a hot SKU
+    # deadlock every time. Taking the exclusive locks first makes them queue.
+    # demo sale: stock is NOT reduced and no ledger rows are written
+    if not is_demo_sale:
+        decrement_stock(db, business_id, qty_by_product)
+
+    sale_rows = []
+    movement_rows = []
+
+    for sale, new_order, result in zip(sales, orders, results):
+        result["order_id"] = new_order.id
+        extra = {"created_at": new_order.created_at} if stamped else {}
+
+        for item, product in sale["lines"]:
+            sale_rows.append({
+                "order_id": new_order.id,
+                "product_id": product.id,
+                "quantity": item.quantity,
+                "total_price": item.selling_price * item.quantity,
+                "is_demo": is_demo_sale,
+                "unit_price": item.selling_price,
+                "unit_cost": product.buying_price or 0,
+                "product_name": product.name,
+                **extra,
+            })
+            movement_rows.append({
+                "product_id": product.id,
+                "business_id": business_id,
+                "movement_type": "sale",
+                "quantity": -item.quantity,     # negative because stock leaves
+                "reference_id": new_order.id,   # link to the order
+                "reason": "POS Sale",
+                **extra,
+            })
+
+    # ✅ one multi-row INSERT for all sale lines
+    db.execute(insert(models.Sales), sale_rows)
+
+    if not is_demo_sale:
+        db.execute(insert(models.InventoryMovement), movement_rows)
+        refresh_low_stock(db, business_id, list(qty_by_product))
+
+        # ✅ daily rollup rows move in the same transaction as the sale
+        add_to_rollup(db, business_id, user["user_id"], [
+            (
+                sale.get("created_at") or now,
+                [
+                    (
+                        product.id,
+                        item.quantity,
+                        item.selling_price * item.quantity,
+                        (product.buying_price or 0) * item.quantity,
+                    )
+                    for item, product in sale["lines"]
+                ],
+            )
+            for sale in sales
+        ])
+
+    return results
+
+
+def sale_response(result, is_demo_sale: bool):
+    message = "Order recorded successfully!"
+    if is_demo_sale:
+        message = (
+            "Demo sale recorded successfully. "
+            "Your stock was NOT reduced. "
+            "After your first real sale, this demo is cleared from your records automatically "
+            "within a few minutes."
+        )
+
+    return {
+        "message": message,
+        "order_code": result["order_code"],
+        "total_amount": result["total_amount"],
+        "total_profit": result["total_profit"],
+        "is_demo": is_demo_sale
+    }
+
+
+def process_sale(db, business_id: int, user: dict, client_name, items, is_demo_sale: bool,
+                 idempotency=None, created_at=None, established: bool = True):
+    """
+    Full sale pipeline in ONE transaction:
+      1) one SELECT for every cart product
+      2) validate every line (nothing written yet)
+      3) order + conditional stock update + bulk sales/movements
+         (+ demo state on Business, only until the first real sale)
+      4) single commit
+    Any failure rolls the whole sale back, so no half-written orders.
+    Deadlocks retry the whole transaction with backoff.
+    If an IdempotencyGuard is given, its key row is saved in the same transaction.
+    """
+    def work():
+        products_by_name = load_cart_products(db, business_id, items)
+        lines = validate_sale_lines(products_by_name, items, check_stock=not is_demo_sale)
+
+        result = write_sales(
+            db, business_id, user,
+            [{"client_name": client_name, "lines": lines, "created_at": created_at}],
+            is_demo_sale
+        )[0]
+
+        track_sale(db, business_id, is_demo_sale, established)
+
+        record_onboarding_event(db, business_id, "sell_product", commit=False)
+
+        if idempotency:
+            idempotency.save(db, sale_response(result, is_demo_sale))
+
+        db.commit()
+        return result
+
+    try:
+        result = run_with_retry(db, work)
+    except StockConflict:
+        # Another till sold the stock between our read and our write.
+        # Re-read (fresh transaction) so the cashier gets the usual message.
+        products_by_name = load_cart_products(db, business_id, items)
+        validate_sale_lines(products_by_name, items, check_stock=True)
+        raise HTTPException(status_code=409, detail="Stock changed while saving the sale. Please try again.")
+
+    if not is_demo_sale:
+        remember_established(business_id)
+    invalidate_dashboard(business_id)
+
+    return result
+
+
+# -------------------------------------------------
+# Offline sync: many queued sales in one request
+# -------------------------------------------------
+SYNC_CHUNK_SIZE = 50
+
+
+def _sale_result(key, status, order_code=None, detail=None):
+    out = {"idempotency_key": key, "status": status}
+    if order_code:
+        out["order_code"] = order_code
+    if detail:
+        out["detail"] = detail
+    return out
+
+
+def _sync_one(db, business_id: int, user: dict, order, established: bool):
+    """Fallback: one queued sale through the normal single-sale pipeline."""
+    guard = IdempotencyGuard(
+        db, None, business_id, "record_sale", order["request"], key=order["key"]
+    )
+    try:
+        replay = guard.replay()
+        if replay:
+            return _sale_result(order["key"], "duplicate", json.loads(replay.body).get("order_code"))
+
+        result = process_sale(
+            db, business_id, user,
+            client_name=order["request"].client_name,
+            items=order["request"].items,
+            is_demo_sale=False,
+            idempotency=guard,
+            created_at=order.get("created_at"),
+            established=established
+        )
+        guard.remember()
+        return _sale_result(order["key"], "accepted", result["order_code"])
+
+    except IntegrityError:
+        try:
+            guard.replay_after_conflict()
+        except HTTPException as e:
+            return _sale_result(order["key"], "rejected", detail=e.detail)
+        return _sale_result(order["key"], "duplicate")
+    except HTTPException as e:
+        return _sale_result(order["key"], "rejected", detail=e.detail)
+    except Exception as e:
+        # one bad sale must not fail (and block) the rest of the device's queue
+        db.rollback()
+        return _sale_result(order["key"], "rejected", detail=f"Could not be saved ({e.__class__.__name__})")
+
+
+def _sync_chunk(db, business_id: int, user: dict, chunk, established: bool):
+    """
+    One chunk = 1 key lookup + 1 product query + one transaction with
+    bulk inserts and a single conditional stock UPDATE for every accepted sale.
+    """
+    outcome = [None] * len(chunk)
+
+    # 1) already recorded (online attempt that lost its response, or earlier sync)
+    stored = find_stored_responses(
+        db, business_id, "record_sale", [o["key"] for o in chunk]
+    )
+    pending = []
+    seen = {}  # key -> request_hash of its first sale in this chunk
+    for i, order in enumerate(chunk):
+        key = order["key"]
+        if key in stored or key in seen:
+            request_hash, _, body = stored.get(key, (seen.get(key), None, {}))
+            # same check as IdempotencyGuard.replay(): a reused key with a
+            # different sale is an error, not that key's old receipt
+            if request_hash != order["request_hash"]:
+                outcome[i] = _sale_result(
+                    key, "rejected", detail="Idempotency-Key was already used for a different request"
+                )
+            else:
+                outcome[i] = _sale_result(key, "duplicate", body.get("order_code"))
+        else:
+            seen[key] = order["request_hash"]
+            pending.append(i)
+
+    # 2) validate against a running stock count (earlier sales in the chunk consume stock)
+    all_items = [item for i in pending for item in chunk[i]["request"].items]
+    products_by_name = load_cart_products(db, business_id, all_items)
+    remaining = {p.id: (p.quantity or 0) for p in products_by_name.values()}
+
+    accepted = []
+    for i in pending:
+        order = chunk[i]
+        try:
+            lines = validate_sale_lines(products_by_name, order["request"].items, check_stock=False)
+        except HTTPException as e:
+            outcome[i] = _sale_result(order["key"], "rejected", detail=e.detail)
+            continue
+
+        needed = OrderedDict()
+        for item, product in lines:
+            needed[product.id] = needed.get(product.id, 0) + item.quantity
+
+        short = next((item for item, product in lines if remaining[product.id] < needed[product.id]), None)
+        if short:
+            outcome[i] = _sale_result(
+                order["key"], "rejected", detail=f"Not enough stock for '{short.product_name}'"
+            )
+            continue
+
+        for product_id, qty in needed.items():
+            remaining[product_id] -= qty
+        accepted.append((i, lines))
+
+    if not accepted:
+        db.rollback()  # end the read transaction
+        return outcome
+
+    # 3) write every accepted sale in ONE transaction
+    def work():
+        results = write_sales(
+            db, business_id, user,
+            [
+                {
+                    "client_name": chunk[i]["request"].client_name,
+                    "lines": lines,
+                    "created_at": chunk[i].get("created_at"),
+                }
+                for i, lines in accepted
+            ],
+            is_demo_sale=False
+        )
+
+        track_sale(db, business_id, False, established)
+
+        saved = save_many(db, business_id, "record_sale", [
+            (chunk[i]["key"], chunk[i]["request_hash"], sale_response(result, False))
+            for (i, _), result in zip(accepted, results)
+        ])
+
+        db.commit()
+        return results, saved
+
+    try:
+        results, saved = run_with_retry(db, work)
+    except Exception:
+        # a till sold the same stock meanwhile, a key arrived concurrently, or
+        # one row broke the bulk write: redo this chunk one sale at a time so
+        # each gets an exact answer
+        for i, _ in accepted:
+            outcome[i] = _sync_one(db, business_id, user, chunk[i], established)
+        return outcome
+
+    remember_many(saved)
+    remember_established(business_id)
+    for (i, _), result in zip(accepted, results):
+        outcome[i] = _sale_result(chunk[i]["key"], "accepted", result["order_code"])
+
+    return outcome
+
+
+def process_sale_batch(db, business_id: int, user: dict, orders):
+    """
+    orders: [{"key", "request" (SaleRequest), "created_at"}] in till order.
+    Commits every SYNC_CHUNK_SIZE sales. Returns one result per order:
+    accepted / duplicate / rejected (+ detail).
+    """
+    for order in orders:
+        order["request_hash"] = request_fingerprint(order["request"])
+
+    established = is_established(db, business_id)
+
+    results = []
+    for start in range(0, len(orders), SYNC_CHUNK_SIZE):
+        results.extend(_sync_chunk(db, business_id, user, orders[start:start + SYNC_CHUNK_SIZE], established))
+        established = established or any(r["status"] == "accepted" for r in results)
+
+    if any(r["status"] == "accepted" for r in results):
+        record_onboarding_event(db, business_id, "sell_product")
+        invalidate_dashboard(business_id)
+
+    return results
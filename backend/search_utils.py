@@ -0,0 +1,140 @@
+# backend/search_utils.py
+#
+# Product typeahead + barcode lookup.
+# - lookup: unique (business_id, item_code) index -> one indexed hit
+# - search: per-business in-memory prefix index (sorted keys + bisect), built
+#   from (id, name, item_code) only; product writes call invalidate_search_index().
+#   Entries also expire after SEARCH_INDEX_SECONDS (other workers' writes).
+#   Matching ids are then loaded by primary key, so stock/prices are always fresh.
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from backend import models
+
+SEARCH_INDEX_SECONDS = int(os.getenv("SEARCH_INDEX_SECONDS", 300))
+SEARCH_LIMIT_DEFAULT = 10
+SEARCH_LIMIT_MAX = 50
+
+_indexes = {}   # business_id -> (expires_at, keys, ids)
+_lock = threading.Lock()
+
+
+def normalize_code(code):
+    """Blank codes are stored as NULL so the unique index ignores them."""
+    code = (code or "").strip()
+    return code or None
+
+
+def invalidate_search_index(business_id: int):
+    with _lock:
+        _indexes.pop(business_id, None)
+
+
+def _index_keys(name: str, item_code: str):
+    name = (name or "").lower()
+    keys = {name}
+    # every word start, so "milk" finds "Fresh Milk 500ml"
+    words = name.split()
+    for i in range(1, len(words)):
+        keys.add(" ".join(words[i:]))
+    if item_code:
+        keys.add(item_code.lower())
+    return keys
+
+
+def _build_index(db, business_id: int):
+    rows = (
+        db.query(models.Product.id, models.Product.name, models.Product.item_code)
+        .filter(models.Product.business_id == business_id, models.Product.deleted_at.is_(None))
+        .all()
+    )
+    entries = sorted(
+        (key, r.id)
+        for r in rows
+        for key in _index_keys(r.name, r.item_code)
+    )
+    return [k for k, _ in entries], [i for _, i in entries]
+
+
+def _get_index(db, business_id: int):
+    hit = _indexes.get(business_id)
+    if hit and hit[0] > time.monotonic():
+        return hit[1], hit[2]
+
+    keys, ids = _build_index(db, business_id)
+    with _lock:
+        _indexes[business_id] = (time.monotonic() + SEARCH_INDEX_SECONDS, keys, ids)
+    return keys, ids
+
+
+def search_product_ids(db, business_id: int, q: str, limit: int = SEARCH_LIMIT_DEFAULT):
+    """Ids of products whose name / a name word / code starts with q (alphabetical)."""
+    prefix = (q or "").strip().lower()
+    if not prefix:
+        return []
+
+    keys, ids = _get_index(db, business_id)
+    found = []
+    seen = set()
+    i = bisect_left(keys, prefix)
+    while i < len(keys) and keys[i].startswith(prefix) and len(found) < limit:
+        if ids[i] not in seen:
+            seen.add(ids[i])
+            found.append(ids[i])
+        i += 1
+    return found
+
+
+def lookup_by_code(db, business_id: int, code: str):
+    code = normalize_code(code)
+    if not code:
+        return None
+    return (
+        db.query(
+            models.Product.id,
+            models.Product.name,
+            models.Product.item_code,
+            models.Product.packaging_unit,
+            models.Product.price,
+            models.Product.buying_price,
+            models.Product.quantity,
+            models.Product.reorder_level,
+            models.Product.is_low,
+        )
+        .filter(
+            models.Product.business_id == business_id,
+            models.Product.item_code == code,
+            models.Product.deleted_at.is_(None)
+        )
+        .first()
+    )
+
+
+def load_products_by_ids(db, business_id: int, product_ids):
+    """Slim rows for the given ids, returned in the same order."""
+    if not product_ids:
+        return []
+    rows = (
+        db.query(
+            models.Product.id,
+            models.Product.name,
+            models.Product.item_code,
+            models.Product.packaging_unit,
+            models.Product.price,
+            models.Product.buying_price,
+            models.Product.quantity,
+            models.Product.reorder_level,
+            models.Product.is_low,
+        )
+        .filter(
+            models.Product.business_id == business_id,
+            models.Product.id.in_(product_ids),
+            # another worker's index may still list a product deleted since
+            models.Product.deleted_at.is_(None)
+        )
+        .all()
+    )
+    by_id = {r.id: r for r in rows}
+    return [by_id[i] for i in product_ids if i in by_id]
@@ -0,0 +1,285 @@
+# backend/snapshot_utils.py
+#
+# Point-in-time stock: "what was on the shelf at <date>".
+# stock_snapshots holds ledger quantities per product at business-local midnight.
+# A stock-as-of query reads the closest snapshot at or before the requested
+# instant and replays only the movements after it (one range scan on
+# ix_inventory_movements_business_created), so it stays fast as the ledger grows.
+# - snapshots are built from the previous snapshot + one day of movements
+# - each snapshot has a header row (written even when no product has stock)
+#   with a movement-id high-water mark; offline sales synced AFTER the snapshot
+#   carry an earlier created_at but a higher id, and are replayed by id
+# - the background job keeps one per day for SNAPSHOT_DAILY_DAYS, then only the
+#   1st of each month (= month-end stock)
+#
+# Take today's snapshot by hand (e.g. after a restore):
+#   python -m backend.snapshot_utils [--business 12]
+import argparse
+import os
+import threading
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import delete, func, insert
+
+from backend import models
+from backend.db import SessionLocal
+from backend.ledger_utils import settled_movement_id
+from backend.time_utils import business_timezone, day_range, local_date, to_utc
+
+SNAPSHOT_SWEEP_SECONDS = int(os.getenv("SNAPSHOT_SWEEP_SECONDS", 3600))  # 0 = off
+# wait this long after midnight, and only mark ids inserted at least this long
+# ago: a lower id may belong to a transaction that hasn't committed yet
+SNAPSHOT_LAG_SECONDS = 300
+SNAPSHOT_DAILY_DAYS = 62
+
+Snapshot = models.StockSnapshot
+Header = models.StockSnapshotHeader
+Movement = models.InventoryMovement
+
+
+def latest_snapshot(db, business_id: int, at: datetime = None):
+    """Header of the newest snapshot taken at or before `at` (None if there is none)."""
+    q = db.query(Header).filter(Header.business_id == business_id)
+    if at is not None:
+        q = q.filter(Header.as_of <= at)
+    return q.order_by(Header.as_of.desc()).first()
+
+
+def latest_snapshot_at(db, business_id: int, at: datetime = None):
+    """as_of of the newest snapshot taken at or before `at` (None if there is none)."""
+    q = db.query(func.max(Header.as_of)).filter(Header.business_id == business_id)
+    if at is not None:
+        q = q.filter(Header.as_of <= at)
+    return q.scalar()
+
+
+def movement_totals(db, business_id: int, start: datetime = None, end: datetime = None,
+                    after_id: int = None, upto_id: int = None):
+    """{product_id: net quantity} for movements in [start, end) and (after_id, upto_id]."""
+    q = db.query(Movement.product_id, func.sum(Movement.quantity)).filter(
+        Movement.business_id == business_id
+    )
+    if start is not None:
+        q = q.filter(Movement.created_at >= start)
+    if end is not None:
+        q = q.filter(Movement.created_at < end)
+    if after_id is not None:
+        q = q.filter(Movement.id > after_id)
+    if upto_id is not None:
+        q = q.filter(Movement.id <= upto_id)
+    return {pid: int(qty or 0) for pid, qty in q.group_by(Movement.product_id).all()}
+
+
+def ledger_quantities_at(db, business_id: int, at: datetime, upto_id: int = None):
+    """
+    Ledger stock per product at instant `at`: closest snapshot + replayed
+    movements (optionally only ids <= upto_id). Returns (quantities, header).
+    """
+    base = latest_snapshot(db, business_id, at)
+
+    quantities = {}
+    replay = movement_totals(db, business_id, base.as_of if base else None, at, upto_id=upto_id)
+    if base is not None:
+        quantities = dict(
+            db.query(Snapshot.product_id, Snapshot.quantity)
+            .filter(Snapshot.business_id == business_id, Snapshot.as_of == base.as_of)
+            .all()
+        )
+        # synced late: before the snapshot by business time, after it by id
+        late = movement_totals(db, business_id, None, base.as_of, after_id=base.last_movement_id, upto_id=upto_id)
+        for pid, qty in late.items():
+            replay[pid] = replay.get(pid, 0) + qty
+
+    for pid, qty in replay.items():
+        quantities[pid] = quantities.get(pid, 0) + qty
+
+    return quantities, base
+
+
+def take_snapshot(db, business_id: int, as_of: datetime) -> int:
+    """Write (or rewrite) the snapshot at `as_of`. Commits. Returns rows written."""
+    mark = settled_movement_id(db, SNAPSHOT_LAG_SECONDS)
+    base = latest_snapshot(db, business_id, as_of)
+    if base is not None:
+        mark = max(mark, base.last_movement_id)  # marks never go backwards
+
+    quantities, _ = ledger_quantities_at(db, business_id, as_of, upto_id=mark)
+
+    costs = dict(
+        db.query(models.Product.id, models.Product.buying_price)
+        .filter(models.Product.business_id == business_id)
+        .all()
+    )
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "business_id": business_id,
+            "as_of": as_of,
+            "product_id": pid,
+            "quantity": qty,
+            "value": round(qty * float(costs.get(pid) or 0), 2),
+            "created_at": now,
+        }
+        for pid, qty in sorted(quantities.items())
+        if qty  # missing product = 0 on the shelf
+    ]
+
+    # idempotent: another worker may have taken the same snapshot
+    db.execute(delete(Snapshot).where(Snapshot.business_id == business_id, Snapshot.as_of == as_of))
+    db.execute(delete(Header).where(Header.business_id == business_id, Header.as_of == as_of))
+    db.execute(insert(Header).values(
+        business_id=business_id,
+        as_of=as_of,
+        last_movement_id=mark,
+        product_count=len(rows),
+        created_at=now
+    ))
+    if rows:
+        db.execute(insert(Snapshot), rows)
+    db.commit()
+    return len(rows)
+
+
+def prune_snapshots(db, business_id: int, tz, today: date):
+    """Keep daily snapshots for SNAPSHOT_DAILY_DAYS, then only month starts."""
+    cutoff = to_utc(tz, datetime.combine(today - timedelta(days=SNAPSHOT_DAILY_DAYS), time.min))
+    old = [
+        r[0] for r in
+        db.query(Header.as_of).filter(Header.business_id == business_id, Header.as_of < cutoff).all()
+    ]
+    drop = [at for at in old if local_date(tz, at).day != 1]
+    if drop:
+        db.execute(delete(Snapshot).where(Snapshot.business_id == business_id, Snapshot.as_of.in_(drop)))
+        db.execute(delete(Header).where(Header.business_id == business_id, Header.as_of.in_(drop)))
+        db.commit()
+
+
+def snapshot_due(db, business_id: int, now: datetime = None):
+    """Last local midnight if no snapshot covers it yet (and it's past the lag), else None."""
+    now = now or datetime.utcnow()
+    tz = business_timezone(db, business_id)
+    midnight, _ = day_range(tz, local_date(tz, now))
+    if now - midnight < timedelta(seconds=SNAPSHOT_LAG_SECONDS):
+        return None
+    latest = latest_snapshot_at(db, business_id)
+    if latest is not None and latest >= midnight:
+        return None
+    return midnight
+
+
+def take_due_snapshots(db, business_id: int = None) -> int:
+    """Snapshot every business whose last local midnight isn't covered. Returns count."""
+    if business_id is None:
+        business_ids = [r[0] for r in db.query(models.Business.id).order_by(models.Business.id).all()]
+    else:
+        business_ids = [business_id]
+
+    taken = 0
+    for bid in business_ids:
+        as_of = snapshot_due(db, bid)
+        if as_of is None:
+            continue
+        take_snapshot(db, bid, as_of)
+        tz = business_timezone(db, bid)
+        prune_snapshots(db, bid, tz, local_date(tz))
+        taken += 1
+    return taken
+
+
+# -------------------------------------------------
+# Stock as of a date (valuation report)
+# -------------------------------------------------
+def stock_as_of(db, business_id: int, as_of_date: date):
+    """
+    Stock at the END of a business-local day. Each product is valued at the
+    unit cost stored in the snapshot the figure starts from; products that
+    snapshot doesn't hold (no stock then, or no snapshot yet) fall back to the
+    current buying price ("cost_source" says which).
+    """
+    tz = business_timezone(db, business_id)
+    _, at = day_range(tz, as_of_date, as_of_date)
+
+    quantities, base = ledger_quantities_at(db, business_id, at)
+
+    snapshot_costs = {}
+    if base is not None:
+        snapshot_costs = {
+            r.product_id: r.value / r.quantity
+            for r in db.query(Snapshot.product_id, Snapshot.quantity, Snapshot.value)
+            .filter(Snapshot.business_id == business_id, Snapshot.as_of == base.as_of)
+            .all()
+            if r.quantity
+        }
+
+    products = (
+        db.query(models.Product.id, models.Product.name, models.Product.buying_price)
+        .filter(models.Product.business_id == business_id, models.Product.id.in_(list(quantities)))
+        .order_by(models.Product.name)
+        .all()
+    ) if quantities else []
+
+    items = []
+    total_qty, total_value = 0, 0.0
+    for p in products:
+        qty = quantities[p.id]
+        if not qty:
+            continue
+        if p.id in snapshot_costs:
+            unit_cost, cost_source = snapshot_costs[p.id], "snapshot"
+        else:
+            unit_cost, cost_source = float(p.buying_price or 0), "current"
+        value = qty * unit_cost
+        items.append({
+            "product_id": p.id,
+            "name": p.name,
+            "quantity": qty,
+            "buying_price": round(unit_cost, 2),
+            "cost_source": cost_source,
+            "value": round(value, 2),
+        })
+        total_qty += qty
+        total_value += value
+
+    return {
+        "as_of": as_of_date.isoformat(),
+        "snapshot_at": base.as_of.isoformat() if base else None,
+        "items": items,
+        "totals": {"quantity": total_qty, "value": round(total_value, 2)},
+    }
+
+
+# -------------------------------------------------
+# Background job
+# -------------------------------------------------
+def _snapshot_forever(stop: threading.Event):
+    while not stop.wait(SNAPSHOT_SWEEP_SECONDS):
+        db = SessionLocal()
+        try:
+            take_due_snapshots(db)
+        except Exception as e:
+            db.rollback()
+            print("⚠️ stock snapshot job failed:", e)
+        finally:
+            db.close()
+
+
+def start_snapshot_job():
+    """Background thread, started once per worker on app startup."""
+    stop = threading.Event()
+    if SNAPSHOT_SWEEP_SECONDS > 0:
+        threading.Thread(target=_snapshot_forever, args=(stop,), daemon=True, name="stock-snapshots").start()
+    return stop
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Take due stock snapshots (last local midnight)")
+    parser.add_argument("--business", type=int, default=None, help="only this business id")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        done = take_due_snapshots(session, args.business)
+        print(f"✅ stock snapshots taken for {done} business(es)")
+    finally:
+        session.close()
@@ -0,0 +1,127 @@
+# backend/stock_utils.py
+import random
+import time
+
+from sqlalchemy import case, func, update
+from sqlalchemy.exc import OperationalError
+
+from backend import models
+from backend.catalog_utils import mark_catalog_changed
+
+# MySQL: 1213 = deadlock found, 1205 = lock wait timeout exceeded
+DEADLOCK_ERROR_CODES = (1213, 1205)
+
+MAX_ATTEMPTS = 4
+BASE_BACKOFF_SECONDS = 0.05
+
+
+class StockConflict(Exception):
+    """Raised when a conditional stock update did not match every row."""
+
+
+# -------------------------------------------------
+# Deadlock retry
+# -------------------------------------------------
+def is_deadlock(exc) -> bool:
+    if not isinstance(exc, OperationalError):
+        return False
+    args = getattr(exc.orig, "args", None) or ()
+    return bool(args) and args[0] in DEADLOCK_ERROR_CODES
+
+
+def run_with_retry(db, work, attempts: int = MAX_ATTEMPTS):
+    """
+    Run `work()` (which must do its own db.commit()) and retry the whole
+    transaction on deadlock / lock wait timeout with jittered exponential backoff.
+    Any other error rolls back and is re-raised.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return work()
+        except Exception as e:
+            db.rollback()
+            if not is_deadlock(e) or attempt == attempts:
+                raise
+            delay = BASE_BACKOFF_SECONDS * (2 ** (attempt - 1))
+            time.sleep(delay + random.uniform(0, delay))
+
+
+# -------------------------------------------------
+# Atomic stock updates (no read-modify-write in Python)
+# Each UPDATE locks its rows in primary-key order, and callers run it (or a
+# SELECT ... FOR UPDATE in id order) BEFORE inserting rows that reference the
+# products: child-row FK checks take shared locks on the product rows, and a
+# shared lock later upgraded to exclusive deadlocks against another till.
+# -------------------------------------------------
+def decrement_stock(db, business_id: int, qty_by_product: dict):
+    """
+    quantity -= qty for every product, but ONLY where quantity >= qty.
+    One UPDATE for the whole basket; if fewer rows matched than expected,
+    someone else sold the stock first -> StockConflict (caller rolls back).
+    """
+    if not qty_by_product:
+        return
+
+    ids = sorted(qty_by_product)
+    needed = case(qty_by_product, value=models.Product.id)
+
+    result = db.execute(
+        update(models.Product)
+        .where(
+            models.Product.id.in_(ids),
+            models.Product.business_id == business_id,
+            models.Product.quantity >= needed
+        )
+        .values(quantity=models.Product.quantity - needed)
+        .execution_options(synchronize_session=False)
+    )
+
+    if result.rowcount != len(ids):
+        raise StockConflict()
+    mark_catalog_changed(db, business_id)
+
+
+def increment_stock(db, business_id: int, qty_by_product: dict):
+    """quantity += qty for every product in one UPDATE (no lost updates)."""
+    if not qty_by_product:
+        return
+
+    ids = sorted(qty_by_product)
+
+    db.execute(
+        update(models.Product)
+        .where(
+            models.Product.id.in_(ids),
+            models.Product.business_id == business_id
+        )
+        .values(
+            quantity=func.coalesce(models.Product.quantity, 0)
+            + case(qty_by_product, value=models.Product.id)
+        )
+        .execution_options(synchronize_session=False)
+    )
+    mark_catalog_changed(db, business_id)
+
+
+def apply_stock_delta(db, business_id: int, product_id: int, signed_qty: int) -> bool:
+    """
+    quantity += signed_qty, refusing to go below 0.
+    Returns False if the row did not match (stock would go negative).
+    """
+    new_qty = func.coalesce(models.Product.quantity, 0) + signed_qty
+
+    result = db.execute(
+        update(models.Product)
+        .where(
+            models.Product.id == product_id,
+            models.Product.business_id == business_id,
+            new_qty >= 0
+        )
+        .values(quantity=new_qty)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    mark_catalog_changed(db, business_id)
+    return True
+
@@ -0,0 +1,316 @@
+# backend/stocktake_utils.py
+#
+# Stocktake (stock count) sessions.
+#   open   -> one open session per business
+#   counts -> counted quantities posted in batches (one multi-row upsert per
+#             post; re-counting a product overwrites its earlier count)
+#   close  -> ONE transaction: variances (counted - system quantity AT COUNT
+#             TIME, stored on the count row) computed in SQL, one INSERT ...
+#             SELECT of "adjustment" movements, one UPDATE adding each variance
+#             to the product's quantity
+# Stock that moved between a shelf's count and the close (sales, receipts) is
+# kept: only the difference found by the count is applied.
+# Products that were not counted are left alone (partial counts are fine).
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, insert, literal, select, update
+
+from backend import models
+from backend.catalog_utils import mark_catalog_changed
+from backend.low_stock_utils import refresh_low_stock
+
+STOCKTAKE_BATCH_MAX = 1000
+
+Stocktake = models.Stocktake
+Count = models.StocktakeCount
+
+
+def stocktake_dict(st):
+    return {
+        "id": st.id,
+        "status": st.status,
+        "notes": st.notes,
+        "created_at": st.created_at.isoformat() if st.created_at else None,
+        "closed_at": st.closed_at.isoformat() if st.closed_at else None,
+        "adjusted_lines": st.adjusted_lines,
+        "variance_value": st.variance_value,
+    }
+
+
+def get_stocktake(db, business_id: int, stocktake_id: int, for_update: bool = False):
+    q = db.query(Stocktake).filter(
+        Stocktake.id == stocktake_id,
+        Stocktake.business_id == business_id
+    )
+    if for_update:
+        q = q.with_for_update()
+    st = q.first()
+    if not st:
+        raise HTTPException(status_code=404, detail="Stocktake not found")
+    return st
+
+
+def require_open(st):
+    if st.status != "open":
+        raise HTTPException(status_code=409, detail=f"Stocktake is {st.status}")
+
+
+def open_stocktake(db, business_id: int, user_id: int, notes: str = None):
+    existing = db.query(Stocktake.id).filter(
+        Stocktake.business_id == business_id,
+        Stocktake.status == "open"
+    ).first()
+    if existing:
+        raise HTTPException(status_code=409, detail=f"Stocktake #{existing.id} is still open")
+
+    st = Stocktake(
+        business_id=business_id,
+        status="open",
+        notes=(notes or "").strip() or None,
+        created_by=user_id,
+        created_at=datetime.utcnow()
+    )
+    db.add(st)
+    db.commit()
+    db.refresh(st)
+    return st
+
+
+# -------------------------------------------------
+# Counts
+# -------------------------------------------------
+def _upsert_counts(db, rows):
+    """INSERT ... ON DUPLICATE KEY / ON CONFLICT replacing the earlier count."""
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(Count)
+        new = stmt.inserted
+        stmt = stmt.on_duplicate_key_update(
+            counted_qty=new.counted_qty,
+            system_qty=new.system_qty,
+            counted_by=new.counted_by,
+            counted_at=new.counted_at,
+        )
+    else:
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(Count)
+        new = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["stocktake_id", "product_id"],
+            set_={
+                "counted_qty": new.counted_qty,
+                "system_qty": new.system_qty,
+                "counted_by": new.counted_by,
+                "counted_at": new.counted_at,
+            },
+        )
+
+    db.execute(stmt, rows)
+
+
+def save_counts(db, business_id: int, stocktake_id: int, user_id: int, counts: dict):
+    """counts: {product_id: counted_qty}. Unknown / deleted products are reported, not saved."""
+    if len(counts) > STOCKTAKE_BATCH_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {STOCKTAKE_BATCH_MAX} counts per request"
+        )
+    if any(qty is None or qty < 0 for qty in counts.values()):
+        raise HTTPException(status_code=400, detail="Counted quantity cannot be negative")
+
+    st = get_stocktake(db, business_id, stocktake_id)
+    require_open(st)
+
+    # system quantity as of this count (the variance is measured against it)
+    known = dict(
+        db.query(models.Product.id, models.Product.quantity).filter(
+            models.Product.business_id == business_id,
+            models.Product.deleted_at.is_(None),
+            models.Product.id.in_(list(counts))
+        ).all()
+    ) if counts else {}
+
+    now = datetime.utcnow()
+    rows = [
+        {
+            "stocktake_id": st.id,
+            "product_id": product_id,
+            "counted_qty": counts[product_id],
+            "system_qty": known[product_id] or 0,
+            "counted_by": user_id,
+            "counted_at": now,
+        }
+        for product_id in sorted(known)
+    ]
+    if rows:
+        _upsert_counts(db, rows)
+    db.commit()
+
+    return {
+        "saved": len(rows),
+        "unknown_products": sorted(set(counts) - set(known)),
+    }
+
+
+# -------------------------------------------------
+# Variances (SQL)
+# -------------------------------------------------
+def _variance_columns(stocktake_id: int, business_id: int):
+    system_qty = Count.system_qty
+    variance = Count.counted_qty - system_qty
+    join = and_(
+        models.Product.id == Count.product_id,
+        models.Product.business_id == business_id,
+        models.Product.deleted_at.is_(None)
+    )
+    return system_qty, variance, join
+
+
+def stocktake_variances(db, business_id: int, stocktake_id: int, only_changed: bool = True):
+    """Counted vs system quantity at count time, per product (preview before closing)."""
+    system_qty, variance, join = _variance_columns(stocktake_id, business_id)
+
+    q = (
+        db.query(
+            Count.product_id,
+            models.Product.name,
+            system_qty.label("system_qty"),
+            func.coalesce(models.Product.quantity, 0).label("current_qty"),
+            Count.counted_qty,
+            variance.label("variance"),
+            (variance * func.coalesce(models.Product.buying_price, 0)).label("variance_value"),
+        )
+        .join(models.Product, join)
+        .filter(Count.stocktake_id == stocktake_id)
+    )
+    if only_changed:
+        q = q.filter(variance != 0)
+
+    return [
+        {
+            "product_id": r.product_id,
+            "name": r.name,
+            "system_qty": int(r.system_qty),
+            "current_qty": int(r.current_qty),
+            "counted_qty": r.counted_qty,
+            "variance": int(r.variance),
+            "variance_value": round(float(r.variance_value or 0), 2),
+        }
+        for r in q.order_by(models.Product.name).all()
+    ]
+
+
+def count_progress(db, stocktake_id: int):
+    return db.query(func.count(Count.product_id)).filter(
+        Count.stocktake_id == stocktake_id
+    ).scalar() or 0
+
+
+# -------------------------------------------------
+# Close
+# -------------------------------------------------
+def close_stocktake(db, business_id: int, stocktake_id: int, user_id: int):
+    """
+    Applies every variance in ONE transaction. Does its own commit, so call it
+    through run_with_retry(). Returns the closed session as a dict.
+    """
+    st = get_stocktake(db, business_id, stocktake_id, for_update=True)
+    require_open(st)
+
+    system_qty, variance, join = _variance_columns(stocktake_id, business_id)
+    counted = (
+        select(Count.product_id)
+        .join(models.Product, join)
+        .where(Count.stocktake_id == stocktake_id, variance != 0)
+    )
+
+    # lock the counted products in primary-key order (same order as sales /
+    # receive stock) so quantities can't move between the variance and the UPDATE
+    db.execute(
+        select(models.Product.id)
+        .where(models.Product.id.in_(counted))
+        .order_by(models.Product.id)
+        .with_for_update()
+    ).all()
+
+    totals = db.execute(
+        select(
+            func.count(Count.product_id),
+            func.coalesce(func.sum(variance * func.coalesce(models.Product.buying_price, 0)), 0)
+        )
+        .select_from(Count)
+        .join(models.Product, join)
+        .where(Count.stocktake_id == stocktake_id, variance != 0)
+    ).one()
+
+    now = datetime.utcnow()
+
+    # 1) ledger: one adjustment per product whose count differs
+    db.execute(
+        insert(models.InventoryMovement).from_select(
+            ["product_id", "business_id", "movement_type", "quantity",
+             "reference_id", "reason", "created_by", "created_at"],
+            select(
+                Count.product_id,
+                literal(business_id),
+                literal("adjustment"),
+                variance,
+                literal(stocktake_id),
+                literal(f"Stocktake #{stocktake_id}"),
+                literal(user_id),
+                literal(now),
+            )
+            .select_from(Count)
+            .join(models.Product, join)
+            .where(Count.stocktake_id == stocktake_id, variance != 0)
+            .order_by(Count.product_id)
+        )
+    )
+
+    # 2) cached stock += variance (one UPDATE; bumps updated_at for delta sync).
+    # A delta, not "= counted": movements since the count stay applied.
+    count_variance = (
+        select(Count.counted_qty - Count.system_qty)
+        .where(Count.stocktake_id == stocktake_id, Count.product_id == models.Product.id)
+        .scalar_subquery()
+    )
+    db.execute(
+        update(models.Product)
+        .where(
+            models.Product.business_id == business_id,
+            models.Product.deleted_at.is_(None),
+            # Count only: MySQL can't read `products` in a subquery of its own UPDATE
+            models.Product.id.in_(
+                select(Count.product_id).where(Count.stocktake_id == stocktake_id, variance != 0)
+            )
+        )
+        .values(quantity=func.coalesce(models.Product.quantity, 0) + count_variance)
+        .execution_options(synchronize_session=False)
+    )
+    mark_catalog_changed(db, business_id)
+
+    refresh_low_stock(db, business_id, select(Count.product_id).where(Count.stocktake_id == stocktake_id))
+
+    st.status = "closed"
+    st.closed_by = user_id
+    st.closed_at = now
+    st.adjusted_lines = int(totals[0] or 0)
+    st.variance_value = round(float(totals[1] or 0), 2)
+
+    db.commit()
+    return stocktake_dict(st)
+
+
+def cancel_stocktake(db, business_id: int, stocktake_id: int):
+    st = get_stocktake(db, business_id, stocktake_id, for_update=True)
+    require_open(st)
+    st.status = "cancelled"
+    st.closed_at = datetime.utcnow()
+    db.commit()
+    return stocktake_dict(st)
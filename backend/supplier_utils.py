@@ -0,0 +1,188 @@
+# backend/supplier_utils.py
+#
+# Supplier analytics: spend, invoices, deliveries, products supplied.
+# Everything is a grouped query over purchases / purchase_items (rows never
+# come back to Python one purchase at a time). Results are cached per business
+# until the next receipt (receive stock / invoice import call
+# invalidate_supplier_stats()); entries also expire after SUPPLIER_STATS_SECONDS
+# because other workers' receipts don't reach this process.
+import os
+import threading
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import case, func
+
+from backend import models
+
+SUPPLIER_STATS_SECONDS = int(os.getenv("SUPPLIER_STATS_SECONDS", 600))
+
+_cache = {}        # business_id -> (expires_at, {key: result})
+_generation = {}   # business_id -> bumped on every invalidation
+_lock = threading.Lock()
+
+
+def invalidate_supplier_stats(business_id: int):
+    """Call after a committed purchase."""
+    with _lock:
+        _cache.pop(business_id, None)
+        _generation[business_id] = _generation.get(business_id, 0) + 1
+
+
+def _cached(business_id: int, key, compute):
+    with _lock:
+        hit = _cache.get(business_id)
+        if hit and hit[0] > time.monotonic() and key in hit[1]:
+            return hit[1][key]
+        generation = _generation.get(business_id, 0)
+
+    result = compute()
+
+    with _lock:
+        # a purchase committed while we were computing -> don't cache a stale view
+        if _generation.get(business_id, 0) == generation:
+            hit = _cache.get(business_id)
+            if not hit or hit[0] <= time.monotonic():
+                hit = _cache[business_id] = (time.monotonic() + SUPPLIER_STATS_SECONDS, {})
+            hit[1][key] = result
+    return result
+
+
+def _delivery_days(first, last, invoices: int):
+    """Average days between deliveries (None until there are two)."""
+    if not first or not last or invoices < 2:
+        return None
+    return round((last - first).total_seconds() / 86400 / (invoices - 1), 1)
+
+
+def _supplier_rows(db, business_id: int, supplier_id: int = None):
+    Purchase = models.Purchase
+
+    # header totals per supplier (one row per supplier, LEFT JOIN keeps idle ones)
+    q = (
+        db.query(
+            models.Supplier.id,
+            models.Supplier.name,
+            models.Supplier.phone,
+            models.Supplier.email,
+            func.count(Purchase.id).label("invoices"),
+            func.coalesce(func.sum(Purchase.total_amount), 0).label("spend"),
+            func.min(Purchase.created_at).label("first_delivery"),
+            func.max(Purchase.created_at).label("last_delivery"),
+        )
+        .outerjoin(
+            Purchase,
+            (Purchase.supplier_id == models.Supplier.id) & (Purchase.business_id == business_id)
+        )
+        .filter(models.Supplier.business_id == business_id)
+        .group_by(models.Supplier.id, models.Supplier.name, models.Supplier.phone, models.Supplier.email)
+    )
+    if supplier_id is not None:
+        q = q.filter(models.Supplier.id == supplier_id)
+    headers = q.all()
+
+    # line totals per supplier (separate GROUP BY so header sums aren't multiplied by lines)
+    lq = (
+        db.query(
+            Purchase.supplier_id,
+            func.coalesce(func.sum(models.PurchaseItem.quantity), 0).label("units"),
+            func.count(func.distinct(models.PurchaseItem.product_id)).label("products"),
+        )
+        .join(models.PurchaseItem, models.PurchaseItem.purchase_id == Purchase.id)
+        .filter(Purchase.business_id == business_id, Purchase.supplier_id.isnot(None))
+        .group_by(Purchase.supplier_id)
+    )
+    if supplier_id is not None:
+        lq = lq.filter(Purchase.supplier_id == supplier_id)
+    lines = {r.supplier_id: r for r in lq.all()}
+
+    rows = []
+    for h in headers:
+        line = lines.get(h.id)
+        invoices = int(h.invoices or 0)
+        rows.append({
+            "supplier_id": h.id,
+            "name": h.name,
+            "phone": h.phone,
+            "email": h.email,
+            "invoices": invoices,
+            "total_spend": round(float(h.spend or 0), 2),
+            "units_received": int(line.units) if line else 0,
+            "products_supplied": int(line.products) if line else 0,
+            "first_delivery": h.first_delivery,
+            "last_delivery": h.last_delivery,
+            "avg_days_between_deliveries": _delivery_days(h.first_delivery, h.last_delivery, invoices),
+        })
+    return rows
+
+
+def supplier_report(db, business_id: int):
+    """All suppliers ranked by total spend (rank 1 = biggest)."""
+    def compute():
+        rows = sorted(
+            _supplier_rows(db, business_id),
+            key=lambda r: (-r["total_spend"], -r["invoices"], r["name"] or "")
+        )
+        grand_total = sum(r["total_spend"] for r in rows)
+        for rank, r in enumerate(rows, start=1):
+            r["rank"] = rank
+            r["spend_share"] = round(r["total_spend"] * 100 / grand_total, 1) if grand_total else 0.0
+        return {"suppliers": rows, "total_spend": round(grand_total, 2)}
+
+    return _cached(business_id, "report", compute)
+
+
+def supplier_stats(db, business_id: int, supplier_id: int):
+    """One supplier's totals + the products they supply (avg buying price per product)."""
+    def compute():
+        rows = _supplier_rows(db, business_id, supplier_id)
+        if not rows:
+            return None
+
+        Item = models.PurchaseItem
+        priced = Item.buying_price > 0
+        products = (
+            db.query(
+                Item.product_id,
+                models.Product.name,
+                func.count(func.distinct(Item.purchase_id)).label("invoices"),
+                func.sum(Item.quantity).label("units"),
+                func.coalesce(func.sum(Item.subtotal), 0).label("spend"),
+                # quantity-weighted, ignoring lines received without a price
+                func.sum(case((priced, Item.buying_price * Item.quantity), else_=0)).label("priced_value"),
+                func.sum(case((priced, Item.quantity), else_=0)).label("priced_units"),
+                func.min(case((priced, Item.buying_price))).label("min_price"),
+                func.max(case((priced, Item.buying_price))).label("max_price"),
+                func.max(models.Purchase.created_at).label("last_delivery"),
+            )
+            .join(models.Purchase, models.Purchase.id == Item.purchase_id)
+            .join(models.Product, models.Product.id == Item.product_id)
+            .filter(models.Purchase.business_id == business_id, models.Purchase.supplier_id == supplier_id)
+            .group_by(Item.product_id, models.Product.name)
+            .order_by(func.coalesce(func.sum(Item.subtotal), 0).desc(), models.Product.name)
+            .all()
+        )
+
+        stats = rows[0]
+        stats["products"] = [
+            {
+                "product_id": p.product_id,
+                "name": p.name,
+                "invoices": int(p.invoices or 0),
+                "units": int(p.units or 0),
+                "spend": round(float(p.spend or 0), 2),
+                "avg_buying_price": (
+                    round(float(p.priced_value) / int(p.priced_units), 2) if p.priced_units else None
+                ),
+                "min_buying_price": p.min_price,
+                "max_buying_price": p.max_price,
+                "last_delivery": p.last_delivery,
+            }
+            for p in products
+        ]
+        return stats
+
+    stats = _cached(business_id, ("supplier", supplier_id), compute)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Supplier not found")
+    return stats
@@ -0,0 +1,88 @@
+# backend/time_utils.py
+#
+# Business-local calendar -> UTC bounds.
+# Timestamps are stored as naive UTC; every shop sees "today", "this week",
+# "this month" in its own timezone (Business.timezone, default Africa/Nairobi).
+# Range helpers return half-open [start, end) naive-UTC datetimes so queries stay
+# index range scans on (business_id, created_at).
+import threading
+from datetime import date, datetime, time, timedelta
+
+import pytz
+
+from backend import models
+
+DEFAULT_TIMEZONE = "Africa/Nairobi"
+
+_tz_cache = {}  # business_id -> pytz timezone
+_tz_lock = threading.Lock()
+
+
+def get_timezone(name: str):
+    try:
+        return pytz.timezone(name or DEFAULT_TIMEZONE)
+    except pytz.UnknownTimeZoneError:
+        return pytz.timezone(DEFAULT_TIMEZONE)
+
+
+def business_timezone(db, business_id: int):
+    """Business tz, cached per process (changes go through reset_timezone_cache)."""
+    tz = _tz_cache.get(business_id)
+    if tz is None:
+        name = db.query(models.Business.timezone).filter(
+            models.Business.id == business_id
+        ).scalar()
+        tz = get_timezone(name)
+        with _tz_lock:
+            _tz_cache[business_id] = tz
+    return tz
+
+
+def reset_timezone_cache(business_id: int = None):
+    with _tz_lock:
+        if business_id is None:
+            _tz_cache.clear()
+        else:
+            _tz_cache.pop(business_id, None)
+
+
+def to_utc(tz, local_dt: datetime) -> datetime:
+    """Local wall-clock time -> naive UTC."""
+    return tz.localize(local_dt).astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def local_date(tz, utc_dt: datetime = None) -> date:
+    """Calendar day in the business tz for a naive-UTC timestamp (default: now)."""
+    utc_dt = utc_dt or datetime.utcnow()
+    return pytz.utc.localize(utc_dt).astimezone(tz).date()
+
+
+def day_range(tz, date_from: date = None, date_to: date = None):
+    """Inclusive local dates -> [start, end) naive UTC (either side optional)."""
+    start = to_utc(tz, datetime.combine(date_from, time.min)) if date_from else None
+    end = to_utc(tz, datetime.combine(date_to + timedelta(days=1), time.min)) if date_to else None
+    return start, end
+
+
+def period_range(tz, period: str, today: date = None):
+    """
+    "today" / "yesterday" / "week" (Mon-today) / "month" / "year" in the
+    business tz. Returns (first_day, last_day, start_utc, end_utc).
+    """
+    today = today or local_date(tz)
+
+    if period == "today":
+        first, last = today, today
+    elif period == "yesterday":
+        first = last = today - timedelta(days=1)
+    elif period == "week":
+        first, last = today - timedelta(days=today.weekday()), today
+    elif period == "month":
+        first, last = today.replace(day=1), today
+    elif period == "year":
+        first, last = today.replace(month=1, day=1), today
+    else:
+        raise ValueError(f"Unknown period: {period}")
+
+    start, end = day_range(tz, first, last)
+    return first, last, start, end
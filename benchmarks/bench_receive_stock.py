@@ -0,0 +1,110 @@
+# benchmarks/bench_receive_stock.py
+#
+# Round trips + time per supplier invoice size: old per-line receive_stock_submit
+# vs the batched pipeline in backend/purchase_utils.py.
+#
+#   python -m benchmarks.bench_receive_stock
+#
+import statistics
+import time
+
+from benchmarks.bench_utils import (
+    SessionLocal, models, reset_schema, seed_business, count_round_trips
+)
+from backend.purchase_utils import receive_stock
+from backend.stock_utils import increment_stock
+from routers.purchases import ReceiveItem, ReceiveStockRequest
+
+INVOICE_SIZES = [10, 100, 1000]
+RUNS = 3
+
+
+def legacy_receive_stock(db, business_id, user_id, payload):
+    """Copy of the old receive_stock_submit body (one product query + ORM adds per line)."""
+    purchase = models.Purchase(
+        business_id=business_id,
+        supplier_id=payload.supplier_id,
+        invoice_number=payload.invoice_number,
+        notes=payload.notes,
+        created_by=user_id,
+        total_amount=0
+    )
+    db.add(purchase)
+    db.flush()
+
+    total_amount = 0.0
+    qty_by_product = {}
+
+    for item in payload.items:
+        product = db.query(models.Product).filter(
+            models.Product.id == item.product_id,
+            models.Product.business_id == business_id,
+            models.Product.deleted_at.is_(None)
+        ).first()
+
+        qty_by_product[product.id] = qty_by_product.get(product.id, 0) + item.quantity
+        if item.buying_price is not None:
+            product.buying_price = float(item.buying_price)
+        if item.selling_price is not None:
+            product.price = float(item.selling_price)
+
+        line_total = float(item.buying_price) * item.quantity if item.buying_price is not None else 0.0
+        total_amount += line_total
+
+        db.add(models.PurchaseItem(
+            purchase_id=purchase.id, product_id=product.id, quantity=item.quantity,
+            buying_price=item.buying_price or 0, subtotal=line_total
+        ))
+        db.add(models.InventoryMovement(
+            business_id=business_id, product_id=product.id, movement_type="purchase",
+            quantity=item.quantity, reference_id=purchase.id, reason="Receive Stock", created_by=user_id
+        ))
+
+    increment_stock(db, business_id, qty_by_product)
+    purchase.total_amount = round(total_amount, 2)
+    db.commit()
+
+
+def invoice(size):
+    return ReceiveStockRequest(
+        invoice_number=f"INV-{size}",
+        items=[
+            ReceiveItem(product_id=i + 1, quantity=5, buying_price=50, selling_price=80)
+            for i in range(size)
+        ],
+    )
+
+
+def measure(fn, business_id, user_id, payload):
+    trips = []
+    elapsed = 0.0
+    for _ in range(RUNS):
+        db = SessionLocal()
+        try:
+            with count_round_trips() as counter:
+                start = time.perf_counter()
+                fn(db, business_id, user_id, payload)
+                elapsed += time.perf_counter() - start
+            trips.append(counter.total)
+        finally:
+            db.close()
+    return int(statistics.median(trips)), elapsed / RUNS * 1000
+
+
+def main():
+    reset_schema()
+    db = SessionLocal()
+    business_id, user = seed_business(db, product_count=max(INVOICE_SIZES))
+    db.close()
+
+    print(f"{'lines':>6} | {'old trips':>9} | {'new trips':>9} | {'old ms':>9} | {'new ms':>9}")
+    print("-" * 55)
+    for size in INVOICE_SIZES:
+        payload = invoice(size)
+        old_trips, old_ms = measure(legacy_receive_stock, business_id, user["user_id"], payload)
+        new_trips, new_ms = measure(receive_stock, business_id, user["user_id"], payload)
+        print(f"{size:>6} | {old_trips:>9} | {new_trips:>9} | {old_ms:>9.2f} | {new_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
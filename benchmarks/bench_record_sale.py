@@ -0,0 +1,122 @@
+# benchmarks/bench_record_sale.py
+#
+# Round trips per basket size: old per-line record_sale vs the
+# single-transaction pipeline in backend/sales_utils.py.
+#
+#   python -m benchmarks.bench_record_sale
+#
+import statistics
+import time
+
+from sqlalchemy import text
+
+from benchmarks.bench_utils import (
+    SessionLocal, models, reset_schema, seed_business, count_round_trips
+)
+from backend.sales_utils import process_sale
+from routers.sales import SaleItem
+
+BASKET_SIZES = [1, 5, 20, 50]
+RUNS = 5
+
+
+def legacy_record_sale(db, business_id, user, items):
+    """Copy of the old record_sale body (one commit per step, one query per line)."""
+    has_real_sale = (
+        db.query(models.Sales)
+        .join(models.Order, models.Sales.order_id == models.Order.id)
+        .filter(models.Order.business_id == business_id, models.Sales.is_demo == False)
+        .first()
+    )
+    demo_order_ids_rows = (
+        db.query(models.Order.id)
+        .join(models.Sales, models.Sales.order_id == models.Order.id)
+        .filter(models.Order.business_id == business_id, models.Sales.is_demo == True)
+        .distinct()
+        .all()
+    )
+
+    last_order = db.execute(text("SELECT id FROM orders ORDER BY id DESC LIMIT 1")).fetchone()
+    next_number = 1 if not last_order else last_order[0] + 1
+
+    new_order = models.Order(
+        order_code=f"OLD-{next_number:05d}",  # own prefix: never clashes with the allocator
+        business_id=business_id,
+        sales_person=user["username"],
+        created_by=user["user_id"],
+        total_amount=0
+    )
+    db.add(new_order)
+    db.commit()
+    db.refresh(new_order)
+
+    total_amount = 0
+    for item in items:
+        product = db.query(models.Product).filter(
+            models.Product.name == item.product_name,
+            models.Product.business_id == business_id
+        ).first()
+        subtotal = item.selling_price * item.quantity
+        total_amount += subtotal
+        product.quantity -= item.quantity
+        db.add(models.InventoryMovement(
+            product_id=product.id, business_id=business_id, movement_type="sale",
+            quantity=-item.quantity, reference_id=new_order.id, reason="POS Sale"
+        ))
+        db.add(models.Sales(
+            order_id=new_order.id, product_id=product.id, quantity=item.quantity,
+            total_price=subtotal, is_demo=False
+        ))
+
+    new_order.total_amount = total_amount
+    db.commit()
+
+    # record_onboarding_event: insert + commit (or rollback on duplicate)
+    db.execute(text("SELECT 1"))
+    db.commit()
+
+
+def basket(size):
+    return [
+        SaleItem(product_name=f"Item {i:05d}", quantity=1, selling_price=80)
+        for i in range(size)
+    ]
+
+
+def measure(fn, business_id, user, items):
+    trips = []
+    elapsed = 0.0
+    for _ in range(RUNS):
+        db = SessionLocal()
+        try:
+            with count_round_trips() as counter:
+                start = time.perf_counter()
+                fn(db, business_id, user, items)
+                elapsed += time.perf_counter() - start
+            trips.append(counter.total)
+        finally:
+            db.close()
+    return int(statistics.median(trips)), elapsed / RUNS * 1000
+
+
+def new_record_sale(db, business_id, user, items):
+    process_sale(db, business_id, user, None, items, is_demo_sale=False)
+
+
+def main():
+    reset_schema()
+    db = SessionLocal()
+    business_id, user = seed_business(db, product_count=max(BASKET_SIZES))
+    db.close()
+
+    print(f"{'basket':>7} | {'old trips':>9} | {'new trips':>9} | {'old ms':>8} | {'new ms':>8}")
+    print("-" * 55)
+    for size in BASKET_SIZES:
+        items = basket(size)
+        old_trips, old_ms = measure(legacy_record_sale, business_id, user, items)
+        new_trips, new_ms = measure(new_record_sale, business_id, user, items)
+        print(f"{size:>7} | {old_trips:>9} | {new_trips:>9} | {old_ms:>8.2f} | {new_ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/bench_utils.py
+#
+# Shared setup for the benchmark scripts.
+# Runs against a throwaway SQLite file by default so nothing touches
+# the real database. Set BENCH_DATABASE_URL to point at a scratch MySQL.
+import os
+import tempfile
+from contextlib import contextmanager
+
+_default_url = "sqlite:///" + os.path.join(tempfile.gettempdir(), "smartpos_bench.db")
+os.environ["DATABASE_URL"] = os.getenv("BENCH_DATABASE_URL", _default_url)
+os.environ.setdefault("SECRET_KEY", "bench-secret")
+
+from sqlalchemy import event  # noqa: E402
+
+from backend.db import engine, SessionLocal  # noqa: E402
+from backend import models  # noqa: E402
+
+
+def reset_schema():
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+
+def seed_business(db, product_count: int, quantity: int = 1_000_000):
+    """Create one business, one cashier and `product_count` products."""
+    business = models.Business(
+        business_name="Bench Shop",
+        username="bench",
+        email="bench@example.com",
+        password_hash="x",
+    )
+    db.add(business)
+    db.flush()
+
+    user = models.User(
+        business_id=business.id,
+        username="bench_cashier",
+        password_hash="x",
+        role="staff",
+        is_active=True,
+    )
+    db.add(user)
+    db.flush()
+
+    db.add_all([
+        models.Product(
+            name=f"Item {i:05d}",
+            item_code=f"SKU{i:05d}",
+            business_id=business.id,
+            buying_price=50,
+            price=80,
+            quantity=quantity,
+        )
+        for i in range(product_count)
+    ])
+    db.commit()
+
+    token_user = {
+        "user_id": user.id,
+        "username": user.username,
+        "business_id": business.id,
+        "role": user.role,
+    }
+    return business.id, token_user
+
+
+class RoundTripCounter:
+    """Counts statements sent to the DB (executemany = one trip) + commits."""
+
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+
+    @property
+    def total(self):
+        return self.statements + self.commits
+
+    def _on_execute(self, *args, **kwargs):
+        self.statements += 1
+
+    def _on_commit(self, *args, **kwargs):
+        self.commits += 1
+
+
+@contextmanager
+def count_round_trips():
+    counter = RoundTripCounter()
+    event.listen(engine, "before_cursor_execute", counter._on_execute)
+    event.listen(engine, "commit", counter._on_commit)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._on_execute)
+        event.remove(engine, "commit", counter._on_commit)
+
+
+__all__ = [
+    "engine",
+    "SessionLocal",
+    "models",
+    "reset_schema",
+    "seed_business",
+    "count_round_trips",
+]
@@ -0,0 +1,122 @@
+# benchmarks/load_hot_sku.py
+#
+# N simulated cashiers hammering ONE hot SKU.
+# Compares the old read/check/write sale against the atomic pipeline
+# and reports throughput + oversell count.
+#
+#   python -m benchmarks.load_hot_sku --cashiers 8 --stock 200
+#
+# SQLite serialises writers, so real lock contention numbers need
+#   BENCH_DATABASE_URL=mysql+pymysql://...  (scratch database!)
+import argparse
+import threading
+import time
+
+from fastapi import HTTPException
+
+from benchmarks.bench_utils import SessionLocal, models, reset_schema, seed_business
+from backend.sales_utils import process_sale
+from routers.sales import SaleItem
+
+HOT_SKU = "Item 00000"
+
+
+def legacy_sell_one(db, business_id, user):
+    """Old behaviour: read quantity, compare in Python, write quantity -= 1."""
+    product = db.query(models.Product).filter(
+        models.Product.name == HOT_SKU,
+        models.Product.business_id == business_id
+    ).first()
+    if product.quantity < 1:
+        raise HTTPException(status_code=400, detail="Not enough stock")
+    time.sleep(0.001)  # request handling between read and write
+    product.quantity -= 1
+    db.add(models.InventoryMovement(
+        product_id=product.id, business_id=business_id,
+        movement_type="sale", quantity=-1, reason="POS Sale"
+    ))
+    db.commit()
+
+
+def atomic_sell_one(db, business_id, user):
+    process_sale(
+        db, business_id, user, None,
+        [SaleItem(product_name=HOT_SKU, quantity=1, selling_price=80)],
+        is_demo_sale=False
+    )
+
+
+def cashier(sell, business_id, user, stop, stats, lock):
+    sold = rejected = errors = 0
+    while not stop.is_set():
+        db = SessionLocal()
+        try:
+            sell(db, business_id, user)
+            sold += 1
+        except HTTPException:
+            rejected += 1
+            if rejected > 20:
+                break  # shelf is empty
+        except Exception:
+            db.rollback()
+            errors += 1
+        finally:
+            db.close()
+    with lock:
+        stats["sold"] += sold
+        stats["rejected"] += rejected
+        stats["errors"] += errors
+
+
+def run(mode, sell, cashiers, stock, seconds):
+    reset_schema()
+    db = SessionLocal()
+    business_id, user = seed_business(db, product_count=1, quantity=stock)
+    db.close()
+
+    stats = {"sold": 0, "rejected": 0, "errors": 0}
+    stop = threading.Event()
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=cashier, args=(sell, business_id, user, stop, stats, lock))
+        for _ in range(cashiers)
+    ]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + seconds
+    for t in threads:
+        t.join(timeout=max(0, deadline - time.monotonic()))
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    db = SessionLocal()
+    final_qty = db.query(models.Product.quantity).filter(models.Product.name == HOT_SKU).scalar()
+    ledger_out = -(db.query(models.InventoryMovement.quantity).count())
+    db.close()
+
+    oversold = max(0, stats["sold"] - stock)
+    print(
+        f"{mode:>7} | sold {stats['sold']:>5} | rejected {stats['rejected']:>4} | "
+        f"errors {stats['errors']:>4} | {stats['sold'] / elapsed:>8.1f} sales/s | "
+        f"final stock {final_qty:>4} | ledger {ledger_out:>5} | OVERSOLD {oversold}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cashiers", type=int, default=8)
+    parser.add_argument("--stock", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=30)
+    args = parser.parse_args()
+
+    print(f"{args.cashiers} cashiers, hot SKU stock = {args.stock}")
+    run("legacy", legacy_sell_one, args.cashiers, args.stock, args.seconds)
+    run("atomic", atomic_sell_one, args.cashiers, args.stock, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Form, Request
 from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
@@ -15,6 +15,7 @@ from backend.auth_utils import (
     verify_token
 )
 from backend.config import templates
+from backend.dashboard_utils import get_dashboard_summary
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -48,78 +49,21 @@ def get_dashboard(
     business_id = current_user["business_id"]
 
     # ----------------------------
-    # TODAY TIME RANGE (SAFE)
+    # SUMMARY: one aggregate query, cached per business
+    # (invalidated by sales, stock adjustments and receipts)
     # ----------------------------
-    today_start = datetime.utcnow().replace(
-        hour=0, minute=0, second=0, microsecond=0
-    )
-
-    # ----------------------------
-    # TODAY ORDERS
-    # ----------------------------
-    orders_today = (
-        db.query(models.Order)
-        .filter(
-            models.Order.business_id == business_id,
-            models.Order.created_at >= today_start
-        )
-        .all()
-    )
-
-    today_revenue = sum(o.total_amount or 0 for o in orders_today)
-    transactions = len(orders_today)
-
-    # ----------------------------
-    # TODAY PROFIT (MATCHES REVENUE RANGE)
-    # ----------------------------
-    sales_rows = (
-        db.query(models.Sales, models.Product)
-        .join(models.Product, models.Sales.product_id == models.Product.id)
-        .join(models.Order, models.Sales.order_id == models.Order.id)
-        .filter(
-            models.Order.business_id == business_id,
-            models.Order.created_at >= today_start,
-            models.Sales.is_demo == False  # ignore demo onboarding sales
-        )
-        .all()
-    )
-
-    today_profit = 0.0
-
-    for sale, product in sales_rows:
-        buying_price = product.buying_price or 0
-        today_profit += sale.total_price - (buying_price * sale.quantity)
+    summary = get_dashboard_summary(db, business_id)
 
     # ----------------------------
-    # LOW STOCK COUNT
+    # CURRENT USER OBJECT (+ business, same query)
     # ----------------------------
-    low_stock_count = (
-        db.query(models.Product)
-        .filter(
-            models.Product.business_id == business_id,
-            models.Product.quantity <= 3
-        )
-        .count()
+    user = (
+        db.query(models.User)
+        .options(joinedload(models.User.business))
+        .filter(models.User.id == current_user["user_id"])
+        .first()
     )
 
-    # ----------------------------
-    # RECENT ORDERS
-    # ----------------------------
-    recent_orders = (
-        db.query(models.Order)
-        .filter(models.Order.business_id == business_id)
-        .order_by(models.Order.created_at.desc())
-        .limit(5)
-        .all()
-    )
-
-    # ----------------------------
-    # CURRENT USER OBJECT
-    # ----------------------------
-    user = db.query(models.User).filter(
-        models.User.id == current_user["user_id"]
-    ).first()
-
     # ----------------------------
     # RESPONSE
     # ----------------------------
@@ -130,11 +74,7 @@ def get_dashboard(
 
             "active_page": "dashboard",
 
-            "today_revenue": round(today_revenue, 2),
-            "today_profit": round(today_profit, 2),
-            "transactions": transactions,
-            "low_stock": low_stock_count,
-            "recent_orders": recent_orders,
+            **summary,
         }
     )
 # ✅ Registration page
@@ -429,4 +369,6 @@ def create_staff(
 def logout_user():
     response = RedirectResponse(url="/auth/login")
     response.delete_cookie("access_token")
+    # ✅ shared tills: drop cached pages of the user who just left
+    response.headers["Clear-Site-Data"] = '"cache"'
     return response
\ No newline at end of file
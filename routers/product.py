@@ -1,13 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, Form, Body, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Depends, HTTPException, File, Form, Body, Query, Request, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from pydantic import BaseModel
+from typing import List, Optional
 from backend.db import SessionLocal
 from backend import models
 from backend.config import templates
 from backend.auth_utils import verify_token
 from backend.onboarding_utils import record_onboarding_event
 from backend.template_context import base_context
-from datetime import datetime
+from backend.stock_utils import apply_stock_delta, run_with_retry
+from backend.idempotency_utils import IdempotencyGuard
+from backend.dashboard_utils import invalidate_dashboard
+from backend.low_stock_utils import DEFAULT_REORDER_LEVEL, refresh_low_stock
+from backend.search_utils import (
+    SEARCH_LIMIT_DEFAULT, SEARCH_LIMIT_MAX, invalidate_search_index, load_products_by_ids,
+    lookup_by_code, normalize_code, search_product_ids
+)
+from backend.import_utils import import_products_csv
+from backend.stocktake_utils import (
+    cancel_stocktake, close_stocktake, count_progress, get_stocktake, open_stocktake,
+    save_counts, stocktake_dict, stocktake_variances
+)
+from backend.ledger_utils import HISTORY_PAGE_MAX, HISTORY_PAGE_SIZE, product_history_page
+from backend.snapshot_utils import stock_as_of
+from backend.catalog_utils import (
+    active_products, catalog_delta, catalog_etag, catalog_rows, decode_catalog_cursor, slim_product
+)
+from datetime import date, datetime
+from uuid import uuid4
 
 # ✅ Define base URL for production (Railway)
 BASE_URL = "https://pos-10-production.up.railway.app"
@@ -52,7 +74,7 @@ async def adjust_stock_page(
     if not current_user or current_user.get("role") not in ["admin", "manager"]:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    product = db.query(models.Product).filter(
+    product = active_products(db.query(models.Product)).filter(
         models.Product.id == product_id,
         models.Product.business_id == current_user["business_id"]
     ).first()
@@ -67,7 +89,8 @@ async def adjust_stock_page(
         {
             **base_context(request, user_obj),
             "active_page": "products",
-            "product": product
+            "product": product,
+            "idempotency_key": uuid4().hex
         }
     )
 @router.get("/viewstocks", response_class=HTMLResponse)
@@ -86,6 +109,8 @@ async def view_stocks_page(
 async def product_history(
     product_id: int,
     request: Request,
+    cursor: str = Query(None),
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_MAX),
     current_user: dict = Depends(verify_token),
     db: Session = Depends(get_db)
 ):
@@ -93,7 +118,7 @@ async def product_history(
     if not current_user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    product = db.query(models.Product).filter(
+    product = active_products(db.query(models.Product)).filter(
         models.Product.id == product_id,
         models.Product.business_id == current_user["business_id"]
     ).first()
@@ -101,19 +126,44 @@ async def product_history(
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    movements = db.query(models.InventoryMovement).filter(
-        models.InventoryMovement.product_id == product_id,
-        models.InventoryMovement.business_id == current_user["business_id"]
-    ).order_by(models.InventoryMovement.created_at.desc()).all()
+    # one keyset page (newest first) + running balance, not the whole ledger
+    page = product_history_page(
+        db, current_user["business_id"], product_id, product.quantity, limit, cursor
+    )
 
     return templates.TemplateResponse(
         "product_history.html",
         {
             "request": request,
             "product": product,
-            "movements": movements
+            "movements": page["items"],
+            "totals": page["totals"],
+            "next_cursor": page["next_cursor"],
+            "is_first_page": not cursor,
+            "limit": limit
         }
     )
+
+@router.get("/history/{product_id}/movements")
+def product_history_movements(
+    product_id: int,
+    cursor: str = Query(None),
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_MAX),
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    """JSON version of the history page: {"items", "totals", "next_cursor"}."""
+    quantity = active_products(db.query(models.Product.quantity)).filter(
+        models.Product.id == product_id,
+        models.Product.business_id == current_user["business_id"]
+    ).first()
+
+    if not quantity:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    return product_history_page(
+        db, current_user["business_id"], product_id, quantity[0], limit, cursor
+    )
 # ---------------- ADD PRODUCT ----------------
 
 @router.post("/add_product")
@@ -124,6 +174,7 @@ def add_product(
     packaging_unit: str = Form(None),
     price: float = Form(...),
     buying_price: float = Form(...),
+    reorder_level: int = Form(DEFAULT_REORDER_LEVEL),
     current_user: dict = Depends(verify_token),
     db: Session = Depends(get_db)
 ):
@@ -131,18 +182,41 @@ def add_product(
     if not current_user or current_user.get("role") not in ["admin", "manager"]:
         raise HTTPException(status_code=403, detail="Access denied")
 
+    if reorder_level < 0:
+        raise HTTPException(status_code=400, detail="Reorder level cannot be negative")
+
     try:
-        new_product = models.Product(
-            item_code=item_code,
-            name=name,
-            packaging_unit=packaging_unit,
-            price=price,
-            buying_price=buying_price,
-            business_id=current_user["business_id"]
-        )
-        db.add(new_product)
+        # a deleted product with the same name comes back instead of clashing
+        # with the (name, business_id) unique constraint
+        new_product = db.query(models.Product).filter(
+            models.Product.business_id == current_user["business_id"],
+            models.Product.name == name,
+            models.Product.deleted_at.isnot(None)
+        ).first()
+
+        if new_product:
+            new_product.deleted_at = None
+            new_product.item_code = normalize_code(item_code)
+            new_product.packaging_unit = packaging_unit
+            new_product.buying_price = buying_price
+            new_product.price = price
+            new_product.reorder_level = reorder_level
+            new_product.is_low = (new_product.quantity or 0) <= reorder_level
+        else:
+            new_product = models.Product(
+                item_code=normalize_code(item_code),
+                name=name,
+                packaging_unit=packaging_unit,
+                price=price,
+                buying_price=buying_price,
+                reorder_level=reorder_level,
+                is_low=True,  # new products start with 0 stock
+                business_id=current_user["business_id"]
+            )
+            db.add(new_product)
         db.commit()
         db.refresh(new_product)
+        invalidate_search_index(current_user["business_id"])
 
         # ✅ mark onboarding event (safe because of unique constraint)
         record_onboarding_event(db, current_user["business_id"], "add_product")
@@ -155,25 +229,118 @@ def add_product(
         # ✅ normal API behavior stays the same
         return {"message": f"✅ Product '{name}' added successfully!", "product": new_product.id}
 
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="A product with this name or item code already exists")
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+# ---------------- BULK IMPORT (CSV) ----------------
+
+@router.post("/import")
+def import_products(
+    file: UploadFile = File(...),
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    # ✅ admin/manager only
+    if not current_user or current_user.get("role") not in ["admin", "manager"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    business_id = current_user["business_id"]
+
+    # streamed + batched upserts; bad rows come back in the report
+    report = import_products_csv(db, business_id, current_user["user_id"], file.file)
+
+    if report["created"] or report["updated"]:
+        invalidate_search_index(business_id)
+        invalidate_dashboard(business_id)
+        if report["created"]:
+            record_onboarding_event(db, business_id, "add_product")
+
+    return report
+
 # ---------------- GET ALL PRODUCTS ----------------
+#   GET /products/                  -> slim list (active products)
+#   GET /products/?since=0          -> {"products", "deleted", "cursor", "full"}
+#   GET /products/?since=<cursor>   -> only what changed since that cursor
+# Both answer 304 when If-None-Match still matches.
 
 @router.get("/")
-def get_products(current_use: dict = Depends(verify_token), db: Session = Depends(get_db)):
-    print("🔹 current_use =", current_use)
-    business_id = current_use.get("business_id")
+def get_products(
+    request: Request,
+    since: str = None,
+    current_use: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    business_id = current_use.get("business_id") if current_use else None
 
     if not business_id:
-        print("❌ No business_id found in token!")
         # Redirect to login if user is not authenticated
         return RedirectResponse(url=f"{BASE_URL}/auth/login")
 
-    products = db.query(models.Product).filter(models.Product.business_id == business_id).all()
-    print("✅ Found products:", products)
-    return products
+    since_at = decode_catalog_cursor(since, business_id) if since is not None else None
+
+    etag = catalog_etag(db, business_id, since_at, kind="list" if since is None else "delta")
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    if since is None:
+        body = [slim_product(r) for r in catalog_rows(db, business_id)]
+    else:
+        body = catalog_delta(db, business_id, since_at)
+
+    return JSONResponse(content=body, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+# ---------------- STOCK AS OF A DATE (valuation) ----------------
+#   GET /products/stock_as_of?date=2026-09-30 -> stock at the end of that local day,
+#   valued at the cost stored in the snapshot it starts from
+
+@router.get("/stock_as_of")
+def get_stock_as_of(
+    as_of: date = Query(..., alias="date"),
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    # ✅ admin/manager only
+    if not current_user or current_user.get("role") not in ["admin", "manager"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    # closest snapshot + movements after it, not the whole ledger
+    return stock_as_of(db, current_user["business_id"], as_of)
+
+# ---------------- BARCODE LOOKUP + TYPEAHEAD ----------------
+
+@router.get("/lookup")
+def lookup_product(
+    code: str,
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    product = lookup_by_code(db, current_user["business_id"], code)
+    if not product:
+        raise HTTPException(status_code=404, detail="No product with that code")
+
+    return slim_product(product)
+
+
+@router.get("/search")
+def search_products(
+    q: str,
+    limit: int = Query(SEARCH_LIMIT_DEFAULT, ge=1, le=SEARCH_LIMIT_MAX),
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    business_id = current_user["business_id"]
+    ids = search_product_ids(db, business_id, q, limit)
+    return [slim_product(p) for p in load_products_by_ids(db, business_id, ids)]
 
 # ---------------- UPDATE STOCK ----------------
 
@@ -188,30 +355,58 @@ def update_stock(
     if not current_user or current_user.get("role") not in ["admin", "manager"]:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    product = db.query(models.Product).filter(
+    product = active_products(db.query(models.Product)).filter(
         models.Product.id == product_id,
         models.Product.business_id == current_user["business_id"]
-    ).first()
+    ).with_for_update().first()
 
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
     # Update fields
+    old_quantity = product.quantity or 0
     product.quantity = data.get("quantity", product.quantity)
     product.price = data.get("price", product.price)
     product.buying_price = data.get("buying_price", product.buying_price)
 
+    if data.get("reorder_level") is not None:
+        try:
+            reorder_level = int(data["reorder_level"])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Reorder level must be a whole number")
+        if reorder_level < 0:
+            raise HTTPException(status_code=400, detail="Reorder level cannot be negative")
+        product.reorder_level = reorder_level
+
+    # ✅ quantity edits go through the ledger too, so stock and movements agree
+    delta = (product.quantity or 0) - old_quantity
+    if delta:
+        db.add(models.InventoryMovement(
+            product_id=product.id,
+            business_id=current_user["business_id"],
+            movement_type="adjustment",
+            quantity=delta,
+            reason="Stock edited",
+            created_by=current_user["user_id"],
+            created_at=datetime.utcnow()
+        ))
+
+    db.flush()
+    refresh_low_stock(db, current_user["business_id"], [product.id])
+
     db.commit()
+    invalidate_dashboard(current_user["business_id"])
     db.refresh(product)
     return {"message": "✅ Product updated successfully", "product": product.name}
 
 @router.post("/adjust/{product_id}")
-async def adjust_stock_submit(
+def adjust_stock_submit(
     product_id: int,
     request: Request,
     action: str = Form(...),   # "increase" or "decrease"
     qty: int = Form(...),
     reason: str = Form(""),
+    idempotency_key: str = Form(None),  # hidden field: plain form posts can't set headers
     current_user: dict = Depends(verify_token),
     db: Session = Depends(get_db)
 ):
@@ -225,24 +420,36 @@ async def adjust_stock_submit(
     if action not in ["increase", "decrease"]:
         raise HTTPException(status_code=400, detail="Invalid action")
 
-    product = db.query(models.Product).filter(
+    product = active_products(db.query(models.Product.id)).filter(
         models.Product.id == product_id,
         models.Product.business_id == current_user["business_id"]
-    ).with_for_update().first()
+    ).first()
 
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
     signed_qty = qty if action == "increase" else -qty
 
-    # ✅ Block negative stock (recommended)
-    if product.quantity + signed_qty < 0:
-        raise HTTPException(status_code=400, detail="Cannot reduce below 0 stock")
-
-    try:
-        # 1) Write movement (ledger)
+    # ✅ Idempotency: a double-submitted / re-posted form is applied once
+    guard = IdempotencyGuard(
+        db, request, current_user["business_id"], f"adjust:{product_id}",
+        {"action": action, "qty": qty, "reason": reason},
+        key=idempotency_key
+    )
+    replay = guard.replay()
+    if replay:
+        return replay
+
+    def work():
+        # 1) Update cached stock atomically
+        # ✅ Block negative stock: the UPDATE only matches if quantity + signed_qty >= 0
+        if not apply_stock_delta(db, current_user["business_id"], product_id, signed_qty):
+            raise HTTPException(status_code=400, detail="Cannot reduce below 0 stock")
+        refresh_low_stock(db, current_user["business_id"], [product_id])
+
+        # 2) Write movement (ledger)
         mv = models.InventoryMovement(
-            product_id=product.id,
+            product_id=product_id,
             business_id=current_user["business_id"],
             movement_type="adjustment",
             quantity=signed_qty,
@@ -252,13 +459,152 @@ async def adjust_stock_submit(
         )
         db.add(mv)
 
-        # 2) Update cached stock
-        product.quantity = product.quantity + signed_qty
+        guard.save(db, {"location": "/products/viewstocks"}, status_code=303)
 
         db.commit()
 
-        return RedirectResponse(url="/products/viewstocks", status_code=303)
-
+    try:
+        run_with_retry(db, work)
+        guard.remember()
+        invalidate_dashboard(current_user["business_id"])
+    except HTTPException:
+        raise
+    except IntegrityError as e:
+        replay = guard.replay_after_conflict()
+        if replay:
+            return replay
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return RedirectResponse(url="/products/viewstocks", status_code=303)
+
+# ---------------- STOCKTAKE (bulk count) ----------------
+#   POST /products/stocktakes                 -> open a session
+#   POST /products/stocktakes/{id}/counts     -> {"counts": [{product_id, counted_qty}, ...]}
+#   GET  /products/stocktakes/{id}            -> progress + variance preview
+#   POST /products/stocktakes/{id}/close      -> apply all variances in one transaction
+#   POST /products/stocktakes/{id}/cancel
+
+class StocktakeOpenRequest(BaseModel):
+    notes: Optional[str] = None
+
+class StocktakeCountItem(BaseModel):
+    product_id: int
+    counted_qty: int
+
+class StocktakeCountsRequest(BaseModel):
+    counts: List[StocktakeCountItem]
+
+def require_stock_manager(current_user):
+    # ✅ admin/manager only
+    if not current_user or current_user.get("role") not in ["admin", "manager"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+@router.post("/stocktakes")
+def open_stocktake_session(
+    payload: Optional[StocktakeOpenRequest] = None,
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    require_stock_manager(current_user)
+    notes = payload.notes if payload else None
+    st = open_stocktake(db, current_user["business_id"], current_user["user_id"], notes)
+    return stocktake_dict(st)
+
+@router.get("/stocktakes")
+def list_stocktakes(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    require_stock_manager(current_user)
+    rows = db.query(models.Stocktake).filter(
+        models.Stocktake.business_id == current_user["business_id"]
+    ).order_by(models.Stocktake.id.desc()).limit(limit).all()
+    return [stocktake_dict(st) for st in rows]
+
+@router.get("/stocktakes/{stocktake_id}")
+def get_stocktake_session(
+    stocktake_id: int,
+    all_lines: bool = Query(False, description="include products counted with no variance"),
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    require_stock_manager(current_user)
+    business_id = current_user["business_id"]
+    st = get_stocktake(db, business_id, stocktake_id)
+
+    body = stocktake_dict(st)
+    body["counted_products"] = count_progress(db, st.id)
+    # variances only mean something while the session is open
+    if st.status == "open":
+        body["variances"] = stocktake_variances(db, business_id, st.id, only_changed=not all_lines)
+    return body
+
+@router.post("/stocktakes/{stocktake_id}/counts")
+def post_stocktake_counts(
+    stocktake_id: int,
+    payload: StocktakeCountsRequest,
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    require_stock_manager(current_user)
+    # last value wins if a product appears twice in one batch
+    counts = {item.product_id: item.counted_qty for item in payload.counts}
+    return save_counts(db, current_user["business_id"], stocktake_id, current_user["user_id"], counts)
+
+@router.post("/stocktakes/{stocktake_id}/close")
+def close_stocktake_session(
+    stocktake_id: int,
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    require_stock_manager(current_user)
+    business_id = current_user["business_id"]
+
+    body = run_with_retry(
+        db, lambda: close_stocktake(db, business_id, stocktake_id, current_user["user_id"])
+    )
+    if body["adjusted_lines"]:
+        invalidate_dashboard(business_id)
+    return body
+
+@router.post("/stocktakes/{stocktake_id}/cancel")
+def cancel_stocktake_session(
+    stocktake_id: int,
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    require_stock_manager(current_user)
+    return cancel_stocktake(db, current_user["business_id"], stocktake_id)
+
+# ---------------- DELETE PRODUCT (soft) ----------------
+
+@router.delete("/{product_id}")
+def delete_product(
+    product_id: int,
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    # ✅ admin/manager only
+    if not current_user or current_user.get("role") not in ["admin", "manager"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    product = active_products(db.query(models.Product)).filter(
+        models.Product.id == product_id,
+        models.Product.business_id == current_user["business_id"]
+    ).first()
+
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    # tombstone: sales history keeps its rows, tills drop it on their next sync
+    product.deleted_at = datetime.utcnow()
+    # free the barcode (uq_product_item_code_business) for a new / imported product
+    product.item_code = None
+    db.commit()
+    invalidate_dashboard(current_user["business_id"])
+    invalidate_search_index(current_user["business_id"])
+
+    return {"message": f"✅ Product '{product.name}' deleted"}
@@ -1,14 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, File, Form, Query, Request, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import date
 
 from backend.db import SessionLocal
 from backend import models
 from backend.config import templates
 from backend.auth_utils import verify_token
 from backend.template_context import base_context
+from backend.purchase_utils import (
+    PURCHASE_PAGE_MAX, PURCHASE_PAGE_SIZE, fetch_purchase_page, purchase_detail, receive_stock
+)
+from backend.idempotency_utils import IdempotencyGuard
+from backend.dashboard_utils import invalidate_dashboard
+from backend.supplier_utils import invalidate_supplier_stats
+from backend.import_utils import errors_csv, import_purchase_csv
 
 router = APIRouter(prefix="/purchases", tags=["purchases"], dependencies=[Depends(verify_token)])
 
@@ -41,6 +50,46 @@ def receive_stock_page(
         }
     )
 
+# ---------------------------
+# API: Purchase history (keyset pages, newest first)
+# ---------------------------
+@router.get("/")
+def list_purchases(
+    supplier_id: Optional[int] = None,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    invoice: Optional[str] = None,
+    limit: int = Query(PURCHASE_PAGE_SIZE, ge=1, le=PURCHASE_PAGE_MAX),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    if not current_user or current_user.get("role") not in ["admin", "manager"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return fetch_purchase_page(
+        db,
+        current_user["business_id"],
+        limit=limit,
+        cursor=cursor,
+        supplier_id=supplier_id,
+        date_from=date_from,
+        date_to=date_to,
+        invoice=invoice
+    )
+
+@router.get("/{purchase_id:int}")
+def get_purchase(
+    purchase_id: int,
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    if not current_user or current_user.get("role") not in ["admin", "manager"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    # items + product names via selectinload (2 extra queries, not 1 per line)
+    return purchase_detail(db, current_user["business_id"], purchase_id)
+
 # ---------------------------
 # API: Fetch suppliers
 # ---------------------------
@@ -66,7 +115,8 @@ def list_products(
     db: Session = Depends(get_db)
 ):
     products = db.query(models.Product).filter(
-        models.Product.business_id == current_user["business_id"]
+        models.Product.business_id == current_user["business_id"],
+        models.Product.deleted_at.is_(None)
     ).order_by(models.Product.name.asc()).all()
 
     return [{"id": p.id, "name": p.name, "price": p.price, "buying_price": p.buying_price, "quantity": p.quantity} for p in products]
@@ -111,78 +161,85 @@ def receive_stock_submit(
         if not supplier:
             raise HTTPException(status_code=400, detail="Invalid supplier")
 
-    try:
-        purchase = models.Purchase(
-            business_id=business_id,
-            supplier_id=payload.supplier_id,
-            invoice_number=payload.invoice_number,
-            notes=payload.notes,
-            created_by=user_id,
-            total_amount=0
-        )
-        db.add(purchase)
-        db.flush()  # gives purchase.id before commit
-
-        total_amount = 0.0
-
-        for item in payload.items:
-            if item.quantity <= 0:
-                continue
+    # ✅ Idempotency-Key: a retried submit returns the first receipt, stock untouched
+    guard = IdempotencyGuard(db, request, business_id, "receive_submit", payload)
+    replay = guard.replay()
+    if replay:
+        return replay
 
-            product = db.query(models.Product).filter(
-                models.Product.id == item.product_id,
-                models.Product.business_id == business_id
-            ).first()
-
-            if not product:
-                raise HTTPException(status_code=404, detail=f"Product not found (id={item.product_id})")
-
-            # ✅ Update stock
-            product.quantity += item.quantity
-
-            # ✅ Professional rule (your chosen direction):
-            # When new stock comes with new buying/selling price, we update the product master prices.
-            if item.buying_price is not None:
-                product.buying_price = float(item.buying_price)
+    try:
+        # ✅ one locked IN query, bulk child rows, set-based stock/price updates
+        body = receive_stock(db, business_id, user_id, payload, idempotency=guard)
+        guard.remember()
+        invalidate_dashboard(business_id)
+        invalidate_supplier_stats(business_id)
+        return body
+
+    except HTTPException:
+        raise
+
+    except IntegrityError as e:
+        # same Idempotency-Key committed by a concurrent retry
+        replay = guard.replay_after_conflict()
+        if replay:
+            return replay
+        raise HTTPException(status_code=400, detail=str(e))
 
-            if item.selling_price is not None:
-                product.price = float(item.selling_price)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-            line_total = 0.0
-            if item.buying_price is not None:
-                line_total = float(item.buying_price) * item.quantity
 
-            total_amount += line_total
+# ---------------- IMPORT SUPPLIER INVOICE (CSV) ----------------
 
-            subtotal = line_total
+@router.post("/import")
+def import_purchase(
+    file: UploadFile = File(...),
+    supplier_id: Optional[int] = Form(None),
+    invoice_number: Optional[str] = Form(None),
+    notes: Optional[str] = Form(None),
+    format: str = "json",
+    current_user: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    if not current_user or current_user.get("role") not in ["admin", "manager"]:
+        raise HTTPException(status_code=403, detail="Access denied")
 
-            purchase_item = models.PurchaseItem(
-                purchase_id=purchase.id,
-                product_id=product.id,
-                quantity=item.quantity,
-                buying_price=item.buying_price or 0,
-                subtotal=subtotal
-            )
+    if format not in ("json", "csv"):
+        raise HTTPException(status_code=400, detail="format must be json or csv")
 
-            db.add(purchase_item)
+    business_id = current_user["business_id"]
 
-            movement = models.InventoryMovement(
-                business_id=business_id,
-                product_id=product.id,
-                movement_type="purchase",
-                quantity=item.quantity,           # positive = stock in
-                reference_id=purchase.id,
-                reason=f"Receive Stock ({payload.invoice_number or 'No Invoice'})",
-                created_by=user_id
-            )
-            db.add(movement)
+    if supplier_id:
+        supplier = db.query(models.Supplier.id).filter(
+            models.Supplier.id == supplier_id,
+            models.Supplier.business_id == business_id
+        ).first()
+        if not supplier:
+            raise HTTPException(status_code=400, detail="Invalid supplier")
 
-        purchase.total_amount = round(total_amount, 2)
+    try:
+        # ✅ streamed parse, batched item_code lookup, ONE purchase transaction
+        report = import_purchase_csv(
+            db, business_id, current_user["user_id"], file.file,
+            supplier_id=supplier_id,
+            invoice_number=(invoice_number or "").strip() or None,
+            notes=(notes or "").strip() or None
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
 
-        db.commit()
+    if report["purchase_id"]:
+        invalidate_dashboard(business_id)
+        invalidate_supplier_stats(business_id)
 
-        return {"message": "✅ Stock received successfully", "purchase_id": purchase.id, "total": purchase.total_amount}
+    # ✅ ?format=csv -> the rows that weren't received, as a downloadable file
+    if format == "csv":
+        headers = {"Content-Disposition": 'attachment; filename="purchase_import_errors.csv"'}
+        if report["purchase_id"]:
+            headers["X-Purchase-Id"] = str(report["purchase_id"])
+        return Response(content=errors_csv(report["errors"]), media_type="text/csv", headers=headers)
 
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+    return report
@@ -1,15 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional
+from datetime import date, datetime, timezone
 
 from backend.db import SessionLocal
 from backend import models
 from backend.config import templates
 from backend.auth_utils import verify_token
 from backend.onboarding_utils import record_onboarding_event
+from backend.sales_utils import process_sale, process_sale_batch, sale_response
+from backend.idempotency_utils import IdempotencyGuard
+from backend.demo_utils import is_established
+from backend.report_utils import (
+    REPORT_PAGE_SIZE, REPORT_PAGE_MAX, fetch_sales_page, sales_filter_options, sales_summary,
+    aggregate_sales, AGGREGATE_DIMENSIONS, EXPORT_FORMATS, stream_sales_export
+)
 
 router = APIRouter(
     prefix="/sales",
@@ -64,6 +72,17 @@ class SaleRequest(BaseModel):
     sales_person: Optional[str] = None
     items: List[SaleItem]
 
+class SyncSale(SaleRequest):
+    idempotency_key: str = Field(..., min_length=8, max_length=64)  # same key the till used online
+    created_at: Optional[datetime] = None  # when the sale happened offline
+
+class SyncBatchRequest(BaseModel):
+    # validated one by one in sync_batch: a malformed queued sale is rejected
+    # on its own instead of failing (and blocking) the whole batch
+    sales: List[dict]
+
+SYNC_BATCH_MAX = 500
+
 
 
 # =======================================================================
@@ -82,6 +101,15 @@ def record_sale(sale_data: SaleRequest, request: Request, db: Session = Depends(
 
     business_id = user["business_id"]
 
+    # --------------------------------------------------
+    # ✅ Idempotency-Key: a retried request gets the stored response back
+    # (LRU / one indexed lookup) and never touches stock again
+    # --------------------------------------------------
+    guard = IdempotencyGuard(db, request, business_id, "record_sale", sale_data)
+    replay = guard.replay()
+    if replay:
+        return replay
+
     # --------------------------------------------------
     # ✅ NEW: detect onboarding source
     # --------------------------------------------------
@@ -89,174 +117,103 @@ def record_sale(sale_data: SaleRequest, request: Request, db: Session = Depends(
     is_onboarding = (source == "onboarding")
 
     # --------------------------------------------------
-    # ✅ NEW: check if business already has a REAL sale
+    # ✅ Demo state lives on Business: established tenants
+    # (first real sale done) skip all demo logic with zero queries
     # --------------------------------------------------
-    has_real_sale = (
-        db.query(models.Sales)
-        .join(models.Order, models.Sales.order_id == models.Order.id)
-        .filter(
-            models.Order.business_id == business_id,
-            models.Sales.is_demo == False
-        )
-        .first()
-    )
+    established = is_established(db, business_id)
 
     # --------------------------------------------------
     # ✅ NEW: demo only if onboarding + no real sales yet
     # --------------------------------------------------
-    is_demo_sale = (is_onboarding and has_real_sale is None)
+    is_demo_sale = (is_onboarding and not established)
 
     # --------------------------------------------------
-    # ✅ FIX: if this is a REAL sale, delete any old demo sale rows + demo orders
-    # (Can't delete on a joined query in SQLAlchemy)
-    #
-    # ✅ ADDED NOW: Only run cleanup if demo orders actually exist
+    # ✅ Single-transaction pipeline:
+    # one product query, validate every line, bulk inserts, one commit.
+    # Old demo sale rows are purged later by the background sweeper.
     # --------------------------------------------------
-    if not is_demo_sale:
-        # Find demo order IDs for this business (distinct)
-        demo_order_ids_rows = (
-            db.query(models.Order.id)
-            .join(models.Sales, models.Sales.order_id == models.Order.id)
-            .filter(
-                models.Order.business_id == business_id,
-                models.Sales.is_demo == True
-            )
-            .distinct()
-            .all()
+    try:
+        result = process_sale(
+            db,
+            business_id=business_id,
+            user=user,
+            client_name=sale_data.client_name,
+            items=sale_data.items,
+            is_demo_sale=is_demo_sale,
+            idempotency=guard,
+            established=established
         )
+    except IntegrityError:
+        # same Idempotency-Key committed by a concurrent retry
+        replay = guard.replay_after_conflict()
+        if replay:
+            return replay
+        raise
 
-        demo_order_ids_list = [r[0] for r in demo_order_ids_rows]
-
-        # ✅ If no demo orders, skip cleanup entirely
-        if demo_order_ids_list:
-            # Delete demo sales rows (no join here)
-            db.query(models.Sales).filter(
-                models.Sales.order_id.in_(demo_order_ids_list),
-                models.Sales.is_demo == True
-            ).delete(synchronize_session=False)
-
-            # Delete demo orders themselves
-            db.query(models.Order).filter(
-                models.Order.id.in_(demo_order_ids_list),
-                models.Order.business_id == business_id
-            ).delete(synchronize_session=False)
-
-            db.commit()
-
-    # Generate order code (UNCHANGED)
-    last_order = db.execute(
-        text("SELECT id FROM orders ORDER BY id DESC LIMIT 1")
-    ).fetchone()
-    next_number = 1 if not last_order else last_order[0] + 1
-    order_code = f"ORD-{next_number:05d}"
-
-    # 🔥 ONLY CHANGE BELOW
-    new_order = models.Order(
-        order_code=order_code,
-        business_id=business_id,
-        client_name=sale_data.client_name,
-        sales_person=user["username"],   # ← AUTO FROM TOKEN
-        created_by=user["user_id"],      # ← SECURE USER LINK
-        total_amount=0
-    )
+    guard.remember()
 
-    db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
-
-    total_amount = 0
-    total_profit = 0.0
-
-    for item in sale_data.items:
-
-        product = db.query(models.Product).filter(
-            models.Product.name == item.product_name,
-            models.Product.business_id == business_id
-        ).first()
-
-        if not product:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Product '{item.product_name}' not found"
-            )
-
-        # --------------------------------------------------
-        # ✅ NEW: stock check ONLY for real sales
-        # (demo sale should not scare them with stock issues)
-        # --------------------------------------------------
-        if not is_demo_sale:
-            if product.quantity < item.quantity:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Not enough stock for '{item.product_name}'"
-                )
-
-        # Selling below buying price still blocked (UNCHANGED)
-        if product.buying_price is not None and item.selling_price < product.buying_price:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Selling price for '{product.name}' cannot be below buying price"
-            )
-
-        subtotal = item.selling_price * item.quantity
-        total_amount += subtotal
-
-        # --------------------------------------------------
-        # ✅ NEW: reduce stock ONLY for real sales
-        # --------------------------------------------------
-        if not is_demo_sale:
-
-            qty = item.quantity
-
-            # reduce product stock
-            product.quantity -= qty
-
-            # record inventory movement
-            movement = models.InventoryMovement(
-                product_id=product.id,
-                business_id=business_id,
-                movement_type="sale",
-                quantity=-qty,               # negative because stock leaves
-                reference_id=new_order.id,   # link to the order
-                reason="POS Sale"
-            )
-
-            db.add(movement)
-
-        bp = product.buying_price if product.buying_price is not None else 0
-        total_profit += (item.selling_price - bp) * item.quantity
-
-        sale_row = models.Sales(
-            order_id=new_order.id,
-            product_id=product.id,
-            quantity=item.quantity,
-            total_price=subtotal,
-            is_demo=is_demo_sale  # ✅ NEW
-        )
-        db.add(sale_row)
+    return sale_response(result, is_demo_sale)
 
-    new_order.total_amount = total_amount
-    db.commit()
+# =======================================================================
+# 📶 OFFLINE SYNC (queued sales from the service worker outbox)
+# =======================================================================
+@router.post("/sync_batch")
+def sync_batch(payload: SyncBatchRequest, request: Request, db: Session = Depends(get_db)):
 
-    record_onboarding_event(db, business_id, "sell_product")
+    user = verify_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
 
-    # --------------------------------------------------
-    # ✅ NEW: messaging
-    # --------------------------------------------------
-    message = "Order recorded successfully!"
-    if is_demo_sale:
-        message = (
-            "Demo sale recorded successfully. "
-            "Your stock was NOT reduced. "
-            "When you record your next sale, this demo will be removed automatically."
-        )
+    if user.get("role") not in ["admin", "manager", "staff"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    if len(payload.sales) > SYNC_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Send at most {SYNC_BATCH_MAX} sales per batch")
+
+    now = datetime.utcnow()
+    results = [None] * len(payload.sales)
+    orders, positions = [], []
+    for position, raw in enumerate(payload.sales):
+        try:
+            sale = SyncSale.model_validate(raw)
+        except ValidationError as e:
+            error = e.errors()[0]
+            field = ".".join(str(part) for part in error["loc"])
+            results[position] = {
+                "idempotency_key": str(raw.get("idempotency_key") or ""),
+                "status": "rejected",
+                "detail": f"{field}: {error['msg']}" if field else error["msg"],
+            }
+            continue
+
+        created_at = sale.created_at
+        if created_at is not None:
+            # store naive UTC like the rest of the app; never in the future
+            if created_at.tzinfo is not None:
+                created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+            created_at = min(created_at, now)
+
+        orders.append({
+            "key": sale.idempotency_key.strip()[:64],
+            # same fingerprint record_sale computes for this body
+            "request": SaleRequest(
+                client_name=sale.client_name,
+                sales_person=sale.sales_person,
+                items=sale.items
+            ),
+            "created_at": created_at,
+        })
+        positions.append(position)
+
+    if orders:
+        for position, result in zip(positions, process_sale_batch(db, user["business_id"], user, orders)):
+            results[position] = result
 
     return {
-        "message": message,
-        "order_code": order_code,
-        "total_amount": total_amount,
-        "total_profit": round(float(total_profit), 2),
-        "is_demo": is_demo_sale
+        "accepted": sum(1 for r in results if r["status"] == "accepted"),
+        "duplicate": sum(1 for r in results if r["status"] == "duplicate"),
+        "rejected": sum(1 for r in results if r["status"] == "rejected"),
+        "results": results
     }
 
 # =======================================================================
@@ -275,10 +232,20 @@ def get_sales_items(request: Request, db: Session = Depends(get_db)):
 
     business_id = user["business_id"]
 
+    # column-only rows; name + cost are the Sales snapshot (no products join)
     sales_items = (
-        db.query(models.Sales, models.Order, models.Product)
+        db.query(
+            models.Order.order_code,
+            models.Order.created_at,
+            models.Order.client_name,
+            models.Order.sales_person,
+            models.Sales.product_name,
+            models.Sales.quantity,
+            models.Sales.total_price,
+            models.Sales.unit_cost,
+            models.Sales.is_demo
+        )
         .join(models.Order, models.Sales.order_id == models.Order.id)
-        .join(models.Product, models.Sales.product_id == models.Product.id)
         .filter(models.Order.business_id == business_id)  # ✅ unchanged: demo will show
         .order_by(models.Sales.id.desc())
         .all()
@@ -286,17 +253,167 @@ def get_sales_items(request: Request, db: Session = Depends(get_db)):
 
     output = []
 
-    for sale, order, product in sales_items:
+    for r in sales_items:
         output.append({
-            "order_code": order.order_code,
-            "date": order.created_at,
-            "client_name": order.client_name,
-            "sales_person": order.sales_person,
-            "product_name": product.name,
-            "quantity": sale.quantity,
-            "subtotal": sale.total_price,
-            "buying_price": product.buying_price or 0,
-            "is_demo": getattr(sale, "is_demo", False)  # ✅ optional for UI badge
+            "order_code": r.order_code,
+            "date": r.created_at,
+            "client_name": r.client_name,
+            "sales_person": r.sales_person,
+            "product_name": r.product_name,
+            "quantity": r.quantity,
+            "subtotal": r.total_price,
+            "buying_price": r.unit_cost or 0,
+            "is_demo": bool(r.is_demo)  # ✅ optional for UI badge
         })
 
-    return output
\ No newline at end of file
+    return output
+
+
+# -------------------------------------------------
+# ✅ Paginated report: filters in SQL, keyset cursor on (created_at, id)
+# -------------------------------------------------
+@router.get("/items")
+def get_sales_page(
+    request: Request,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    order_code: Optional[str] = None,
+    client: Optional[str] = None,
+    sales_person: Optional[str] = None,
+    product: Optional[str] = None,
+    limit: int = Query(REPORT_PAGE_SIZE, ge=1, le=REPORT_PAGE_MAX),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+
+    user = verify_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return fetch_sales_page(
+        db,
+        user["business_id"],
+        limit=limit,
+        cursor=cursor,
+        date_from=date_from,
+        date_to=date_to,
+        order_code=order_code,
+        client=client,
+        sales_person=sales_person,
+        product=product
+    )
+
+
+@router.get("/report_filters")
+def get_report_filters(request: Request, db: Session = Depends(get_db)):
+
+    user = verify_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return sales_filter_options(db, user["business_id"])
+
+
+# -------------------------------------------------
+# ✅ Range totals for the report tiles (daily rollup, no line-item scan)
+# -------------------------------------------------
+@router.get("/summary")
+def get_sales_summary(
+    request: Request,
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    sales_person: Optional[str] = None,
+    product: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+
+    user = verify_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return sales_summary(
+        db,
+        user["business_id"],
+        date_from=date_from,
+        date_to=date_to,
+        sales_person=sales_person,
+        product=product
+    )
+
+
+# -------------------------------------------------
+# ✅ Grouped totals computed in SQL (few KB instead of the full line dump)
+#    /sales/aggregate?group_by=day,product&from=2026-10-01&to=2026-10-31
+# -------------------------------------------------
+@router.get("/aggregate")
+def get_sales_aggregate(
+    request: Request,
+    group_by: str = "",
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    db: Session = Depends(get_db)
+):
+
+    user = verify_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    dimensions = [g.strip() for g in group_by.split(",") if g.strip()]
+    unknown = [g for g in dimensions if g not in AGGREGATE_DIMENSIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown group_by: {', '.join(unknown)} (use {', '.join(AGGREGATE_DIMENSIONS)})"
+        )
+
+    return aggregate_sales(db, user["business_id"], dimensions, date_from=date_from, date_to=date_to)
+
+
+# -------------------------------------------------
+# ✅ Full history export, streamed (flat memory, gzip on the fly)
+#    /sales/export?format=csv&from=2026-01-01&to=2026-03-31
+# -------------------------------------------------
+@router.get("/export")
+def export_sales(
+    request: Request,
+    format: str = "csv",
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to")
+):
+
+    user = verify_token(request)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+
+    compress = "gzip" in request.headers.get("accept-encoding", "")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"sales_{date_from or 'all'}_{date_to or 'now'}.{format}"
+
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+
+    return StreamingResponse(
+        stream_sales_export(user["business_id"], format, date_from, date_to, compress),
+        media_type=media_type,
+        headers=headers
+    )
@@ -1,17 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Form, Request, Body
+from fastapi import APIRouter, Depends, HTTPException, Form, Request, Body, Query
 from fastapi.responses import HTMLResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case   # ✅ ADDED: case
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
 import pytz
-from pathlib import Path
 from backend.db import SessionLocal
 from backend.auth_utils import verify_token
 from backend import models
 from backend.config import templates
-from pywebpush import webpush, WebPushException
-import os, json
+from backend.order_code_utils import DEFAULT_PREFIX, reset_order_code_cache
+from backend.rollup_utils import revenue_by_business_subquery, schedule_rollup_rebuild
+from backend.time_utils import reset_timezone_cache
+from backend.dashboard_utils import invalidate_dashboard
+from backend.ledger_utils import reconcile_ledger
+from backend.push_utils import send_push_to_business
 
 
 router = APIRouter(prefix="/superadmin", tags=["superadmin"])
@@ -100,7 +103,7 @@ def create_superadmin(
 #    ✅ Adds:
 #      - products_count
 #      - last_sale_date (from orders)
-#      - total_revenue (sum of orders.total_amount)
+#      - total_revenue (from daily_sales_rollup, real sales only)
 #    ✅ NEW ADDITION:
 #      - is_installed (from onboarding events: event == "install_app")
 #    ✅ Also avoids N+1 queries by using one aggregated query
@@ -124,6 +127,19 @@ def get_all_clients(request: Request, db: Session = Depends(get_db)):
         .subquery()
     )
 
+    # ✅ revenue from the daily rollup (no scan of orders; one row per business
+    # so the product join can't multiply the sum)
+    revenue_subq = revenue_by_business_subquery(db)
+
+    last_sale_subq = (
+        db.query(
+            models.Order.business_id.label("business_id"),
+            func.max(models.Order.created_at).label("last_sale_date_utc")
+        )
+        .group_by(models.Order.business_id)
+        .subquery()
+    )
+
     rows = (
         db.query(
             models.Business.id.label("business_id"),
@@ -141,8 +157,8 @@ def get_all_clients(request: Request, db: Session = Depends(get_db)):
 
             # ✅ NEW metrics
             func.count(func.distinct(models.Product.id)).label("products_count"),
-            func.max(models.Order.created_at).label("last_sale_date_utc"),
-            func.coalesce(func.sum(models.Order.total_amount), 0).label("total_revenue"),
+            func.max(last_sale_subq.c.last_sale_date_utc).label("last_sale_date_utc"),
+            func.coalesce(func.max(revenue_subq.c.total_revenue), 0).label("total_revenue"),
 
             # ✅ ADDED: install status (1/0)
             func.coalesce(install_subq.c.is_installed, 0).label("is_installed"),
@@ -153,7 +169,8 @@ def get_all_clients(request: Request, db: Session = Depends(get_db)):
             (models.User.business_id == models.Business.id) & (models.User.role != "superadmin")
         )
         .outerjoin(models.Product, models.Product.business_id == models.Business.id)
-        .outerjoin(models.Order, models.Order.business_id == models.Business.id)
+        .outerjoin(last_sale_subq, last_sale_subq.c.business_id == models.Business.id)
+        .outerjoin(revenue_subq, revenue_subq.c.business_id == models.Business.id)
 
         # ✅ ADDED: join install subquery
         .outerjoin(install_subq, install_subq.c.business_id == models.Business.id)
@@ -345,48 +362,127 @@ def push_reminder(
     if not subs:
         return {"message": "No subscribed devices for this business", "sent": 0, "failed": 0, "deleted": 0}
 
-    vapid_private_pem = os.getenv("VAPID_PRIVATE_KEY_PEM")
-    vapid_sub = os.getenv("VAPID_SUB", "mailto:admin@smartpos.local")
-
-    if not vapid_private_pem:
-        raise HTTPException(status_code=500, detail="VAPID_PRIVATE_KEY_PEM not set")
-
-    pem_text = vapid_private_pem.replace("\\n", "\n").strip()
-    pem_path = Path(f"/tmp/vapid_private_{business_id}.pem")
-    pem_path.write_text(pem_text, encoding="utf-8")
-
-    sent = 0
-    failed = 0
-    deleted = 0
-
-    for sub in subs:
-        try:
-            webpush(
-                subscription_info={
-                    "endpoint": sub.endpoint,
-                    "keys": {"p256dh": sub.p256dh, "auth": sub.auth}
-                },
-                data=json.dumps({"title": title, "body": message, "url": "/auth/dashboard"}),
-                vapid_private_key=str(pem_path),
-                vapid_claims={"sub": vapid_sub}
-            )
-            sent += 1
-
-        except WebPushException as ex:
-            failed += 1
-
-            status_code = None
-            try:
-                if ex.response is not None:
-                    status_code = ex.response.status_code
-            except Exception:
-                status_code = None
-
-            if status_code in (404, 410):
-                db.delete(sub)
-                deleted += 1
-
-    if deleted:
-        db.commit()
-
-    return {"message": "Reminder processed", "sent": sent, "failed": failed, "deleted": deleted}
+    try:
+        result = send_push_to_business(db, business_id, title, message, subs=subs)
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {"message": "Reminder processed", **result}
+
+
+# ----------------------------------------------------
+# 7️⃣ ORDER NUMBERING SETTINGS (prefix / gap-free)
+# ----------------------------------------------------
+@router.post("/order_numbering/{business_id}")
+def set_order_numbering(
+    business_id: int,
+    request: Request,
+    payload: dict = Body(...),
+    db: Session = Depends(get_db)
+):
+    require_superadmin(request, db)
+
+    business = db.query(models.Business).filter(models.Business.id == business_id).first()
+    if not business:
+        raise HTTPException(status_code=404, detail="Business not found")
+
+    prefix = (payload.get("prefix") or "").strip().upper() or None
+    if prefix and (len(prefix) > 10 or not prefix.replace("-", "").isalnum()):
+        raise HTTPException(status_code=400, detail="Prefix must be up to 10 letters/digits")
+
+    counter = db.query(models.OrderCounter).filter(
+        models.OrderCounter.business_id == business_id
+    ).with_for_update().first()
+
+    if not counter:
+        last_id = db.query(func.max(models.Order.id)).filter(
+            models.Order.business_id == business_id
+        ).scalar() or 0
+        counter = models.OrderCounter(business_id=business_id, next_value=last_id + 1)
+        db.add(counter)
+
+    counter.prefix = prefix
+    counter.gap_free = bool(payload.get("gap_free", False))
+    counter.updated_at = datetime.utcnow()
+
+    db.commit()
+
+    # other workers pick the new settings up when their current block runs out
+    reset_order_code_cache(business_id)
+
+    return {
+        "message": "Order numbering updated",
+        "prefix": counter.prefix or DEFAULT_PREFIX,
+        "gap_free": counter.gap_free,
+        "next_value": counter.next_value
+    }
+
+
+# ----------------------------------------------------
+# 8️⃣ BUSINESS TIMEZONE (local "today" / report days)
+# ----------------------------------------------------
+@router.post("/business_timezone/{business_id}")
+def set_business_timezone(
+    business_id: int,
+    request: Request,
+    payload: dict = Body(...),
+    db: Session = Depends(get_db)
+):
+    require_superadmin(request, db)
+
+    business = db.query(models.Business).filter(models.Business.id == business_id).first()
+    if not business:
+        raise HTTPException(status_code=404, detail="Business not found")
+
+    name = (payload.get("timezone") or "").strip()
+    if name not in pytz.all_timezones_set:
+        raise HTTPException(status_code=400, detail="Unknown timezone (use e.g. Africa/Nairobi)")
+
+    changed = business.timezone != name
+    business.timezone = name
+    db.commit()
+
+    if changed:
+        # rollup rows are bucketed by local day -> re-bucket this business,
+        # in the background (whole history; sales keep going meanwhile)
+        reset_timezone_cache(business_id)
+        invalidate_dashboard(business_id)
+        schedule_rollup_rebuild(business_id, on_done=invalidate_dashboard)
+
+    return {
+        "message": "Timezone updated",
+        "timezone": name,
+        "rollup_rebuild": "scheduled" if changed else "not needed"
+    }
+
+
+# ----------------------------------------------------
+# 9️⃣ LEDGER RECONCILIATION (Product.quantity vs inventory_movements)
+#    incremental: each run only scans movements since the last checkpoints
+#    same as: python -m backend.ledger_utils [--business N] [--fix]
+# ----------------------------------------------------
+@router.post("/reconcile_ledger")
+def reconcile_ledger_endpoint(
+    request: Request,
+    business_id: int = Query(None),
+    fix: bool = Query(False),
+    db: Session = Depends(get_db)
+):
+    require_superadmin(request, db)
+
+    if business_id is not None:
+        exists = db.query(models.Business.id).filter(models.Business.id == business_id).first()
+        if not exists:
+            raise HTTPException(status_code=404, detail="Business not found")
+
+    reports = list(reconcile_ledger(db, business_id, fix=fix))
+
+    return {
+        "businesses_checked": len(reports),
+        "products_checked": sum(r["products_checked"] for r in reports),
+        "movements_scanned": sum(r["movements_scanned"] for r in reports),
+        "drift_count": sum(r["drift_count"] for r in reports),
+        "fixed": sum(r["fixed"] for r in reports),
+        # only businesses with drift, to keep the fleet report small
+        "businesses": [r for r in reports if r["drift_count"]],
+    }
@@ -6,6 +6,7 @@ from backend.db import SessionLocal
 from backend import models
 from backend.config import templates
 from backend.auth_utils import verify_token
+from backend.supplier_utils import invalidate_supplier_stats, supplier_report, supplier_stats
 
 router = APIRouter(
     prefix="/suppliers",
@@ -57,6 +58,7 @@ def add_supplier(
 
     db.add(supplier)
     db.commit()
+    invalidate_supplier_stats(user["business_id"])
 
     return {"message": "Supplier added successfully"}
 
@@ -72,4 +74,33 @@ def get_suppliers(request: Request, db: Session = Depends(get_db)):
         models.Supplier.business_id == user["business_id"]
     ).all()
 
-    return suppliers
\ No newline at end of file
+    return suppliers
+
+# -------------------------
+# Supplier analytics (grouped SQL, cached until the next receipt)
+# -------------------------
+@router.get("/report")
+def get_supplier_report(request: Request, db: Session = Depends(get_db)):
+
+    user = verify_token(request)
+
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if user.get("role") not in ["admin", "manager"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return supplier_report(db, user["business_id"])
+
+@router.get("/{supplier_id}/stats")
+def get_supplier_stats(supplier_id: int, request: Request, db: Session = Depends(get_db)):
+
+    user = verify_token(request)
+
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    if user.get("role") not in ["admin", "manager"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return supplier_stats(db, user["business_id"], supplier_id)
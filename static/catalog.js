@@ -0,0 +1,62 @@
+// =====================================================
+// SmartPOS local product catalog
+// Kept in localStorage and refreshed with GET /products/?since=<cursor>:
+// the first load downloads everything, after that only changed / deleted
+// products come back (or a 304 when nothing changed).
+// =====================================================
+const Catalog = (() => {
+  const STORAGE_KEY = "smartpos-catalog-v1";
+
+  function read(){
+    try{
+      return JSON.parse(localStorage.getItem(STORAGE_KEY)) || null;
+    }catch(e){
+      return null;
+    }
+  }
+
+  function write(state){
+    try{
+      localStorage.setItem(STORAGE_KEY, JSON.stringify(state));
+    }catch(e){
+      // storage full / private mode: still works, just re-downloads next time
+    }
+  }
+
+  function toList(state){
+    return Object.values(state.products).sort((a, b) => a.name.localeCompare(b.name));
+  }
+
+  async function sync(baseURL = ""){
+    const state = read() || { cursor: "0", etag: null, products: {} };
+    const headers = { "Accept": "application/json" };
+    if(state.etag) headers["If-None-Match"] = state.etag;
+
+    let res;
+    try{
+      res = await fetch(`${baseURL}/products/?since=${encodeURIComponent(state.cursor)}`, {
+        credentials: "include",
+        headers
+      });
+    }catch(err){
+      return toList(state); // offline: last known catalog
+    }
+    if(res.status === 304 || !res.ok) return toList(state);
+
+    const delta = await res.json();
+    if(delta.full) state.products = {};
+    delta.products.forEach(p => { state.products[p.id] = p; });
+    delta.deleted.forEach(id => { delete state.products[id]; });
+    state.cursor = delta.cursor;
+    state.etag = res.headers.get("ETag");
+
+    write(state);
+    return toList(state);
+  }
+
+  function clear(){
+    localStorage.removeItem(STORAGE_KEY);
+  }
+
+  return { sync, clear };
+})();
@@ -1,3 +1,24 @@
+// =====================================================
+// SmartPOS service worker
+// - offline sales outbox (IndexedDB) + bulk sync to /sales/sync_batch
+// - network-first cache so the till page + product list open offline
+//   (ONLY those + static files: the cache isn't per user, and a shared till
+//   must not show the last user's reports offline; cleared on logout)
+// =====================================================
+const CACHE_NAME = "smartpos-v3";
+const OUTBOX_DB = "smartpos-outbox";
+const OUTBOX_STORE = "sales";
+const REJECTED_STORE = "rejected";
+const SYNC_TAG = "sales-outbox";
+const SYNC_BATCH_SIZE = 200;   // server accepts up to 500
+const RECORD_SALE_PATH = "/sales/record_sale/";
+const SYNC_BATCH_PATH = "/sales/sync_batch";
+const LOGOUT_PATH = "/auth/logout";
+const OFFLINE_PATHS = ["/sales/recordsale", "/products/"];   // till page + catalog
+const OFFLINE_PREFIXES = ["/static/"];
+// the server never reached the queue: try the same batch again later
+const RETRY_STATUSES = [401, 403, 502, 503, 504];
+
 // Install event
 self.addEventListener("install", event => {
   self.skipWaiting(); // Activate worker immediately
@@ -5,11 +26,207 @@ self.addEventListener("install", event => {
 
 // Activate event
 self.addEventListener("activate", event => {
-  clients.claim(); // Control all pages
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(keys.filter(k => k !== CACHE_NAME).map(k => caches.delete(k))))
+      .then(() => clients.claim()) // Control all pages
+      .then(() => flushOutbox())
+  );
 });
 
-// Fetch event (basic proxy for now)
+// =====================================================
+// IndexedDB helpers
+// =====================================================
+function openOutbox(){
+  return new Promise((resolve, reject) => {
+    const req = indexedDB.open(OUTBOX_DB, 1);
+    req.onupgradeneeded = () => {
+      const db = req.result;
+      if(!db.objectStoreNames.contains(OUTBOX_STORE)){
+        db.createObjectStore(OUTBOX_STORE, { keyPath: "idempotency_key" });
+      }
+      if(!db.objectStoreNames.contains(REJECTED_STORE)){
+        db.createObjectStore(REJECTED_STORE, { keyPath: "idempotency_key" });
+      }
+    };
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+}
+
+function tx(db, store, mode, fn){
+  return new Promise((resolve, reject) => {
+    const t = db.transaction(store, mode);
+    const result = fn(t.objectStore(store));
+    t.oncomplete = () => resolve(result && "result" in result ? result.result : result);
+    t.onerror = () => reject(t.error);
+  });
+}
+
+async function queueSale(sale){
+  const db = await openOutbox();
+  await tx(db, OUTBOX_STORE, "readwrite", s => s.put(sale));
+}
+
+async function outboxCount(){
+  const db = await openOutbox();
+  return tx(db, OUTBOX_STORE, "readonly", s => s.count());
+}
+
+async function notifyClients(message){
+  const all = await clients.matchAll({ includeUncontrolled: true });
+  all.forEach(c => c.postMessage(message));
+}
+
+// =====================================================
+// Flush: send queued sales in big batches (a few requests, not hundreds)
+// =====================================================
+let flushing = null;
+
+function flushOutbox(){
+  if(!flushing){
+    flushing = doFlush().finally(() => { flushing = null; });
+  }
+  return flushing;
+}
+
+async function doFlush(){
+  const db = await openOutbox();
+  let synced = 0;
+  let rejected = 0;
+
+  while(true){
+    const batch = await tx(db, OUTBOX_STORE, "readonly", s => s.getAll(null, SYNC_BATCH_SIZE));
+    if(!batch.length) break;
+
+    let res;
+    try{
+      res = await fetch(SYNC_BATCH_PATH, {
+        method: "POST",
+        credentials: "include",
+        headers: { "Content-Type": "application/json", "Accept": "application/json" },
+        body: JSON.stringify({ sales: batch })
+      });
+    }catch(err){
+      break; // still offline, try again later
+    }
+    if(RETRY_STATUSES.includes(res.status)) break; // e.g. logged out: keep the queue
+
+    if(!res.ok){
+      // the server refused the batch itself (e.g. 413 / 422 / 500): park it
+      // with the rejected sales so later offline sales still go out
+      let detail = `Sync failed (HTTP ${res.status})`;
+      try{ detail = (await res.json()).detail || detail; }catch(e){}
+      if(typeof detail !== "string") detail = JSON.stringify(detail);
+      for(const sale of batch){
+        await tx(db, REJECTED_STORE, "readwrite", s => s.put({ ...sale, detail }));
+        await tx(db, OUTBOX_STORE, "readwrite", s => s.delete(sale.idempotency_key));
+      }
+      rejected += batch.length;
+      continue;
+    }
+
+    const out = await res.json();
+    const byKey = Object.fromEntries(batch.map(s => [s.idempotency_key, s]));
+
+    for(const r of out.results){
+      await tx(db, OUTBOX_STORE, "readwrite", s => s.delete(r.idempotency_key));
+      if(r.status === "rejected"){
+        rejected++;
+        await tx(db, REJECTED_STORE, "readwrite", s => s.put({ ...byKey[r.idempotency_key], detail: r.detail }));
+      }else{
+        synced++;
+      }
+    }
+  }
+
+  if(synced || rejected){
+    await notifyClients({ type: "outbox-synced", synced, rejected, pending: await outboxCount() });
+  }
+}
+
+self.addEventListener("sync", event => {
+  if(event.tag === SYNC_TAG) event.waitUntil(flushOutbox());
+});
+
+self.addEventListener("message", event => {
+  const data = event.data || {};
+  if(data.type === "flush-outbox") event.waitUntil(flushOutbox());
+  if(data.type === "outbox-status"){
+    event.waitUntil(outboxCount().then(pending => event.source.postMessage({ type: "outbox-status", pending })));
+  }
+});
+
+// =====================================================
+// Fetch
+// =====================================================
+async function recordSale(request){
+  const body = await request.clone().text();
+  try{
+    const res = await fetch(request);
+    flushOutbox(); // we're online: push anything still queued
+    return res;
+  }catch(err){
+    // offline: keep the sale (same Idempotency-Key) and answer the till
+    const sale = JSON.parse(body);
+    sale.idempotency_key = request.headers.get("Idempotency-Key") || crypto.randomUUID();
+    sale.created_at = new Date().toISOString();
+    await queueSale(sale);
+
+    if(self.registration.sync){
+      try{ await self.registration.sync.register(SYNC_TAG); }catch(e){}
+    }
+
+    return new Response(JSON.stringify({
+      message: "Offline: sale saved on this device and will sync when back online.",
+      queued: true,
+      order_code: null,
+      pending: await outboxCount()
+    }), { status: 202, headers: { "Content-Type": "application/json" } });
+  }
+}
+
+function cacheableOffline(url){
+  return OFFLINE_PATHS.includes(url.pathname) || OFFLINE_PREFIXES.some(p => url.pathname.startsWith(p));
+}
+
+async function logout(request){
+  await caches.delete(CACHE_NAME);
+  return fetch(request);
+}
+
+async function networkFirst(request){
+  const cache = await caches.open(CACHE_NAME);
+  try{
+    const res = await fetch(request);
+    if(res.ok && res.type === "basic" && !res.redirected) cache.put(request, res.clone());
+    return res;
+  }catch(err){
+    const cached = await cache.match(request);
+    if(cached) return cached;
+    throw err;
+  }
+}
+
 self.addEventListener("fetch", event => {
+  const url = new URL(event.request.url);
+
+  if(event.request.method === "POST" && url.pathname === RECORD_SALE_PATH){
+    event.respondWith(recordSale(event.request));
+    return;
+  }
+
+  if(url.origin === self.location.origin && url.pathname === LOGOUT_PATH){
+    event.respondWith(logout(event.request));
+    return;
+  }
+
+  // till page, product list and static files keep working offline
+  if(event.request.method === "GET" && url.origin === self.location.origin && cacheableOffline(url)){
+    event.respondWith(networkFirst(event.request));
+    return;
+  }
+
   event.respondWith(fetch(event.request));
 });
 self.addEventListener("push", event => {